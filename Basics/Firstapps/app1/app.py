@@ -1,19 +1,34 @@
 #!/bin/python3
 
+import os
+import sys
 from flask import Flask, render_template
-app = Flask(__name__)
 
-@app.route("/")
-def home():
-	return render_template("index.html")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # shared core package
+from core.compress import init_compression
+from core.freeze import init_freeze
+from core.metrics import Metrics
 
-@app.route("/contact")
-def contact():
-	return render_template("contact.html")
+def create_app(config=None):
+	app = Flask(__name__)
+	app.config.update(config or {})
+	Metrics(app)
+	init_freeze(app)
+	init_compression(app)
 
-@app.route("/about")
-def about():
-	return render_template("about.html")
+	@app.route("/")
+	def home():
+		return render_template("index.html")
+
+	@app.route("/contact")
+	def contact():
+		return render_template("contact.html")
+
+	@app.route("/about")
+	def about():
+		return render_template("about.html")
+
+	return app
 
 if __name__ == "__main__":
-	app.run(debug=True)
+	create_app().run(debug=True)
@@ -1,38 +1,52 @@
 #!/bin/python3
 
+import os
+import sys
 from flask import Flask, render_template, send_from_directory, redirect, url_for
 
-app = Flask(__name__)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # shared core package
+from core.compress import init_compression
+from core.freeze import init_freeze
+from core.metrics import Metrics
 
-@app.route('/')
-def root():
-	return redirect("home")
+def create_app(config=None):
+	app = Flask(__name__)
+	app.config.update(config or {})
+	Metrics(app)
+	init_freeze(app)
+	init_compression(app)
 
-@app.route('/home')
-def home():
-	return render_template("index.html")
+	@app.route('/')
+	def root():
+		return redirect(url_for("home"))
 
-@app.route('/about')
-def about():
-	return render_template("about.html")
+	@app.route('/home')
+	def home():
+		return render_template("index.html")
 
-@app.route('/contact')
-def contact():
-	return render_template("contact.html")
+	@app.route('/about')
+	def about():
+		return render_template("about.html")
 
-@app.route('/examples/<example_name>')
-def show_example(example_name='examples'):
-	return redirect(url_for(example_name))
+	@app.route('/contact')
+	def contact():
+		return render_template("contact.html")
 
-@app.route('/examples')
-def examples():
-	examples_list = ["forloop1"]
-	return render_template("examples.html", examples = examples_list)
+	@app.route('/examples/<example_name>')
+	def show_example(example_name='examples'):
+		return redirect(url_for(example_name))
 
-@app.route('/examples/forloop1')
-def forloop1():
-	users = ["User 1", "User2", "Anonymous", "Guest"]
-	return render_template("forloop1.html", users = users)
+	@app.route('/examples')
+	def examples():
+		examples_list = ["forloop1"]
+		return render_template("examples.html", examples = examples_list)
+
+	@app.route('/examples/forloop1')
+	def forloop1():
+		users = ["User 1", "User2", "Anonymous", "Guest"]
+		return render_template("forloop1.html", users = users)
+
+	return app
 
 if __name__ == "__main__":
-	app.run(debug=True)
+	create_app().run(debug=True)
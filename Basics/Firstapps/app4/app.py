@@ -1,35 +1,41 @@
+import os
+import sys
 from flask import Flask, render_template, url_for, redirect
 from datetime import datetime
 
-app = Flask(__name__)
-
-@app.route('/')
-def redirect_to_home():
-	return redirect(url_for('home'))
-
-@app.route('/home')
-def home():
-	crt_time = datetime.now()
-	return render_template('index.html', time=crt_time)
-
-@app.route('/subjects/biology')
-def biology():
-	topics = {"biotechnology" : "This topic is about unit nine of grade 12 biology book. Both Biotechnology, Principles and Processes and its Applications are included.",
-
-	}
-	topic_count = len(topics)
-	return render_template('biology/index.html', topics=topics, topic_count=topic_count)
-
-@app.route('/subjects/biology/<topic>')
-def biology_topic(topic):
-	return redirect(url_for('topic'))
-
-@app.route('/subjects/biology/biotechnology')
-def biotechnology():
-	return render_template('biology/biotechnology.html')
-
+# the shared core package: Basics/Firstapps/core here, the ./core copy that
+# commit_to_github.sh ships when app4 is deployed on its own
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.assets import init_assets
+from core.compress import init_compression
+from core.content import ContentRegistry
+from core.freeze import init_freeze
+from core.metrics import Metrics
+
+def create_app(config=None):
+	app = Flask(__name__)
+	app.config.update(config or {})
+	# minified, fingerprinted and pre-compressed into static/build/
+	init_assets(app, ['cryo.css', 'cryo.js'])
+	Metrics(app)
+	# /home shows the server's clock, so it stays dynamic
+	init_freeze(app, exclude={'home'})
+	init_compression(app)
+	# /subjects/<subject>[/<topic>], straight from templates/<subject>/
+	ContentRegistry(app, '/subjects', section_endpoint='subject', page_endpoint='topic')
+
+	@app.route('/')
+	def redirect_to_home():
+		return redirect(url_for('home'))
+
+	@app.route('/home')
+	def home():
+		crt_time = datetime.now()
+		return render_template('index.html', time=crt_time)
+
+	return app
 
 if __name__ == "__main__":
-	app.run(host="0.0.0.0", port=5000, debug=True)
+	create_app().run(host="0.0.0.0", port=5000, debug=True)
 
 
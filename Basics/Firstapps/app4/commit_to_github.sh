@@ -5,7 +5,12 @@ commit_msg=${1}
 #git init
 #git remote add origin https://github.com/Visvasrk-221E/render.git
 
+# this repo holds only app4/; ship a copy of the shared core package with it
+# (app.py imports it from ../ when it is there, from ./core when deployed)
+rm -rf core
+cp -r ../core core
+rm -rf core/__pycache__
+
 git add .
 git commit -m "${commit_msg}"
 git push -u origin main
-
@@ -0,0 +1 @@
+"""Load-test and benchmark helpers for the Firstapps Flask apps."""
@@ -0,0 +1,86 @@
+#!/bin/python3
+"""Bytes saved against CPU spent, per compression level, on real pages.
+
+Renders blog002's index (seeded with --posts posts, so it is a full page
+of cards) and app4's home page once. Each body is then replayed through
+CompressionMiddleware at several gzip levels and brotli qualities.
+Reported per setting: output bytes, ratio, and mean CPU ms per response.
+
+    python -m bench.compression --repeat 200
+"""
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+
+from core import compress
+from core.compress import CompressionMiddleware
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SETTINGS = [('gzip', 1), ('gzip', 6), ('gzip', 9), ('br', 1), ('br', 4), ('br', 11)]
+
+
+def load_app(name):
+    spec = importlib.util.spec_from_file_location(f'{name}_app', os.path.join(ROOT, name, 'app.py'))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def pages(posts):
+    blog = load_app('blog002')
+    app = blog.create_app({'PAGE_CACHE_ENABLED': False})
+    with app.app_context():
+        user = blog.User(username='bench', email='bench@example.com', password_hash='x')
+        blog.db.session.add(user)
+        blog.db.session.flush()
+        blog.db.session.execute(blog.Post.__table__.insert(), [
+            {'title': f'Field report {i}', 'body': f'Observation {i}: ' + 'signal noise pattern ' * 20,
+             'user_id': user.id, 'topic_id': 1 + i % 10} for i in range(posts)])
+        blog.recount_activity()
+        blog.db.session.commit()
+    site = load_app('app4').create_app()
+    return {
+        'blog002 /': app.test_client().get('/', headers={'Accept-Encoding': 'identity'}).get_data(),
+        'app4 /home': site.test_client().get('/home', headers={'Accept-Encoding': 'identity'}).get_data(),
+    }
+
+
+def run(body, coding, level, repeat):
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/html; charset=utf-8')])
+        return [body]
+    middleware = CompressionMiddleware(app, level=level, brotli_quality=level)
+    environ = {'REQUEST_METHOD': 'GET', 'HTTP_ACCEPT_ENCODING': coding}
+    for _ in range(repeat):
+        out = b''.join(middleware(environ, lambda status, headers, exc_info=None: None))
+    stats = middleware.stats()
+    return {
+        'setting': f'{coding}-{level}',
+        'bytes_in': len(body),
+        'bytes_out': len(out),
+        'ratio': round(len(out) / len(body), 3),
+        'cpu_ms_per_response': round(stats['cpu_ms'] / repeat, 3),
+        'saved_per_cpu_ms': stats['saved_per_cpu_ms'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    settings = [s for s in SETTINGS if s[0] == 'gzip' or compress.brotli is not None]
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp, 'bench.sqlite3')
+        bodies = pages(args.posts)
+    report = {name: [run(body, coding, level, args.repeat) for coding, level in settings]
+              for name, body in bodies.items()}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+#!/bin/python3
+"""Fill a blog002 database with synthetic users, posts and comments.
+
+Rows go in through executemany() bulk inserts, in batches. Post bodies are
+markdown: headings, paragraphs, lists, links, emphasis and the odd code
+block. Topics and authors follow Zipf-like distributions, so a few topics
+and a few authors hold most of the posts, as on a real forum. Comments
+favour recent posts. The same --seed always gives the same data.
+
+    python -m bench.datagen --db /tmp/noir_bench.sqlite3 --users 2000 --posts 100000 --comments 400000
+
+Every generated user's password is BENCH_PASSWORD. The database is left
+bootstrapped, indexed for search and with its counters recounted, ready
+for ``NOIR_BOOTSTRAP=0 gunicorn 'app:create_app()'`` or bench.suite.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from bench.fts_search import VOCAB, WEIGHTS
+from core.fts import deferred_index
+
+BLOG002 = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'blog002', 'app.py')
+BENCH_PASSWORD = 'bench-password'
+SPAN = timedelta(days=365)
+
+
+def load_blog(db_path):
+    """Import blog002 and build its app, as ``module.app``, on the SQLite file ``db_path``."""
+    spec = importlib.util.spec_from_file_location('blog002_app', BLOG002)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    module.app = module.create_app({'DATABASE_URL': 'sqlite:///' + os.path.abspath(db_path)})
+    return module
+
+
+# cumulative, so choices() does not re-sum 5000 weights on every call
+VOCAB_CUM = list(accumulate(WEIGHTS))
+
+
+def zipf_weights(n, skew):
+    return [1 / (rank + 1) ** skew for rank in range(n)]
+
+
+def words(rnd, k):
+    return ' '.join(rnd.choices(VOCAB, cum_weights=VOCAB_CUM, k=k))
+
+
+def markdown_body(rnd):
+    blocks = [f"## {words(rnd, rnd.randint(2, 5)).capitalize()}"]
+    for _ in range(rnd.randint(2, 6)):
+        kind = rnd.random()
+        if kind < 0.15:
+            blocks.append('\n'.join(f"- {words(rnd, rnd.randint(3, 8))}" for _ in range(rnd.randint(2, 5))))
+        elif kind < 0.22:
+            blocks.append("```\n" + '\n'.join(words(rnd, 4) for _ in range(rnd.randint(2, 6))) + "\n```")
+        else:
+            text = words(rnd, rnd.randint(25, 90)).split(' ')
+            i = rnd.randrange(len(text))
+            text[i] = f"**{text[i]}**"
+            j = rnd.randrange(len(text))
+            text[j] = f"[{text[j]}](https://example.com/{text[j]})"
+            blocks.append(' '.join(text).capitalize() + '.')
+    return '\n\n'.join(blocks)
+
+
+def batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def insert(m, table, rows, batch):
+    count = 0
+    for chunk in batched(rows, batch):
+        m.db.session.execute(table.insert(), chunk)
+        m.db.session.commit()
+        count += len(chunk)
+    return count
+
+
+def generate(m, users=200, posts=5000, comments=20000, topic_skew=1.1, author_skew=1.2,
+             seed=1, batch=2000):
+    """Insert the rows and return the counts and seconds taken, per table."""
+    rnd = random.Random(seed)
+    db = m.db
+    now = datetime.utcnow()
+    timings = {}
+    with m.app.app_context():
+        # hashing is deliberately slow; one hash serves every generated user
+        probe = m.User(username='-', email='-')
+        probe.set_password(BENCH_PASSWORD)
+        started = time.perf_counter()
+        first_user = (db.session.query(db.func.max(m.User.id)).scalar() or 0) + 1
+        insert(m, m.User.__table__, (
+            {'username': f'user{first_user + i}', 'email': f'user{first_user + i}@example.com',
+             'realname': words(rnd, 2).title(), 'password_hash': probe.password_hash,
+             'bio': words(rnd, 20), 'created_at': now - SPAN}
+            for i in range(users)), batch)
+        user_ids = list(range(first_user, first_user + users))
+        timings['users'] = time.perf_counter() - started
+
+        topic_ids = [tid for (tid,) in db.session.query(m.Topic.id).order_by(m.Topic.id)]
+        topic_weights = zipf_weights(len(topic_ids), topic_skew)
+        author_weights = zipf_weights(users, author_skew)
+        # a fixed shuffle, so the busiest author is not always the first id
+        rnd.shuffle(author_weights)
+        topic_cum, author_cum = list(accumulate(topic_weights)), list(accumulate(author_weights))
+
+        started = time.perf_counter()
+        first_post = (db.session.query(db.func.max(m.Post.id)).scalar() or 0) + 1
+        # ascending created_at, the order real posts arrive in
+        offsets = sorted(rnd.random() for _ in range(posts))
+        # index once at the end rather than row by row through the trigger
+        with deferred_index(db.session, 'post', ('title', 'body')):
+            insert(m, m.Post.__table__, (
+                {'title': words(rnd, rnd.randint(3, 9)).capitalize(), 'body': markdown_body(rnd),
+                 'user_id': rnd.choices(user_ids, cum_weights=author_cum)[0],
+                 'topic_id': rnd.choices(topic_ids, cum_weights=topic_cum)[0],
+                 'created_at': now - SPAN + SPAN * offset}
+                for offset in offsets), batch)
+        timings['posts'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        comments = comments if posts else 0
+        # newer posts draw more comments: a triangular pick skewed to the end
+        picks = sorted(min(int(rnd.triangular(0, posts, posts)), posts - 1) for _ in range(comments))
+        insert(m, m.Comment.__table__, (
+            {'body': words(rnd, rnd.randint(5, 40)).capitalize(),
+             'user_id': rnd.choices(user_ids, cum_weights=author_cum)[0],
+             'post_id': first_post + i,
+             'created_at': now - SPAN + SPAN * offsets[i] + timedelta(minutes=rnd.randint(1, 600))}
+            for i in picks), batch)
+        timings['comments'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        m.recount_activity()
+        db.session.commit()
+        timings['recount'] = time.perf_counter() - started
+    m.page_cache.invalidate()
+    return {
+        'users': users, 'posts': posts, 'comments': comments,
+        'seconds': {k: round(v, 2) for k, v in timings.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', required=True, help='SQLite file to create or add to')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--posts', type=int, default=5000)
+    parser.add_argument('--comments', type=int, default=20000)
+    parser.add_argument('--topic-skew', type=float, default=1.1, help='Zipf exponent; 0 is uniform')
+    parser.add_argument('--author-skew', type=float, default=1.2, help='Zipf exponent; 0 is uniform')
+    parser.add_argument('--batch', type=int, default=2000, help='rows per INSERT batch')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    m = load_blog(args.db)
+    print(json.dumps(generate(m, args.users, args.posts, args.comments, args.topic_skew,
+                              args.author_skew, args.seed, args.batch), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/bin/python3
+"""Worker occupancy while many slow clients download a large attachment.
+
+Slow clients each read an attachment at a capped rate while a probe keeps
+requesting a cheap page. With sync gunicorn workers every streamed download
+pins one worker for the whole transfer, so the probe queues behind them.
+With ATTACHMENT_OFFLOAD=x-accel the worker answers with headers only and is
+free at once; nginx would stream the bytes.
+
+    NOIR_BOOTSTRAP=0 gunicorn -w 4 -b 127.0.0.1:8000 'app:create_app()'
+    NOIR_BOOTSTRAP=0 NOIR_ATTACHMENT_OFFLOAD=x-accel gunicorn -w 4 -b 127.0.0.1:8001 'app:create_app()'
+    python -m bench.download_occupancy --base http://127.0.0.1:8000 --post 1
+    python -m bench.download_occupancy --base http://127.0.0.1:8001 --post 1
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.request
+
+from bench.http_latency import percentile
+
+
+def slow_download(url, rate, timings):
+    start = time.perf_counter()
+    with urllib.request.urlopen(url) as resp:
+        chunk = max(rate // 10, 1)
+        while resp.read(chunk):
+            time.sleep(0.1)
+    timings.append(time.perf_counter() - start)
+
+
+def probe(url, stop, samples):
+    while not stop.is_set():
+        start = time.perf_counter()
+        with urllib.request.urlopen(url) as resp:
+            resp.read()
+        samples.append((time.perf_counter() - start) * 1000)
+        time.sleep(0.05)
+
+
+def run(base, post_id, clients=8, rate=2 * 1024 * 1024, probe_path='/topics'):
+    download_url = f"{base}/post/{post_id}/download"
+    timings, samples, stop = [], [], threading.Event()
+    prober = threading.Thread(target=probe, args=(base + probe_path, stop, samples))
+    prober.start()
+    downloads = [threading.Thread(target=slow_download, args=(download_url, rate, timings))
+                 for _ in range(clients)]
+    started = time.perf_counter()
+    for t in downloads:
+        t.start()
+    for t in downloads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    prober.join()
+    return {
+        'base': base,
+        'clients': clients,
+        'client_rate_bytes_s': rate,
+        'wall_s': round(elapsed, 2),
+        'mean_download_s': round(sum(timings) / len(timings), 2),
+        'probe_requests': len(samples),
+        'probe_p50_ms': round(percentile(samples, 50), 1),
+        'probe_p99_ms': round(percentile(samples, 99), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base', default='http://127.0.0.1:8000')
+    parser.add_argument('--post', type=int, default=1)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--rate', type=int, default=2 * 1024 * 1024, help='bytes/s per client')
+    args = parser.parse_args()
+    print(json.dumps(run(args.base, args.post, args.clients, args.rate), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/bin/python3
+"""Compare LIKE scans with FTS5 MATCH on synthetic post tables.
+
+Builds a throwaway SQLite database per size with the blog002 post shape
+(title + markdown-ish body), indexes it with core.fts, then times the
+query blog002 used to run (``title LIKE %q%``), the body+title LIKE that
+blog001 used, the ranked FTS query over every match, and the same query
+over the newest core.fts.MAX_CANDIDATES matches, as ranked_search() runs it.
+
+    python -m bench.fts_search --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from core.fts import MAX_CANDIDATES, fts_ddl, fts_rebuild_sql, match_expression
+
+SYLLABLES = "ka ri to mu se na lo vi de pa zu fe go hi ne ro ta su".split()
+
+
+def vocabulary(size=5000, seed=3):
+    rnd = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rnd.choices(SYLLABLES, k=rnd.randint(2, 4))))
+    return sorted(words)
+
+
+VOCAB = vocabulary()
+# Zipf-like word frequencies, as in natural text: a few common words and a long tail
+WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCAB))]
+# a common word, a mid-frequency word, a rare word, a two-word prefix query, a miss
+QUERIES = [VOCAB[5], VOCAB[200], VOCAB[3000], f"{VOCAB[40]} {VOCAB[90][:3]}", 'qqqq']
+
+RANKED = ("SELECT rowid, bm25(post_fts, 10.0, 1.0) AS score FROM post_fts "
+          "WHERE post_fts MATCH :q{} ORDER BY score LIMIT 20")
+NEWEST = (" AND rowid >= coalesce((SELECT rowid FROM post_fts WHERE post_fts MATCH :q "
+          "ORDER BY rowid DESC LIMIT 1 OFFSET :skip), 0)")
+
+
+def make_db(path, count, seed=7):
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE post (id INTEGER PRIMARY KEY, title TEXT, body TEXT)")
+
+    def rows():
+        for i in range(1, count + 1):
+            title = ' '.join(rnd.choices(VOCAB, WEIGHTS, k=6))
+            body = '\n\n'.join(' '.join(rnd.choices(VOCAB, WEIGHTS, k=40)) for _ in range(5))
+            yield i, title, body
+
+    conn.executemany("INSERT INTO post VALUES (?, ?, ?)", rows())
+    for sql in fts_ddl('post', ('title', 'body')) + [fts_rebuild_sql('post')]:
+        conn.execute(sql)
+    conn.commit()
+    return conn
+
+
+def timed(conn, sql, params, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 2)
+
+
+def run(sizes, repeat=5):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            conn = make_db(os.path.join(tmp, f'posts_{size}.sqlite3'), size)
+            for q in QUERIES:
+                like = f'%{q}%'
+                match = {'q': match_expression(q), 'skip': MAX_CANDIDATES - 1}
+                results.append({
+                    'posts': size,
+                    'query': q,
+                    'title_like_ms': timed(conn, "SELECT id FROM post WHERE title LIKE ? "
+                                                 "ORDER BY id DESC LIMIT 20", (like,), repeat),
+                    'title_body_like_ms': timed(conn, "SELECT id FROM post WHERE title LIKE ? OR body LIKE ? "
+                                                      "ORDER BY id DESC LIMIT 20", (like, like), repeat),
+                    'fts_ranked_ms': timed(conn, RANKED.format(''), match, repeat),
+                    'fts_newest_ms': timed(conn, RANKED.format(NEWEST), match, repeat),
+                })
+            conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args.sizes, args.repeat), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+#!/bin/python3
+"""Memory per worker and cold-start time: one gunicorn per app vs the shared host.
+
+Three layouts are compared, each with --workers gunicorn workers:
+
+- ``separate``: every app under its own gunicorn, as with app4's Procfile.
+- ``host``: host.py serving every app from one gunicorn, with each app
+  loading on its first request.
+- ``host-preload``: the same, with ``FIRSTAPPS_PRELOAD=1 --preload``, so the
+  apps are built once in the master and shared copy-on-write.
+
+Cold start is the time from launch until every app has answered one
+request. Memory is read after each app has had enough requests to reach
+every worker. It comes from /proc/<pid>/smaps_rollup, so Linux only. RSS
+counts shared pages in full for every process. PSS splits each shared
+page between the processes that map it, so the PSS total is the memory
+the layout really costs.
+
+Everything runs in a temporary copy of the tree, so the blogs' instance/
+databases are not touched.
+
+    python -m bench.host_memory --workers 4
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# mount -> (app directory, gunicorn app spec when run on its own, first page)
+APPS = {
+    '/app1': ('app1', 'app:create_app()', '/'),
+    '/app2': ('app2', 'app:create_app()', '/home'),
+    '/app3': ('app3', 'app:create_app()', '/home'),
+    '/app4': ('app4', 'app:create_app()', '/home'),
+    '/app5': ('app5', 'app:create_app()', '/home'),
+    '/blog001': ('blog001', 'app:create_app()', '/'),
+    '/blog002': ('blog002', 'app:create_app()', '/'),
+    '/unrendered/app1': ('unrendered', 'app1:create_app()', '/'),
+    '/unrendered/app2': ('unrendered', 'app2:create_app()', '/'),
+}
+LAYOUTS = ('separate', 'host', 'host-preload')
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def launch(cwd, spec, workers, preload=False, env=None):
+    """Start gunicorn; returns (process, base URL)."""
+    port = _free_port()
+    env = dict({k: v for k, v in os.environ.items() if k != 'DATABASE_URL'}, **(env or {}))
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}',
+         '--log-level', 'warning'] + (['--preload'] if preload else []) + [spec],
+        cwd=cwd, env=env)
+    return proc, f'http://127.0.0.1:{port}'
+
+
+def get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=30) as resp:
+            resp.read()
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+
+def wait_until_served(urls, procs, timeout=120):
+    """Poll each URL until it answers; returns seconds until the last one did."""
+    started = time.perf_counter()
+    pending = list(urls)
+    while pending:
+        if any(p.poll() is not None for p in procs):
+            raise RuntimeError('gunicorn exited during start-up')
+        if time.perf_counter() - started > timeout:
+            raise RuntimeError(f'no answer from {pending}')
+        pending = [url for url in pending if get(url) is None]
+        if pending:
+            time.sleep(0.02)
+    return time.perf_counter() - started
+
+
+def memory(pid):
+    """{'rss': kB, 'pss': kB} of one process."""
+    out = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('Rss', 'Pss'):
+                out[key.lower()] = int(value.split()[0])
+    return out
+
+
+def children(pid):
+    kids = []
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    # the ppid is the 2nd field after the parenthesised command name
+                    if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                        kids.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                pass
+    return kids
+
+
+def run_layout(tree, layout, workers):
+    if layout == 'separate':
+        launched = []
+        for mount, (directory, spec, page) in APPS.items():
+            proc, base = launch(os.path.join(tree, directory), spec, workers)
+            launched.append((proc, base + page))
+        procs = [proc for proc, _ in launched]
+        urls = [url for _, url in launched]
+    else:
+        preload = layout == 'host-preload'
+        proc, base = launch(tree, 'host:app', workers, preload=preload,
+                            env={'FIRSTAPPS_PRELOAD': '1'} if preload else None)
+        procs = [proc]
+        urls = [base + mount + page for mount, (_, _, page) in APPS.items()]
+    try:
+        cold_start = wait_until_served(urls, procs)
+        # enough requests that every worker has loaded every app
+        with ThreadPoolExecutor(max_workers=workers * 2) as pool:
+            list(pool.map(get, urls * workers * 4))
+        masters = [memory(p.pid) for p in procs]
+        workers_mem = [memory(kid) for p in procs for kid in children(p.pid)]
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait()
+    total = masters + workers_mem
+    mb = lambda kb: round(kb / 1024, 1)
+    return {
+        'processes': len(total),
+        'cold_start_s': round(cold_start, 2),
+        'worker_rss_mb': mb(sum(m['rss'] for m in workers_mem) / len(workers_mem)),
+        'worker_pss_mb': mb(sum(m['pss'] for m in workers_mem) / len(workers_mem)),
+        'total_rss_mb': mb(sum(m['rss'] for m in total)),
+        'total_pss_mb': mb(sum(m['pss'] for m in total)),
+    }
+
+
+def copy_tree(tmp):
+    tree = os.path.join(tmp, 'Firstapps')
+    shutil.copytree(ROOT, tree, ignore=shutil.ignore_patterns(
+        'instance', 'page_cache', '*.sqlite3*', 'bench'))
+    return tree
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers per server')
+    parser.add_argument('--layouts', nargs='+', choices=LAYOUTS, default=list(LAYOUTS))
+    parser.add_argument('--out', help='write the results JSON here')
+    args = parser.parse_args()
+    results = {'meta': {'workers': args.workers, 'apps': len(APPS), 'cpus': os.cpu_count()}}
+    for layout in args.layouts:
+        # a fresh copy per layout: every run creates its databases from scratch
+        with tempfile.TemporaryDirectory() as tmp:
+            results[layout] = run_layout(copy_tree(tmp), layout, args.workers)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/bin/python3
+"""Fire concurrent GETs at a running app and report latency percentiles.
+
+Start the app under gunicorn first, e.g. for blog002:
+
+    cd blog002 && flask --app app initdb
+    NOIR_BOOTSTRAP=0 gunicorn -w 4 --preload -b 127.0.0.1:8000 'app:create_app()'
+    python -m bench.http_latency --url http://127.0.0.1:8000/ -n 2000 -c 16
+"""
+import argparse
+import json
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+def fetch(url, headers=None):
+    req = urllib.request.Request(url, headers=headers or {})
+    start = time.perf_counter()
+    with urllib.request.urlopen(req) as resp:
+        resp.read()
+        status = resp.status
+    return time.perf_counter() - start, status
+
+
+def run(url, requests=1000, concurrency=8, headers=None):
+    """Return a dict of throughput and p50/p95/p99 latency in milliseconds."""
+    # one warm-up request so worker start-up is not counted
+    fetch(url, headers)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: fetch(url, headers), range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies = [r[0] * 1000 for r in results]
+    errors = sum(1 for r in results if r[1] >= 500)
+    return {
+        'url': url,
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': errors,
+        'rps': round(requests / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000/')
+    parser.add_argument('-n', '--requests', type=int, default=1000)
+    parser.add_argument('-c', '--concurrency', type=int, default=8)
+    args = parser.parse_args()
+    print(json.dumps(run(args.url, args.requests, args.concurrency), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/bin/python3
+"""Anonymous read latency while /login is flooded, with and without the hashing cap.
+
+Runs blog002 under gunicorn twice on the same generated dataset:
+
+- ``unbounded``: every login hashes inline on its request thread, with no
+  cap on how many run at once. This is how login worked before
+  core.hashing.
+- ``bounded``: the app's defaults, i.e. PASSWORD_HASH_SLOTS hashes at once
+  on the host, in a process pool, and a 503 once PASSWORD_HASH_WAIT is up.
+
+Each run measures --readers clients fetching topic and post pages, first
+alone and then next to --flood clients posting correct credentials to
+/login as fast as they can. The report gives read p50/p95/p99 for both
+phases, plus login throughput and how many logins were turned away.
+
+    python -m bench.login_flood --workers 2 --threads 4 --flood 16 --seconds 10
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from bench.datagen import BENCH_PASSWORD, generate, load_blog
+from bench.http_latency import percentile
+from bench.suite import _NoRedirect, dataset_ids, start_gunicorn
+
+CONFIGS = {
+    'unbounded': {'NOIR_HASH_SLOTS': '1024', 'NOIR_HASH_WORKERS': '0'},
+    'bounded': {},
+}
+
+
+def fetch(opener, req):
+    started = time.perf_counter()
+    try:
+        with opener.open(req) as resp:
+            resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        status = e.code
+    return time.perf_counter() - started, status
+
+
+def latency(samples):
+    ms = [s * 1000 for s, _ in samples] or [0.0]
+    return {'p50_ms': round(percentile(ms, 50), 2), 'p95_ms': round(percentile(ms, 95), 2),
+            'p99_ms': round(percentile(ms, 99), 2)}
+
+
+def run_phase(base, ids, readers, flood, seconds, seed):
+    opener = urllib.request.build_opener(_NoRedirect)
+    login = urllib.parse.urlencode({'credential': ids['user'], 'password': BENCH_PASSWORD}).encode()
+    stop = threading.Event()
+    reads, logins = [], []
+
+    def read_loop(n):
+        rnd = random.Random(seed + n)
+        while not stop.is_set():
+            path = (f"/topic/{rnd.choice(ids['topics'])}" if rnd.random() < 0.5
+                    else f"/post/{rnd.choice(ids['posts'])}")
+            reads.append(fetch(opener, base + path))
+
+    def login_loop(n):
+        while not stop.is_set():
+            logins.append(fetch(opener, urllib.request.Request(base + '/login', data=login)))
+
+    threads = ([threading.Thread(target=read_loop, args=(n,)) for n in range(readers)]
+               + [threading.Thread(target=login_loop, args=(n,)) for n in range(flood)])
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    result = {'reads': len(reads), 'read_rps': round(len(reads) / seconds, 1),
+              'read_errors': sum(1 for _, status in reads if status >= 500), **latency(reads)}
+    if flood:
+        result['login'] = {
+            'attempts': len(logins),
+            'ok_per_s': round(sum(1 for _, status in logins if status == 302) / seconds, 1),
+            'busy_503': sum(1 for _, status in logins if status == 503),
+            'other': sum(1 for _, status in logins if status not in (302, 503)),
+            **latency(logins),
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help='existing SQLite database (default: generate a temporary one)')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=4, help='threads per gunicorn worker')
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--flood', type=int, default=16, help='concurrent /login clients')
+    parser.add_argument('--seconds', type=float, default=10, help='per phase')
+    parser.add_argument('--configs', nargs='+', choices=CONFIGS, default=list(CONFIGS))
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', help='write the results JSON here')
+    args = parser.parse_args()
+
+    results = {'meta': {'workers': args.workers, 'threads': args.threads, 'readers': args.readers,
+                        'flood': args.flood, 'seconds': args.seconds, 'cpus': os.cpu_count()}}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or os.path.join(tmp, 'bench.sqlite3')
+        fresh = not os.path.exists(db_path)
+        m = load_blog(db_path)
+        if fresh:
+            generate(m, users=50, posts=2000, comments=5000, seed=args.seed)
+        ids = dataset_ids(m)
+        for name in args.configs:
+            proc, base = start_gunicorn(db_path, args.workers, args.threads, env=CONFIGS[name])
+            try:
+                run_phase(base, ids, args.readers, 0, 1, args.seed)      # warm up
+                results[name] = {
+                    'idle': run_phase(base, ids, args.readers, 0, args.seconds, args.seed),
+                    'flood': run_phase(base, ids, args.readers, args.flood, args.seconds, args.seed),
+                }
+            finally:
+                proc.terminate()
+                proc.wait()
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
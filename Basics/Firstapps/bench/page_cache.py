@@ -0,0 +1,96 @@
+#!/bin/python3
+"""Anonymous listing-page throughput with the page cache off, 'lru' and 'file'.
+
+Builds blog002 on a throwaway SQLite file (its DATABASE_URL) and seeds
+it with posts. Then it replays anonymous GETs over /, /topics and
+/topic/<id> through the test client. Every --write-every requests, one post
+is added and the cache invalidated, the same as post_new does. Reported per
+mode: requests/s, mean latency and cache hit rate.
+
+    python -m bench.page_cache --posts 2000 --requests 3000 --write-every 200
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from core.pagecache import FileBackend, LRUBackend
+
+BLOG002 = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'blog002', 'app.py')
+
+
+def load_blog(db_path):
+    spec = importlib.util.spec_from_file_location('blog002_app', BLOG002)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    module.app = module.create_app({'DATABASE_URL': 'sqlite:///' + db_path})
+    return module
+
+
+def seed(m, posts):
+    with m.app.app_context():
+        user = m.User(username='bench', email='bench@example.com')
+        user.set_password('bench')
+        m.db.session.add(user)
+        m.db.session.flush()
+        topic_ids = [t.id for t in m.Topic.query.all()]
+        m.db.session.execute(m.Post.__table__.insert(), [
+            {'title': f'post {i}', 'body': 'lorem ipsum ' * 80, 'user_id': user.id,
+             'topic_id': topic_ids[i % len(topic_ids)]}
+            for i in range(posts)])
+        m.recount_activity()
+        m.db.session.commit()
+        return user.id, topic_ids
+
+
+def run(m, mode, requests, write_every, user_id, topic_ids, rnd):
+    app, cache = m.app, m.page_cache
+    app.config['PAGE_CACHE_ENABLED'] = mode != 'off'
+    if mode == 'file':
+        cache.backend = FileBackend(tempfile.mkdtemp(prefix='page_cache_'))
+    else:
+        cache.backend = LRUBackend(app.config['PAGE_CACHE_SIZE'])
+    cache.hits = cache.misses = cache.stores = cache.invalidations = 0
+    paths = ['/', '/topics'] + [f'/topic/{tid}' for tid in topic_ids]
+    client = app.test_client()
+    started = time.perf_counter()
+    for i in range(1, requests + 1):
+        client.get(rnd.choice(paths))
+        if write_every and i % write_every == 0:
+            with app.app_context():
+                m.db.session.add(m.Post(title=f'new {i}', body='fresh', user_id=user_id,
+                                        topic_id=rnd.choice(topic_ids)))
+                m.db.session.commit()
+            cache.invalidate()
+    elapsed = time.perf_counter() - started
+    return {
+        'mode': mode,
+        'requests': requests,
+        'req_per_s': round(requests / elapsed, 1),
+        'mean_ms': round(elapsed / requests * 1000, 3),
+        **{k: v for k, v in cache.stats().items() if k in ('hit_rate', 'invalidations')},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--write-every', type=int, default=200, help='0 for a read-only run')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        m = load_blog(os.path.join(tmp, 'bench.sqlite3'))
+        user_id, topic_ids = seed(m, args.posts)
+        results = [run(m, mode, args.requests, args.write_every, user_id, topic_ids, random.Random(args.seed))
+                   for mode in ('off', 'lru', 'file')]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
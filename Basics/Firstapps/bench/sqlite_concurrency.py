@@ -0,0 +1,108 @@
+#!/bin/python3
+"""Mixed read/write load on one SQLite file, default settings vs the profile.
+
+Each process stands in for a gunicorn worker. Readers run the index-page
+query and writers insert comments, all for a fixed duration. Reported per
+profile: reads/s, writes/s, p99 read latency and "database is locked"
+errors.
+
+    python -m bench.sqlite_concurrency --readers 6 --writers 2 --seconds 5
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from core.database import DEFAULT_SQLITE_PRAGMAS
+
+READ_SQL = "SELECT id, title, created_at FROM post ORDER BY created_at DESC, id DESC LIMIT 20"
+WRITE_SQL = "INSERT INTO comment (body, created_at, user_id, post_id) VALUES (?, datetime('now'), 1, ?)"
+
+
+def connect(path, profile):
+    if profile == 'default':
+        # what the apps got before: pysqlite's 5s lock wait, rollback journal
+        return sqlite3.connect(path)
+    conn = sqlite3.connect(path, timeout=DEFAULT_SQLITE_PRAGMAS['busy_timeout'] / 1000)
+    for name, value in DEFAULT_SQLITE_PRAGMAS.items():
+        conn.execute(f"PRAGMA {name}={value}")
+    return conn
+
+
+def prepare(path, posts=5000):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE post (id INTEGER PRIMARY KEY, title TEXT, body TEXT, created_at TEXT);
+        CREATE INDEX ix_post_created_id ON post (created_at, id);
+        CREATE TABLE comment (id INTEGER PRIMARY KEY, body TEXT, created_at TEXT, user_id INT, post_id INT);
+    """)
+    conn.executemany(
+        "INSERT INTO post (title, body, created_at) VALUES (?, ?, datetime('now', ?))",
+        ((f"post {i}", "body " * 200, f"-{i} minutes") for i in range(posts)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def worker(path, profile, role, seconds, queue):
+    conn = connect(path, profile)
+    ops = errors = 0
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            if role == 'read':
+                conn.execute(READ_SQL).fetchall()
+            else:
+                conn.execute(WRITE_SQL, ("load test comment " * 10, ops % 5000 + 1))
+                conn.commit()
+            ops += 1
+            latencies.append(time.perf_counter() - start)
+        except sqlite3.OperationalError:
+            errors += 1
+            conn.rollback()
+    conn.close()
+    queue.put((role, ops, errors, latencies))
+
+
+def run_profile(profile, readers, writers, seconds):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'load.sqlite3')
+        prepare(path)
+        queue = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=worker, args=(path, profile, role, seconds, queue))
+                 for role in ['read'] * readers + ['write'] * writers]
+        for p in procs:
+            p.start()
+        results = [queue.get() for _ in procs]
+        for p in procs:
+            p.join()
+    reads = [r for r in results if r[0] == 'read']
+    writes = [r for r in results if r[0] == 'write']
+    read_lat = sorted(l for r in reads for l in r[3])
+    p99 = read_lat[int(len(read_lat) * 0.99)] * 1000 if read_lat else 0.0
+    return {
+        'profile': profile,
+        'reads_per_s': round(sum(r[1] for r in reads) / seconds, 1),
+        'writes_per_s': round(sum(r[1] for r in writes) / seconds, 1),
+        'read_p99_ms': round(p99, 2),
+        'locked_errors': sum(r[2] for r in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=6)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+    results = [run_profile(p, args.readers, args.writers, args.seconds) for p in ('default', 'tuned')]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+#!/bin/python3
+"""Throughput and latency of blog002's main pages, saved to JSON and checked against a baseline.
+
+Scenarios: index, topic_view, post_detail, search and post_comment, each
+run as a logged-in user (guests are capped at five post views). There are
+two drivers:
+
+- ``client``: in-process through the Flask test client, one request at a
+  time. It is quick and quiet, and good for comparing code changes.
+- ``gunicorn``: a local ``gunicorn -w N`` over HTTP with -c concurrent
+  clients, closer to production.
+
+The dataset comes from bench.datagen. It is generated into a temporary
+file unless --db names an existing one.
+
+    python -m bench.suite --posts 20000 --out results.json
+    python -m bench.suite --driver gunicorn --workers 4 -c 16 --baseline results.json
+
+When --baseline is given, a scenario counts as a regression if its
+requests/s drops, or its p95 rises, by more than --tolerance. Any
+regression makes the command exit with status 1.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.datagen import BENCH_PASSWORD, BLOG002, VOCAB, generate, load_blog
+from bench.http_latency import percentile
+
+SCENARIOS = ('index', 'topic_view', 'post_detail', 'search', 'post_comment')
+
+
+def scenario_request(name, rnd, ids):
+    """(method, path, form) for one request of scenario ``name``."""
+    if name == 'index':
+        return 'GET', '/', None
+    if name == 'topic_view':
+        return 'GET', f"/topic/{rnd.choice(ids['topics'])}", None
+    if name == 'post_detail':
+        return 'GET', f"/post/{rnd.choice(ids['posts'])}", None
+    if name == 'search':
+        return 'GET', '/search?' + urllib.parse.urlencode({'q': rnd.choice(VOCAB[:500])}), None
+    return 'POST', f"/post/{rnd.choice(ids['posts'])}/comment", {'comment': f"bench comment {rnd.random()}"}
+
+
+def dataset_ids(m):
+    with m.app.app_context():
+        return {
+            'topics': [tid for (tid,) in m.db.session.query(m.Topic.id)],
+            'posts': [pid for (pid,) in m.db.session.query(m.Post.id)],
+            'user': m.db.session.query(m.User.username).filter(m.User.username.like('user%'))
+                     .order_by(m.User.id).limit(1).scalar(),
+            'counts': {'users': m.User.query.count(), 'posts': m.Post.query.count(),
+                       'comments': m.Comment.query.count()},
+        }
+
+
+def server_timing(header):
+    """{'sql': 1.2, ...} milliseconds from a Server-Timing header."""
+    phases = {}
+    for entry in (header or '').split(','):
+        name, _, params = entry.strip().partition(';')
+        for param in params.split(';'):
+            if param.startswith('dur='):
+                phases[name] = float(param[4:])
+    return phases
+
+
+def summarize(samples, elapsed):
+    latencies = [s[0] * 1000 for s in samples]
+    phases = {}
+    for _, _, timing in samples:
+        for name, ms in timing.items():
+            phases[name] = phases.get(name, 0.0) + ms
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for s in samples if s[1] >= 500),
+        'rps': round(len(samples) / elapsed, 1),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        # mean server-side split, from the app's Server-Timing header
+        'server_ms': {name: round(total / len(samples), 2) for name, total in sorted(phases.items())},
+    }
+
+
+# --- drivers -------------------------------------------------------
+def run_client(m, ids, scenarios, requests, warmup, seed):
+    login = m.app.test_client()
+    login.post('/login', data={'credential': ids['user'], 'password': BENCH_PASSWORD})
+    # replay the login cookie unchanged, as run_http() does
+    cookie = f"session={login.get_cookie('session').value}"
+    client = m.app.test_client(use_cookies=False)
+    results = {}
+    for name in scenarios:
+        rnd = random.Random(seed)
+
+        def one():
+            method, path, form = scenario_request(name, rnd, ids)
+            started = time.perf_counter()
+            response = client.open(path, method=method, data=form, headers={'Cookie': cookie})
+            response.get_data()
+            return (time.perf_counter() - started, response.status_code,
+                    server_timing(response.headers.get('Server-Timing')))
+
+        for _ in range(warmup):
+            one()
+        started = time.perf_counter()
+        samples = [one() for _ in range(requests)]
+        results[name] = summarize(samples, time.perf_counter() - started)
+    return results
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None     # time the POST itself, not the page it redirects to
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(db_path, workers, threads=1, env=None):
+    port = _free_port()
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.abspath(db_path), NOIR_BOOTSTRAP='0',
+               **(env or {}))
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(workers), '--threads', str(threads), '--preload',
+         '-b', f'127.0.0.1:{port}', '--log-level', 'warning', 'app:create_app()'],
+        cwd=os.path.dirname(BLOG002), env=env)
+    base = f'http://127.0.0.1:{port}'
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(base + '/topics').read()
+            return proc, base
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError('gunicorn exited during start-up')
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError('gunicorn did not start listening')
+
+
+def run_http(base, ids, scenarios, requests, warmup, concurrency, seed):
+    opener = urllib.request.build_opener(_NoRedirect)
+    login = urllib.parse.urlencode({'credential': ids['user'], 'password': BENCH_PASSWORD}).encode()
+    try:
+        opener.open(base + '/login', login)
+    except urllib.error.HTTPError as e:
+        # the session cookie arrives on the 302; it is replayed as-is, so
+        # the flashes later responses add never reach the next request
+        cookie = e.headers['Set-Cookie'].split(';', 1)[0]
+    else:
+        raise RuntimeError('login failed')
+    results = {}
+    for name in scenarios:
+        rnd = random.Random(seed)
+        plan = [scenario_request(name, rnd, ids) for _ in range(warmup + requests)]
+
+        def one(item):
+            method, path, form = item
+            data = urllib.parse.urlencode(form).encode() if form else None
+            req = urllib.request.Request(base + path, data=data, method=method, headers={'Cookie': cookie})
+            started = time.perf_counter()
+            try:
+                with opener.open(req) as resp:
+                    resp.read()
+                    status, headers = resp.status, resp.headers
+            except urllib.error.HTTPError as e:
+                e.read()
+                status, headers = e.code, e.headers
+            return time.perf_counter() - started, status, server_timing(headers.get('Server-Timing'))
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(one, plan[:warmup]))
+            started = time.perf_counter()
+            samples = list(pool.map(one, plan[warmup:]))
+        results[name] = summarize(samples, time.perf_counter() - started)
+    return results
+
+
+# --- baseline --------------------------------------------------------
+def compare(results, baseline, tolerance):
+    """Per-scenario ratios against ``baseline``, and the names that regressed."""
+    rows, regressions = [], []
+    for name, now in results['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if not before:
+            continue
+        rps = now['rps'] / before['rps'] if before['rps'] else None
+        p95 = now['p95_ms'] / before['p95_ms'] if before['p95_ms'] else None
+        worse = (rps is not None and rps < 1 - tolerance) or (p95 is not None and p95 > 1 + tolerance)
+        if worse:
+            regressions.append(name)
+        rows.append({'scenario': name, 'rps': now['rps'], 'baseline_rps': before['rps'],
+                     'rps_ratio': round(rps, 3) if rps else None,
+                     'p95_ms': now['p95_ms'], 'baseline_p95_ms': before['p95_ms'],
+                     'p95_ratio': round(p95, 3) if p95 else None,
+                     'regression': worse})
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help='existing SQLite database (default: generate a temporary one)')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--posts', type=int, default=5000)
+    parser.add_argument('--comments', type=int, default=20000)
+    parser.add_argument('--driver', choices=('client', 'gunicorn'), default='client')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers')
+    parser.add_argument('-c', '--concurrency', type=int, default=8, help='gunicorn driver clients')
+    parser.add_argument('-n', '--requests', type=int, default=500, help='per scenario')
+    parser.add_argument('--warmup', type=int, default=50, help='untimed requests per scenario')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', help='write the results JSON here')
+    parser.add_argument('--baseline', help='results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed fractional slowdown')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or os.path.join(tmp, 'bench.sqlite3')
+        fresh = not os.path.exists(db_path)
+        m = load_blog(db_path)
+        if fresh:
+            generate(m, args.users, args.posts, args.comments, seed=args.seed)
+        ids = dataset_ids(m)
+        meta = {
+            'driver': args.driver, 'requests': args.requests, 'warmup': args.warmup,
+            'dataset': ids['counts'], 'python': platform.python_version(),
+            'machine': platform.machine(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        if args.driver == 'client':
+            scenarios = run_client(m, ids, args.scenarios, args.requests, args.warmup, args.seed)
+        else:
+            meta.update(workers=args.workers, concurrency=args.concurrency)
+            proc, base = start_gunicorn(db_path, args.workers)
+            try:
+                scenarios = run_http(base, ids, args.scenarios, args.requests, args.warmup,
+                                     args.concurrency, args.seed)
+            finally:
+                proc.terminate()
+                proc.wait()
+    results = {'meta': meta, 'scenarios': scenarios}
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    if args.baseline:
+        with open(args.baseline) as f:
+            rows, regressions = compare(results, json.load(f), args.tolerance)
+        print(json.dumps(rows, indent=2))
+        if regressions:
+            print(f"Regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/bin/python3
+"""Render time of blog002's index for 20, 100 and 1000 post cards.
+
+Generates a throwaway blog002 database, loads one page of N posts the way
+the index view does (author and topic joined), and renders index.html
+in a request context, without touching the database again.
+
+``startup`` is the time to load all of blog002's templates into an empty
+environment: ``compile`` parses and compiles every one, as each worker
+did on its first requests before core.templating, and ``bytecode`` reads
+them from a filled bytecode directory, as after ``flask compile-templates``.
+
+Per N, in ms:
+
+- ``uncached``: median steady-state render with the fragment cache off,
+  so every card is rendered.
+- ``fragment_miss``: the fragment cache emptied before each render, so
+  every card is rendered and stored.
+- ``fragment_hit``: every card served from the fragment cache.
+
+    python -m bench.template_render --sizes 20 100 1000 --repeat 20
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from flask import render_template
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy.orm import joinedload
+
+from bench.datagen import generate, load_blog
+from core.pagination import keyset_paginate
+
+
+def timed(render, repeat=1, before=None):
+    samples = []
+    for _ in range(repeat):
+        if before:
+            before()
+        started = time.perf_counter()
+        render()
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 2)
+
+
+def startup(m, repeat, bytecode_dir):
+    env, warm = m.app.jinja_env, m.app.extensions['templates'].warm
+    env.bytecode_cache = None
+    result = {'templates': warm(), 'compile': timed(warm, repeat, before=env.cache.clear)}
+    env.bytecode_cache = FileSystemBytecodeCache(bytecode_dir)
+    warm()      # fill the directory
+    result['bytecode'] = timed(warm, repeat, before=env.cache.clear)
+    return result
+
+
+def run(m, size, repeat):
+    app, env = m.app, m.app.jinja_env
+    fragments = env.fragment_cache
+    with app.test_request_context('/'):
+        query = m.Post.query.options(joinedload(m.Post.author), joinedload(m.Post.topic))
+        posts = keyset_paginate(query, m.Post, None, size, max_page_size=size)
+        topics = m.top_topics(10)
+
+        def render():
+            return render_template('index.html', posts=posts, topics=topics)
+
+        env.fragment_cache = None
+        render()
+        result = {'uncached': timed(render, repeat)}
+        env.fragment_cache = fragments
+        result['fragment_miss'] = timed(render, repeat, before=fragments.clear)
+        render()
+        result['fragment_hit'] = timed(render, repeat)
+        result['bytes'] = len(render())
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=20, help='renders per steady-state measurement')
+    parser.add_argument('--out', help='write the results JSON here')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        m = load_blog(os.path.join(tmp, 'bench.sqlite3'))
+        generate(m, users=50, posts=max(args.sizes), comments=0)
+        bytecode_dir = os.path.join(tmp, 'bytecode')
+        os.makedirs(bytecode_dir)
+        results = {'startup': startup(m, args.repeat, bytecode_dir)}
+        for size in args.sizes:
+            results[size] = run(m, size, args.repeat)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
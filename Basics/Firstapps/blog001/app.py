@@ -1,36 +1,44 @@
 import os
+import re
+import sys
+import time
+from collections import Counter
 from datetime import datetime
-from flask import Flask, render_template, redirect, url_for, flash, request, abort
+import click
+from flask import Flask, current_app, render_template, redirect, url_for, flash, request, abort, session
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, TextAreaField, SubmitField, SelectField
 from wtforms.validators import DataRequired, Length, Email, EqualTo, ValidationError
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.orm import joinedload
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # shared core package
+from core.pagination import keyset_paginate, page_url
+from core.querycount import init_query_counter, query_budget
+from core.fts import deferred_index, fts_available, fts_ddl, fts_rebuild_sql, match_filter
+from core.database import configure_database, init_sqlite_pragmas, schema_lock
+from core.conditional import conditional
+from core.assets import init_assets
+from core.compress import init_compression
+from core.metrics import Metrics
+from core.usercache import UserCache
+from core.hashing import PasswordHasher
+from core.templating import init_templates
+from core.views import Views
+from core.transfer import BatchInserter, ExportWriter, id_offset, read_records, reset_sequence
 
 # ------------------------------
-# App Factory
+# Extensions
 # ------------------------------
-def create_app():
-    app = Flask(__name__, instance_relative_config=True)
-
-    # Secure defaults
-    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-noir8-change-me')
-    os.makedirs(app.instance_path, exist_ok=True)
-    db_path = os.path.join(app.instance_path, 'noir_blog.sqlite3')
-    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{db_path}"
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-    # Blue/green-ready toggle for DEBUG via env
-    app.config['DEBUG'] = os.environ.get('FLASK_DEBUG', '0') == '1'
-
-    return app
-
-app = create_app()
-db  = SQLAlchemy(app)
-login_manager = LoginManager(app)
+# module-level, so the models and views below can use them; create_app()
+# binds them to the app it builds, one app per process
+db = SQLAlchemy()
+login_manager = LoginManager()
 login_manager.login_view = 'login'
 login_manager.login_message_category = 'warning'
+passwords = PasswordHasher()
+views = Views()
 
 # ------------------------------
 # Models
@@ -46,10 +54,13 @@ class User(db.Model, UserMixin):
     comments = db.relationship('Comment', backref='author', lazy='dynamic', cascade='all, delete-orphan')
 
     def set_password(self, raw):
-        self.password_hash = generate_password_hash(raw)
+        self.password_hash = passwords.hash(raw)
 
     def check_password(self, raw):
-        return check_password_hash(self.password_hash, raw)
+        ok = passwords.verify(self.password_hash, raw)
+        if ok and passwords.needs_rehash(self.password_hash):
+            self.password_hash = passwords.hash(raw)   # committed by login()
+        return ok
 
 class Topic(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -69,6 +80,12 @@ class Post(db.Model):
 
     comments = db.relationship('Comment', backref='post', lazy='dynamic', cascade='all, delete-orphan')
 
+    # keyset pagination seeks on (created_at, id), optionally within a topic
+    __table_args__ = (
+        db.Index('ix_post_created_id', 'created_at', 'id'),
+        db.Index('ix_post_topic_created_id', 'topic_id', 'created_at', 'id'),
+    )
+
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     body = db.Column(db.Text, nullable=False)
@@ -77,12 +94,20 @@ class Comment(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
 
+    # a post's thread in order, and its newest comment for the page validators
+    __table_args__ = (
+        db.Index('ix_comment_post_created', 'post_id', 'created_at'),
+    )
+
 # ------------------------------
 # Login loader
 # ------------------------------
+# id and username cached per worker; nothing here edits users, so the TTL is the only expiry
+user_cache = UserCache(db=db, model=User, columns=('id', 'username'))
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.load(user_id)
 
 # ------------------------------
 # Forms
@@ -134,70 +159,110 @@ def seed_default_topics():
             db.session.add(Topic(name=name, slug=slug))
     db.session.commit()
 
+def ensure_search_index():
+    """Create the post_fts index and its triggers, backfilling if new (SQLite only)."""
+    if not fts_available(db.session) or db.inspect(db.engine).has_table('post_fts'):
+        return
+    for sql in fts_ddl('post', ('title', 'body')) + [fts_rebuild_sql('post')]:
+        db.session.execute(db.text(sql))
+    db.session.commit()
+
+def listing_validators(**view_args):
+    """Posts are only ever added, so the newest one stands for the listing."""
+    return db.session.query(
+        db.func.max(Post.id), db.select(db.func.count(Topic.id)).scalar_subquery(),
+    ).one()
+
+def post_validators(post_id):
+    # the page's comment form carries a CSRF token tied to the session; a
+    # session without one yet gets the page that mints it, never a 304
+    session_token = session.get(current_app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token'))
+    if session_token is None:
+        return None
+    def thread(agg):
+        return db.select(agg).where(Comment.post_id == Post.id).scalar_subquery()
+    row = db.session.query(
+        thread(db.func.count(Comment.id)), thread(db.func.max(Comment.created_at)),
+    ).filter(Post.id == post_id).first()
+    if row is None:
+        return None
+    # the signed token also expires; re-render before a cached copy's token does
+    token_window = int(time.time() // ((current_app.config.get('WTF_CSRF_TIME_LIMIT') or 3600) // 2))
+    return *row, session_token, token_window
+
 # ------------------------------
 # Routes
 # ------------------------------
-@app.route('/')
+@views.route('/')
+@query_budget(5)
+@conditional(listing_validators)
 def index():
     q = request.args.get('q', '').strip()
     topic_slug = request.args.get('topic')
-    page = max(int(request.args.get('page', 1)), 1)
+    cursor = request.args.get('cursor')
 
-    posts = Post.query.order_by(Post.created_at.desc())
+    # cards show topic and author: load them with the posts, not per card
+    posts = Post.query.options(joinedload(Post.author), joinedload(Post.topic))
     if topic_slug:
         t = Topic.query.filter_by(slug=topic_slug).first_or_404()
         posts = posts.filter_by(topic_id=t.id)
     if q:
-        posts = posts.filter(Post.title.ilike(f'%{q}%') | Post.body.ilike(f'%{q}%'))
+        # the FTS index on SQLite, LIKE on other databases
+        posts = posts.filter(match_filter(db.session, Post, q, ('title', 'body')))
 
-    posts = posts.paginate(page=page, per_page=10, error_out=False)
+    posts = keyset_paginate(posts, Post, cursor, per_page=10)
     topics = Topic.query.order_by(Topic.name.asc()).all()
     return render_template('index.html', posts=posts, topics=topics, active_topic=topic_slug, q=q)
 
-@app.route('/topics')
+@views.route('/topics')
+@query_budget(2)
 def topics():
     topics = Topic.query.order_by(Topic.name.asc()).all()
     return render_template('topics.html', topics=topics)
 
-@app.route('/t/<slug>')
+@views.route('/t/<slug>')
+@query_budget(5)
+@conditional(listing_validators)
 def by_topic(slug):
     topic = Topic.query.filter_by(slug=slug).first_or_404()
-    page = max(int(request.args.get('page', 1)), 1)
-    posts = Post.query.filter_by(topic_id=topic.id).order_by(Post.created_at.desc()).paginate(page=page, per_page=10, error_out=False)
+    posts = Post.query.filter_by(topic_id=topic.id).options(joinedload(Post.author), joinedload(Post.topic))
+    posts = keyset_paginate(posts, Post, request.args.get('cursor'), per_page=10)
     topics = Topic.query.order_by(Topic.name.asc()).all()
     return render_template('index.html', posts=posts, topics=topics, active_topic=slug, q='')
 
-@app.route('/post/<int:post_id>', methods=['GET', 'POST'])
+@views.route('/post/<int:post_id>', methods=['GET', 'POST'])
+@query_budget(4)
+@conditional(post_validators)
 def post_detail(post_id):
-    post = Post.query.get_or_404(post_id)
+    post = Post.query.options(joinedload(Post.author), joinedload(Post.topic)).get_or_404(post_id)
     form = CommentForm()
     if form.validate_on_submit():
         if not current_user.is_authenticated:
             abort(403)
-        c = Comment(body=form.body.data, author=current_user, post=post)
+        c = Comment(body=form.body.data, user_id=current_user.id, post=post)
         db.session.add(c)
         db.session.commit()
         flash('Comment added.', 'success')
         return redirect(url_for('post_detail', post_id=post.id))
 
     # ✅ Prefetch comments here (fixed)
-    comments = post.comments.order_by(Comment.created_at.desc()).all()
+    comments = post.comments.options(joinedload(Comment.author)).order_by(Comment.created_at.desc()).all()
     return render_template('post_detail.html', post=post, form=form, comments=comments)
 
-@app.route('/new', methods=['GET', 'POST'])
+@views.route('/new', methods=['GET', 'POST'])
 @login_required
 def new_post():
     form = PostForm()
     form.topic.choices = [(t.id, t.name) for t in Topic.query.order_by(Topic.name.asc()).all()]
     if form.validate_on_submit():
-        p = Post(title=form.title.data, body=form.body.data, topic_id=form.topic.data, author=current_user)
+        p = Post(title=form.title.data, body=form.body.data, topic_id=form.topic.data, user_id=current_user.id)
         db.session.add(p)
         db.session.commit()
         flash('Post published.', 'success')
         return redirect(url_for('post_detail', post_id=p.id))
     return render_template('post_new.html', form=form)
 
-@app.route('/register', methods=['GET', 'POST'])
+@views.route('/register', methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
         return redirect(url_for('index'))
@@ -211,7 +276,7 @@ def register():
         return redirect(url_for('index'))
     return render_template('auth_register.html', form=form)
 
-@app.route('/login', methods=['GET', 'POST'])
+@views.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('index'))
@@ -220,6 +285,7 @@ def login():
         identifier = form.username.data.strip()
         u = User.query.filter((User.username == identifier) | (User.email == identifier)).first()
         if u and u.check_password(form.password.data):
+            db.session.commit()
             login_user(u)
             flash('Signed in.', 'success')
             next_url = request.args.get('next')
@@ -227,7 +293,7 @@ def login():
         flash('Invalid credentials.', 'danger')
     return render_template('auth_login.html', form=form)
 
-@app.route('/logout')
+@views.route('/logout')
 @login_required
 def logout():
     logout_user()
@@ -237,18 +303,175 @@ def logout():
 # ------------------------------
 # CLI bootstrap
 # ------------------------------
-@app.cli.command('initdb')
+@views.command('initdb')
 def initdb():
     """Initialize the database and seed topics."""
     db.create_all()
+    # create_all() skips indexes on tables that already exist
+    for index in Post.__table__.indexes | Comment.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
     seed_default_topics()
+    ensure_search_index()
     print("DB initialized. Topics seeded.")
 
+@views.command('fts-rebuild')
+def fts_rebuild():
+    """Re-index every post in the full-text search table."""
+    if not fts_available(db.session):
+        raise click.ClickException("the full-text index is SQLite only; search uses LIKE here")
+    ensure_search_index()
+    db.session.execute(db.text(fts_rebuild_sql('post')))
+    db.session.commit()
+    print(f"Indexed {Post.query.count()} posts for search.")
+
+# ------------------------------
+# Export / import (JSONL, see core.transfer)
+# ------------------------------
+USER_FIELDS = ('username', 'email', 'password_hash', 'created_at')
+
+def unique_slug(name, taken):
+    base = re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-') or 'topic'
+    slug, n = base, 1
+    while slug in taken:
+        n += 1
+        slug = f"{base}-{n}"
+    return slug
+
+@views.command('export')
+@click.argument('directory')
+@click.option('--batch-size', default=2000, show_default=True, help='Rows fetched per round trip.')
+def export_content(directory, batch_size):
+    """Write topics, users, posts and comments to DIRECTORY as JSONL."""
+    out = ExportWriter(directory, source='blog001')
+
+    def rows(*columns):
+        stmt = db.select(*columns).order_by(columns[0]).execution_options(yield_per=batch_size)
+        return db.session.execute(stmt)
+
+    for row in rows(Topic.id, Topic.name, Topic.slug):
+        out.write('topic', **row._asdict())
+    for row in rows(User.id, *(getattr(User, f) for f in USER_FIELDS)):
+        out.write('user', **row._asdict())
+    for row in rows(Post.id, Post.title, Post.body, Post.created_at, Post.user_id, Post.topic_id):
+        out.write('post', **row._asdict())
+    for row in rows(Comment.id, Comment.body, Comment.created_at, Comment.user_id, Comment.post_id):
+        out.write('comment', **row._asdict())
+    counts = out.close()
+    print("Exported " + ", ".join(f"{n} {kind}s" for kind, n in counts.items()) + f" to {directory}.")
+
+@views.command('import')
+@click.argument('directory')
+@click.option('--batch-size', default=2000, show_default=True, help='Rows per INSERT batch.')
+def import_content(directory, batch_size):
+    """Load an export from blog001 or blog002 into this database.
+
+    Users are matched to existing ones by username, then email; topics by
+    name, then slug. Everything else is added with new ids. Attachments
+    and profile fields have no place here and are dropped.
+    """
+    by_name = {name: topic_id for topic_id, name in db.session.query(Topic.id, Topic.name)}
+    by_slug = {slug: topic_id for topic_id, slug in db.session.query(Topic.id, Topic.slug)}
+    by_username = dict(db.session.query(User.username, User.id))
+    by_email = dict(db.session.query(User.email, User.id))
+    user_offset, post_offset, comment_offset = (id_offset(db.session, m) for m in (User, Post, Comment))
+    topic_map, user_map = {}, {}
+    counts, dropped = Counter(), 0
+    now = datetime.utcnow()
+    # dependency order: a post batch goes in after the users it references
+    inserter = BatchInserter(db.session, (User, Post, Comment), batch_size)
+    started = time.perf_counter()
+
+    def user_id(source_id):
+        return user_map.get(source_id, source_id + user_offset)
+
+    with deferred_index(db.session, 'post', ('title', 'body')):
+        for r in read_records(directory):
+            kind = r['type']
+            counts[kind] += 1
+            if kind == 'topic':
+                topic_id = by_name.get(r['name']) or by_slug.get(r.get('slug'))
+                if topic_id is None:
+                    slug = r.get('slug') or ''
+                    topic = Topic(name=r['name'], slug=slug if slug and slug not in by_slug
+                                  else unique_slug(r['name'], by_slug))
+                    db.session.add(topic)
+                    db.session.flush()
+                    topic_id = by_name[topic.name] = by_slug[topic.slug] = topic.id
+                topic_map[r['id']] = topic_id
+            elif kind == 'user':
+                existing = by_username.get(r['username']) or by_email.get(r['email'])
+                if existing:
+                    user_map[r['id']] = existing
+                    continue
+                row = {f: r.get(f) for f in USER_FIELDS}
+                row.update(id=r['id'] + user_offset, created_at=r.get('created_at') or now)
+                inserter.add(User, row)
+            elif kind == 'post':
+                dropped += bool(r.get('attachment'))
+                inserter.add(Post, {'id': r['id'] + post_offset, 'title': r['title'], 'body': r['body'],
+                                    'created_at': r.get('created_at') or now,
+                                    'user_id': user_id(r['user_id']), 'topic_id': topic_map[r['topic_id']]})
+            elif kind == 'comment':
+                inserter.add(Comment, {'id': r['id'] + comment_offset, 'body': r['body'],
+                                       'created_at': r.get('created_at') or now,
+                                       'user_id': user_id(r['user_id']), 'post_id': r['post_id'] + post_offset})
+        inserter.close()
+        for model in (User, Post, Comment):
+            reset_sequence(db.session, model)
+    # one transaction: committed with the index rebuild (SQLite) or here
+    db.session.commit()
+    elapsed = time.perf_counter() - started
+    print("Imported " + ", ".join(f"{n} {kind}s" for kind, n in counts.items())
+          + f" ({len(user_map)} users matched existing accounts) in {elapsed:.1f}s, "
+          f"{counts['post'] / elapsed * 60:,.0f} posts/min.")
+    if dropped:
+        print(f"{dropped} post attachments were not imported: this app has no attachments.")
+
 # ------------------------------
-# First-run guard
+# App Factory
 # ------------------------------
-with app.app_context():
-    if not os.path.exists(os.path.join(app.instance_path, 'noir_blog.sqlite3')):
-        db.create_all()
-        seed_default_topics()
-app.run(debug=True)
\ No newline at end of file
+def create_app(config=None):
+    app = Flask(__name__, instance_relative_config=True)
+
+    # Secure defaults
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-noir8-change-me')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    # Blue/green-ready toggle for DEBUG via env
+    app.config['DEBUG'] = os.environ.get('FLASK_DEBUG', '0') == '1'
+
+    # KDF for new hashes; older ones are upgraded at login (see core.hashing)
+    app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    app.config.update(config or {})
+
+    os.makedirs(app.instance_path, exist_ok=True)
+    db_path = os.path.join(app.instance_path, 'noir_blog.sqlite3')
+    # WAL + busy timeout for SQLite; DATABASE_URL swaps in a server database
+    configure_database(app, f"sqlite:///{db_path}")
+
+    db.init_app(app)
+    init_sqlite_pragmas(app, db)
+    login_manager.init_app(app)
+    app.add_template_global(page_url)
+    init_query_counter(app)
+    init_assets(app, ['noir8.css', 'custom.js'])
+    init_templates(app)
+    Metrics(app)
+    init_compression(app)
+    passwords.init_app(app)
+    user_cache.init_app(app)
+    views.init_app(app)
+
+    # First-run guard, under schema_lock() so workers starting together
+    # create the tables once
+    with app.app_context(), schema_lock(app):
+        # the configured database, which DATABASE_URL may point away from instance/
+        if not db.inspect(db.engine).has_table('post'):
+            db.create_all()
+            seed_default_topics()
+        ensure_search_index()
+
+    return app
+
+if __name__ == '__main__':
+    create_app().run(debug=True)
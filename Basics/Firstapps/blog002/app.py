@@ -1,29 +1,57 @@
 import os
+import re
+import sys
+import hashlib
+import time
+from collections import Counter
 from datetime import datetime
-from flask import Flask, render_template, redirect, url_for, request, flash, session, send_from_directory, abort
+from functools import wraps
+import click
+from flask import Flask, current_app, render_template, redirect, url_for, request, flash, session, abort
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.local import LocalProxy
 from werkzeug.utils import secure_filename
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import joinedload, undefer
 import markdown2
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-INSTANCE_DIR = os.path.join(BASE_DIR, "instance")
-UPLOAD_DIR = os.path.join(INSTANCE_DIR, "uploads")
-os.makedirs(INSTANCE_DIR, exist_ok=True)
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-app = Flask(__name__, instance_relative_config=True)
-app.config['SECRET_KEY'] = os.environ.get('FLASK_SECRET', 'replace-this-with-secure-key')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(INSTANCE_DIR, 'noir_blog.sqlite3')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['UPLOAD_FOLDER'] = UPLOAD_DIR
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB per upload
-
-db = SQLAlchemy(app)
-login_manager = LoginManager(app)
+sys.path.insert(0, os.path.dirname(BASE_DIR))  # Basics/Firstapps, for the shared core package
+from core.pagination import keyset_paginate, keyset_stream, page_url
+from core.querycount import init_query_counter, query_budget
+from core.fts import deferred_index, fts_available, fts_ddl, fts_rebuild_sql, ranked_search
+from core.database import begin_schema_step, configure_database, init_sqlite_pragmas, schema_lock
+from core.downloads import file_sha256, send_attachment
+from core.blobstore import BlobStore
+from core.pagecache import PageCache
+from core.conditional import conditional
+from core.assets import init_assets
+from core.compress import init_compression
+from core.metrics import Metrics, timing
+from core.streaming import stream_page
+from core.jobs import JobQueue
+from core.usercache import UserCache
+from core.hashing import HashingBusy, PasswordHasher
+from core.templating import init_templates
+from core.views import Views
+from core.transfer import (BatchInserter, ExportWriter, attachment_path, id_offset, read_records,
+                           reset_sequence)
+
+# Module-level, so the models, helpers and views below can use them;
+# create_app() binds them to the app it builds, one app per process.
+db = SQLAlchemy()
+page_cache = PageCache()
+jobs = JobQueue()
+passwords = PasswordHasher()
+login_manager = LoginManager()
 login_manager.login_view = 'login'
 login_manager.login_message = "You need to login to access that."
+# attachment bytes, under the app's BLOB_FOLDER (see create_app)
+blobs = LocalProxy(lambda: current_app.extensions['blobs'])
+# routes, CLI commands and error handlers, added to the app by create_app()
+views = Views()
 
 # --- Models -------------------------------------------------------
 class User(UserMixin, db.Model):
@@ -36,18 +64,28 @@ class User(UserMixin, db.Model):
     job = db.Column(db.String(150))
     bio = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # denormalized activity, maintained by bump_activity()/recount_activity()
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_activity_at = db.Column(db.DateTime)
     posts = db.relationship('Post', backref='author', lazy='dynamic')
     comments = db.relationship('Comment', backref='author', lazy='dynamic')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        ok = passwords.verify(self.password_hash, password)
+        if ok and passwords.needs_rehash(self.password_hash):
+            self.password_hash = passwords.hash(password)   # committed by login()
+        return ok
 
 class Topic(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), unique=True, nullable=False)
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_activity_at = db.Column(db.DateTime)
     posts = db.relationship('Post', backref='topic', lazy='dynamic')
 
 class Post(db.Model):
@@ -58,9 +96,21 @@ class Post(db.Model):
     updated_at = db.Column(db.DateTime, onupdate=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     topic_id = db.Column(db.Integer, db.ForeignKey('topic.id'), nullable=False)
-    attachment_filename = db.Column(db.String(300), nullable=True)
+    attachment_filename = db.Column(db.String(300), nullable=True)   # name offered on download
+    attachment_sha256 = db.Column(db.String(64), db.ForeignKey('attachment.sha256'))  # blob key and ETag
+    # markdown render cache; deferred so listings never load it, post_detail undefers it
+    rendered_html = db.deferred(db.Column(db.Text))
+    render_key = db.Column(db.String(64))       # sha256 of extras + body that produced rendered_html
     comments = db.relationship('Comment', backref='post', lazy='dynamic')
 
+    # keyset pagination seeks on (created_at, id), optionally scoped by topic or author
+    __table_args__ = (
+        db.Index('ix_post_created_id', 'created_at', 'id'),
+        db.Index('ix_post_topic_created_id', 'topic_id', 'created_at', 'id'),
+        db.Index('ix_post_user_created_id', 'user_id', 'created_at', 'id'),
+        db.Index('ix_post_updated_at', 'updated_at'),   # newest edit, for page validators
+    )
+
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     body = db.Column(db.Text, nullable=False)
@@ -68,10 +118,32 @@ class Comment(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
 
+    # a post's thread in order, and its newest comment for the page validators;
+    # a user's comments for their counters and account deletion
+    __table_args__ = (
+        db.Index('ix_comment_post_created', 'post_id', 'created_at'),
+        db.Index('ix_comment_user_created', 'user_id', 'created_at'),
+    )
+
+class Attachment(db.Model):
+    # one row per distinct blob; ref_count = posts pointing at it
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SchemaVersion(db.Model):
+    __tablename__ = 'schema_version'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 # --- Login loader ------------------------------------------------
+user_cache = UserCache(db=db, model=User, columns=('id', 'username'))
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.load(user_id)
 
 # --- Helpers -----------------------------------------------------
 def allowed_file(filename):
@@ -79,41 +151,444 @@ def allowed_file(filename):
         'pdf','png','jpg','jpeg','gif','txt','md','doc','docx','ppt','pptx','xls','xlsx','csv', 'css', 'html', 'sh', 'js'
     }
 
+MARKDOWN_EXTRAS = ["fenced-code-blocks", "tables", "strike"]
+
+def render_key(body):
+    """Cache key for a rendered body: changes with the text or the extras set."""
+    h = hashlib.sha256(",".join(MARKDOWN_EXTRAS).encode())
+    h.update(b"\0")
+    h.update(body.encode())
+    return h.hexdigest()
+
+def store_render(post_id, body, conn=None):
+    """Re-render a body and persist it without touching updated_at."""
+    with timing('markdown'):
+        html = markdown2.markdown(body, extras=MARKDOWN_EXTRAS)
+    post = Post.__table__
+    # a cache fill is not an edit, so updated_at keeps its value
+    (conn or db.session).execute(
+        post.update().where(post.c.id == post_id)
+        .values(rendered_html=html, render_key=render_key(body), updated_at=post.c.updated_at)
+    )
+    return html
+
+def post_html(post):
+    """Cached HTML for a post, rebuilt lazily when the key no longer matches."""
+    if post.rendered_html is not None and post.render_key == render_key(post.body):
+        return post.rendered_html
+    # own short transaction, so the request session (and the objects the
+    # template is about to read) is not expired by a commit
+    with db.engine.begin() as conn:
+        return store_render(post.id, post.body, conn)
+
+def queue_render(post_id, body):
+    """Fill the render cache off the request path; post_html() covers any gap."""
+    jobs.enqueue('render_post', {'post_id': post_id}, key=f"render:{post_id}:{render_key(body)}")
+
+@jobs.task('render_post')
+def render_post_job(post_id):
+    row = db.session.query(Post.body, Post.render_key).filter(Post.id == post_id).first()
+    if row is None or row.render_key == render_key(row.body):
+        return   # deleted, or already filled by a page view
+    store_render(post_id, row.body)
+    db.session.commit()
+
+# --- Activity counters -------------------------------------------
+def bump_activity(topic_id, user_id, posts=0, comments=0):
+    """Add to a topic's and a user's counters in the caller's transaction."""
+    now = datetime.utcnow()
+    for model, row_id in ((Topic, topic_id), (User, user_id)):
+        db.session.execute(
+            db.update(model).where(model.id == row_id).values(
+                post_count=model.post_count + posts,
+                comment_count=model.comment_count + comments,
+                last_activity_at=now,
+            )
+        )
+
+def _latest(a, b):
+    # portable max() of two nullable scalar subqueries
+    return f"CASE WHEN ({b}) IS NULL OR ({a}) >= ({b}) THEN ({a}) ELSE ({b}) END"
+
+_TOPIC_POSTS = "SELECT {agg} FROM post WHERE post.topic_id = topic.id"
+_TOPIC_COMMENTS = ("SELECT {agg} FROM comment JOIN post ON post.id = comment.post_id "
+                   "WHERE post.topic_id = topic.id")
+# "user" is quoted: it is a reserved word on PostgreSQL
+_USER_POSTS = 'SELECT {agg} FROM post WHERE post.user_id = "user".id'
+_USER_COMMENTS = 'SELECT {agg} FROM comment WHERE comment.user_id = "user".id'
+
+def _recount_sql(table, posts, comments):
+    last = _latest(posts.format(agg='max(post.created_at)'), comments.format(agg='max(comment.created_at)'))
+    return (f"UPDATE {table} SET "
+            f"post_count = ({posts.format(agg='count(*)')}), "
+            f"comment_count = ({comments.format(agg='count(*)')}), "
+            f"last_activity_at = {last}")
+
+def recount_activity(topic_ids=None, user_ids=None):
+    """Rebuild counters from the base tables; all rows when ids are None.
+
+    Runs in the caller's transaction. Used after deletes, where working out
+    the exact decrements (comments by many users on many posts) is more
+    error-prone than recounting the few rows involved.
+    """
+    for table, ids, posts, comments in (
+        ('topic', topic_ids, _TOPIC_POSTS, _TOPIC_COMMENTS),
+        ('"user"', user_ids, _USER_POSTS, _USER_COMMENTS),
+    ):
+        sql = _recount_sql(table, posts, comments)
+        if ids is None:
+            db.session.execute(db.text(sql))
+        elif ids:
+            stmt = db.text(sql + f" WHERE {table}.id IN :ids")
+            db.session.execute(stmt.bindparams(db.bindparam('ids', expanding=True)), {'ids': list(ids)})
+
+# --- Attachment hashes -------------------------------------------
+def store_attachment_hash(post_id, filename, conn=None):
+    """Hash an attachment stored before hashes were recorded; keeps updated_at."""
+    path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+    if not os.path.isfile(path):
+        return None
+    sha256 = file_sha256(path)
+    post = Post.__table__
+    (conn or db.session).execute(
+        post.update().where(post.c.id == post_id)
+        .values(attachment_sha256=sha256, updated_at=post.c.updated_at)
+    )
+    return sha256
+
+def backfill_attachment_hashes():
+    rows = db.session.query(Post.id, Post.attachment_filename).filter(
+        Post.attachment_filename.isnot(None), Post.attachment_sha256.is_(None)).all()
+    for post_id, filename in rows:
+        store_attachment_hash(post_id, filename)
+
+# --- Content-addressed attachments -------------------------------
+def dialect_insert(model):
+    """INSERT with on_conflict_* support for the configured database."""
+    return (pg_insert if db.engine.dialect.name == 'postgresql' else sqlite_insert)(model)
+
+def reference_blob(sha256, size):
+    stmt = dialect_insert(Attachment).values(sha256=sha256, size=size, ref_count=1, created_at=datetime.utcnow())
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['sha256'], set_={'ref_count': Attachment.ref_count + 1}))
+
+def store_attachment(upload):
+    """Put an upload in the blob store and take a reference to it."""
+    sha256, size = blobs.put(upload)
+    reference_blob(sha256, size)
+    return sha256
+
+def release_attachments(hashes):
+    """Drop one reference per hash; unreferenced blobs wait for `flask gc-blobs`."""
+    for sha256, n in Counter(h for h in hashes if h).items():
+        db.session.execute(db.update(Attachment).where(Attachment.sha256 == sha256)
+                           .values(ref_count=Attachment.ref_count - n))
+
+def collect_blobs(grace):
+    """Drop unreferenced attachment rows and blob files; returns (removed, in use)."""
+    Attachment.query.filter(Attachment.ref_count <= 0).delete()
+    db.session.commit()
+    referenced = {sha256 for (sha256,) in db.session.query(Attachment.sha256)}
+    return blobs.collect(referenced, grace_seconds=grace), len(referenced)
+
+def schedule_blob_sweep():
+    """Queue a sweep for blobs this request released; one pending sweep covers them all."""
+    jobs.enqueue('collect_blobs', {'grace': current_app.config['BLOB_GC_GRACE']}, key='collect-blobs', delay=60)
+
+@jobs.task('collect_blobs')
+def collect_blobs_job(grace):
+    collect_blobs(grace)
+
+def download_name(filename):
+    return secure_filename(filename) or 'attachment'
+
+def migrate_uploads_to_blobs():
+    """Move timestamp-named uploads into the blob store (schema v7)."""
+    rows = db.session.query(Post.id, Post.attachment_filename, Post.attachment_sha256).filter(
+        Post.attachment_filename.isnot(None)).all()
+    post = Post.__table__
+    for post_id, filename, sha256 in rows:
+        legacy = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+        if os.path.isfile(legacy):
+            sha256 = sha256 or file_sha256(legacy)
+            size = os.path.getsize(legacy)
+            blobs.adopt(legacy, sha256)
+            reference_blob(sha256, size)
+            name = re.sub(r'^\d+(\.\d+)?_', '', filename)
+        elif sha256 and os.path.isfile(blobs.path(sha256)):
+            # moved by an earlier run whose transaction rolled back
+            reference_blob(sha256, os.path.getsize(blobs.path(sha256)))
+            name = re.sub(r'^\d+(\.\d+)?_', '', filename)
+        else:
+            sha256 = name = None   # file already lost; drop the dangling reference
+        db.session.execute(post.update().where(post.c.id == post_id).values(
+            attachment_filename=name, attachment_sha256=sha256, updated_at=post.c.updated_at))
+
+# --- Account deletion --------------------------------------------
+def _delete_chunk(stmt):
+    n = db.session.execute(stmt).rowcount
+    db.session.commit()
+    return n
+
+def delete_account(user_id, batch_size=None, progress=None):
+    """Remove a user, their posts and comments, and every comment on their posts.
+
+    Rows go in chunks of ``batch_size``, one transaction each, so the write
+    lock is held for one chunk at a time and only ids and attachment hashes
+    are ever loaded. Safe to re-run after an interruption: it resumes from
+    whatever is left. Counters are recounted once at the end.
+
+    ``progress(done, total)`` is called after every chunk; accounts with
+    ACCOUNT_DELETE_PROGRESS_ROWS or more rows are also logged.
+    """
+    batch_size = batch_size or current_app.config['ACCOUNT_DELETE_BATCH']
+    own_posts = db.select(Post.id).where(Post.user_id == user_id)
+    # topics and commenters whose counters change, gathered before anything goes
+    topic_ids = {tid for (tid,) in db.session.query(Post.topic_id).filter(
+        (Post.user_id == user_id) | Post.id.in_(db.select(Comment.post_id).where(Comment.user_id == user_id))
+    ).distinct()}
+    commenter_ids = {uid for (uid,) in db.session.query(Comment.user_id).filter(
+        Comment.post_id.in_(own_posts), Comment.user_id != user_id).distinct()}
+    total = (db.session.query(Post).filter(Post.user_id == user_id).count()
+             + db.session.query(Comment).filter(
+                 (Comment.user_id == user_id) | Comment.post_id.in_(own_posts)).count())
+    db.session.commit()
+    loud = total >= current_app.config['ACCOUNT_DELETE_PROGRESS_ROWS']
+    done = 0
+
+    def report(n):
+        nonlocal done
+        done += n
+        if progress:
+            progress(done, total)
+        if loud:
+            current_app.logger.info("account %s: deleted %d of %d rows", user_id, done, total)
+
+    comment_chunks = (
+        db.select(Comment.id).where(Comment.user_id == user_id),
+        db.select(Comment.id).where(Comment.post_id.in_(own_posts)),
+    )
+    for chunk in comment_chunks:
+        while n := _delete_chunk(db.delete(Comment).where(Comment.id.in_(chunk.limit(batch_size)))):
+            report(n)
+    while True:
+        rows = db.session.execute(
+            db.select(Post.id, Post.attachment_sha256).where(Post.user_id == user_id).limit(batch_size)).all()
+        if not rows:
+            break
+        release_attachments(sha256 for _, sha256 in rows)
+        report(_delete_chunk(db.delete(Post).where(Post.id.in_([post_id for post_id, _ in rows]))))
+
+    db.session.execute(db.delete(User).where(User.id == user_id))
+    recount_activity(topic_ids=topic_ids, user_ids=[])
+    db.session.commit()
+    user_cache.invalidate(user_id)
+    commenter_ids = sorted(commenter_ids)
+    for start in range(0, len(commenter_ids), batch_size):
+        recount_activity(topic_ids=[], user_ids=commenter_ids[start:start + batch_size])
+        db.session.commit()
+    page_cache.invalidate()
+    schedule_blob_sweep()
+    return done
+
+# --- Schema bootstrap --------------------------------------------
+SCHEMA_VERSION = 9
+
+DEFAULT_TOPICS = [
+    "Ops & Intel","Signals","Cyber","Analysis","Tradecraft",
+    "History","Weapons","Policy","Field Notes","General"
+]
+
+# full-text index over post title/body, kept in sync by triggers
+POST_FTS_DDL = fts_ddl('post', ('title', 'body'))
+
+def create_post_fts(rebuild=False):
+    """The FTS5 index, on SQLite; elsewhere search falls back to LIKE (core.fts)."""
+    if not fts_available(db.session):
+        return False
+    for sql in POST_FTS_DDL + ([fts_rebuild_sql('post')] if rebuild else []):
+        db.session.execute(db.text(sql))
+    return True
+
+# schema create_all() cannot express; run once on fresh databases
+EXTRA_DDL = [create_post_fts]
+
+# (version, [sql or callable, ...]) steps that bring an existing database up to the
+# current models. Fresh databases get the current schema from create_all()
+# plus EXTRA_DDL and skip these entirely.
+MIGRATIONS = [
+    (2, [
+        "ALTER TABLE post ADD COLUMN rendered_html TEXT",
+        "ALTER TABLE post ADD COLUMN render_key VARCHAR(64)",
+    ]),
+    (3, [
+        "CREATE INDEX IF NOT EXISTS ix_post_created_id ON post (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_post_topic_created_id ON post (topic_id, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_post_user_created_id ON post (user_id, created_at, id)",
+    ]),
+    (4, [lambda: create_post_fts(rebuild=True)]),
+    (5, [
+        f"ALTER TABLE {table} ADD COLUMN {col}"
+        for table in ('topic', 'user')
+        for col in ("post_count INTEGER NOT NULL DEFAULT 0",
+                    "comment_count INTEGER NOT NULL DEFAULT 0",
+                    "last_activity_at DATETIME")
+    ] + [recount_activity]),
+    (6, ["ALTER TABLE post ADD COLUMN attachment_sha256 VARCHAR(64)", backfill_attachment_hashes]),
+    (7, [migrate_uploads_to_blobs]),
+    (8, [
+        "CREATE INDEX IF NOT EXISTS ix_post_updated_at ON post (updated_at)",
+        "CREATE INDEX IF NOT EXISTS ix_comment_post_created ON comment (post_id, created_at)",
+    ]),
+    (9, ["CREATE INDEX IF NOT EXISTS ix_comment_user_created ON comment (user_id, created_at)"]),
+]
+
+def current_schema_version():
+    inspector = db.inspect(db.engine)
+    if inspector.has_table('schema_version'):
+        return db.session.query(db.func.max(SchemaVersion.version)).scalar() or 0
+    # databases created before versioning carry the version 1 schema
+    return 1 if inspector.has_table('post') else 0
+
 def init_topics():
-    default_topics = [
-        "Ops & Intel","Signals","Cyber","Analysis","Tradecraft",
-        "History","Weapons","Policy","Field Notes","General"
-    ]
-    for t in default_topics:
-        if not Topic.query.filter_by(name=t).first():
-            db.session.add(Topic(name=t))
+    """Seed default topics in one INSERT .. ON CONFLICT DO NOTHING."""
+    stmt = dialect_insert(Topic).values([{'name': t} for t in DEFAULT_TOPICS])
+    db.session.execute(stmt.on_conflict_do_nothing(index_elements=['name']))
+
+def run_schema_step(target, steps, create=False):
+    """Apply one migration and record its version, all in one transaction."""
+    begin_schema_step(db)
+    if create:
+        # tables the models have and the database lacks, inside the same transaction
+        db.metadata.create_all(db.session.connection())
+    for sql in steps:
+        if callable(sql):
+            sql()
+        else:
+            db.session.execute(db.text(sql))
+    if target == SCHEMA_VERSION:
+        init_topics()
+    db.session.add(SchemaVersion(version=target))
     db.session.commit()
 
-@app.before_request
-def ensure_db():
-    db.create_all()
-    init_topics()
+def bootstrap_db():
+    """Build the schema, apply pending migrations and seed topics.
+
+    Cheap once the database is current (a single version lookup). Otherwise
+    the work happens under schema_lock(), so when several workers start at
+    once the first one migrates and the others find the version already
+    current. Each migration commits together with its version row, so one
+    that fails is retried as a whole on the next start.
+    """
+    if current_schema_version() >= SCHEMA_VERSION:
+        return SCHEMA_VERSION
+    with schema_lock(current_app):
+        db.session.commit()     # end the read above so the version is read afresh
+        version = current_schema_version()
+        if version >= SCHEMA_VERSION:
+            return version
+        if version:
+            pending = [(target, steps) for target, steps in MIGRATIONS if target > version]
+            for n, (target, steps) in enumerate(pending):
+                run_schema_step(target, steps, create=n == 0)
+        else:
+            run_schema_step(SCHEMA_VERSION, EXTRA_DDL, create=True)
+    return SCHEMA_VERSION
+
+def top_topics(limit=None):
+    """Topics by recent activity; reads the counter columns, never posts."""
+    query = Topic.query.order_by(Topic.last_activity_at.desc().nullslast(), Topic.post_count.desc(), Topic.name)
+    return query.limit(limit).all() if limit else query.all()
+
+def paginate_posts(query):
+    """One keyset page of a Post query, driven by ?cursor= and ?per_page=."""
+    per_page = request.args.get('per_page', current_app.config['POSTS_PER_PAGE'], type=int)
+    # post cards show author and topic: load them in the same SELECT
+    query = query.options(joinedload(Post.author), joinedload(Post.topic))
+    return keyset_paginate(query, Post, request.args.get('cursor'), per_page)
+
+def render_listing(template, query, **context):
+    """Render a post listing, streaming it when the page is a long one.
+
+    Default-size pages render whole, so the page cache can keep them. Longer
+    pages go out as they render: the header and first cards leave before the
+    remaining rows are fetched, ``yield_per`` batches at a time.
+    """
+    per_page = request.args.get('per_page', current_app.config['POSTS_PER_PAGE'], type=int)
+    if not current_app.config['STREAM_LISTINGS'] or per_page <= current_app.config['POSTS_PER_PAGE']:
+        return render_template(template, posts=paginate_posts(query), **context)
+    query = query.options(joinedload(Post.author), joinedload(Post.topic))
+    posts = keyset_stream(query, Post, request.args.get('cursor'), per_page)
+    return stream_page(template, posts=posts, **context)
+
+# --- Page validators (ETag inputs) --------------------------------
+def listing_validators(**view_args):
+    """Post listings and the topic sidebar change only through these."""
+    return db.session.query(
+        db.func.max(Topic.last_activity_at), db.func.sum(Topic.post_count), db.func.sum(Topic.comment_count),
+        db.select(db.func.max(Post.updated_at)).scalar_subquery(),
+    ).one()
+
+def post_validators(post_id):
+    # not render_key: the first view fills it, which would change the ETag that view sent
+    def thread(agg):
+        return db.select(agg).where(Comment.post_id == Post.id).scalar_subquery()
+    row = db.session.query(
+        Post.updated_at, thread(db.func.count(Comment.id)), thread(db.func.max(Comment.created_at)),
+    ).filter(Post.id == post_id).first()
+    if row is None:
+        return None
+    return *row, MARKDOWN_EXTRAS
+
+def profile_validators(username):
+    return db.session.query(
+        User.id, User.realname, User.job, User.age, User.bio,
+        User.post_count, User.comment_count, User.last_activity_at,
+        db.select(db.func.max(Post.updated_at)).where(Post.user_id == User.id).scalar_subquery(),
+    ).filter(User.username == username).first()
+
+def guest_read_limit(view):
+    """Count a guest's post views in the session; past five, send them to login.
+
+    Sits outside @conditional, so a 304 revisit counts as a read too.
+    """
+    @wraps(view)
+    def wrapper(post_id, **kwargs):
+        if not current_user.is_authenticated:
+            anon_reads = session.get('anon_reads', 0)
+            if anon_reads >= 5:
+                flash("Guest read limit reached. Register or login to continue reading full posts.", "warning")
+                return redirect(url_for('login', next=url_for('post_detail', post_id=post_id)))
+            session['anon_reads'] = anon_reads + 1
+        return view(post_id, **kwargs)
+    return wrapper
 
 # --- Routes ------------------------------------------------------
-@app.route('/')
+@views.route('/')
+@query_budget(4)
+@conditional(listing_validators)
+@page_cache.cached
 def index():
-    page = request.args.get('page', 1, type=int)
-    posts = Post.query.order_by(Post.created_at.desc()).limit(20).all()
-    topics = Topic.query.order_by(Topic.name).limit(10).all()
+    posts = paginate_posts(Post.query)
+    topics = top_topics(10)
     return render_template('index.html', posts=posts, topics=topics)
 
-@app.route('/topics')
+@views.route('/topics')
+@query_budget(2)
+@page_cache.cached
 def topics():
-    topics = Topic.query.order_by(Topic.name).all()
+    topics = top_topics()
     return render_template('topics.html', topics=topics)
 
-@app.route('/topic/<int:topic_id>')
+@views.route('/topic/<int:topic_id>')
+@query_budget(4)
+@conditional(listing_validators)
+@page_cache.cached
 def topic_view(topic_id):
     topic = Topic.query.get_or_404(topic_id)
-    posts = topic.posts.order_by(Post.created_at.desc()).all()
-    return render_template('index.html', posts=posts, current_topic=topic)
+    return render_listing('index.html', Post.query.filter_by(topic_id=topic.id), current_topic=topic)
 
-@app.route('/post/new', methods=['GET', 'POST'])
+@views.route('/post/new', methods=['GET', 'POST'])
 @login_required
 def post_new():
     topics = Topic.query.order_by(Topic.name).all()
@@ -125,43 +600,59 @@ def post_new():
             flash("Title, body and topic required.", "danger")
             return render_template('post_new.html', topics=topics)
         attachment = request.files.get('attachment')
-        filename = None
+        filename = sha256 = None
         if attachment and attachment.filename:
             if not allowed_file(attachment.filename):
                 flash("Attachment not allowed.", "danger")
                 return render_template('post_new.html', topics=topics)
-            filename = secure_filename(f"{datetime.utcnow().timestamp()}_{attachment.filename}")
-            attachment.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-        post = Post(title=title, body=body, user_id=current_user.id, topic_id=topic_id, attachment_filename=filename)
+            filename = download_name(attachment.filename)
+            sha256 = store_attachment(attachment)
+        post = Post(title=title, body=body, user_id=current_user.id, topic_id=topic_id,
+                    attachment_filename=filename, attachment_sha256=sha256)
         db.session.add(post)
+        bump_activity(topic_id, current_user.id, posts=1)
         db.session.commit()
+        page_cache.invalidate()
+        queue_render(post.id, body)
         flash("Post created.", "success")
         return redirect(url_for('post_detail', post_id=post.id))
     return render_template('post_new.html', topics=topics)
 
-@app.route('/post/<int:post_id>', methods=['GET'])
+@views.route('/post/<int:post_id>', methods=['GET'])
+@query_budget(5)
+@guest_read_limit
+@conditional(post_validators)
 def post_detail(post_id):
-    post = Post.query.get_or_404(post_id)
-    # enforce anon read limit
-    if not current_user.is_authenticated:
-        anon_reads = session.get('anon_reads', 0)
-        if anon_reads >= 5:
-            flash("Guest read limit reached. Register or login to continue reading full posts.", "warning")
-            return redirect(url_for('login', next=url_for('post_detail', post_id=post_id)))
-        session['anon_reads'] = anon_reads + 1
-    html = markdown2.markdown(post.body, extras=["fenced-code-blocks", "tables", "strike"])
-    comments = post.comments.order_by(Comment.created_at.asc()).all()
+    post = Post.query.options(joinedload(Post.author), joinedload(Post.topic),
+                              undefer(Post.rendered_html)).get_or_404(post_id)
+    html = post_html(post)
+    comments = post.comments.options(joinedload(Comment.author)).order_by(Comment.created_at.asc()).all()
     return render_template('post_detail.html', post=post, html_body=html, comments=comments)
 
-@app.route('/post/<int:post_id>/download')
+@views.route('/post/<int:post_id>/download')
 def post_download(post_id):
     post = Post.query.get_or_404(post_id)
     if not post.attachment_filename:
         flash("No attachment.", "danger")
         return redirect(url_for('post_detail', post_id=post_id))
-    return send_from_directory(app.config['UPLOAD_FOLDER'], post.attachment_filename, as_attachment=True)
+    # the post's attachment can be replaced, so never serve it from cache unchecked;
+    # /attachment/<sha256>/<name> is the long-lived URL
+    sha256 = post.attachment_sha256
+    return send_attachment(blobs.root, blobs.relpath(sha256), etag=sha256,
+                           download_name=post.attachment_filename, max_age=0)
 
-@app.route('/post/<int:post_id>/edit', methods=['GET','POST'])
+@views.route('/attachment/<sha256>/<name>')
+def attachment(sha256, name):
+    """Hash-addressed download URL: the bytes behind it never change."""
+    if not re.fullmatch(r'[0-9a-f]{64}', sha256):
+        abort(404)
+    att = db.session.get(Attachment, sha256)
+    if att is None or att.ref_count <= 0:
+        abort(404)
+    return send_attachment(blobs.root, blobs.relpath(sha256), etag=sha256, download_name=download_name(name),
+                           max_age=365 * 24 * 3600, immutable=True)
+
+@views.route('/post/<int:post_id>/edit', methods=['GET','POST'])
 @login_required
 def post_edit(post_id):
     post = Post.query.get_or_404(post_id)
@@ -169,45 +660,54 @@ def post_edit(post_id):
         abort(403)
     topics = Topic.query.order_by(Topic.name).all()
     if request.method == 'POST':
+        old_topic_id = post.topic_id
         post.title = request.form.get('title','').strip()
         post.body = request.form.get('body','').strip()
         post.topic_id = request.form.get('topic_id', type=int)
         attachment = request.files.get('attachment')
+        released = None
         if attachment and attachment.filename:
             if allowed_file(attachment.filename):
-                filename = secure_filename(f"{datetime.utcnow().timestamp()}_{attachment.filename}")
-                attachment.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                # remove old file if exists
-                if post.attachment_filename:
-                    try:
-                        os.remove(os.path.join(app.config['UPLOAD_FOLDER'], post.attachment_filename))
-                    except Exception:
-                        pass
-                post.attachment_filename = filename
+                released = post.attachment_sha256
+                post.attachment_sha256 = store_attachment(attachment)
+                post.attachment_filename = download_name(attachment.filename)
+                release_attachments([released])
             else:
                 flash("Attachment not allowed.", "danger")
+        if post.topic_id != old_topic_id:
+            db.session.flush()
+            recount_activity(topic_ids=[old_topic_id, post.topic_id], user_ids=[])
+        body = post.body
         db.session.commit()
+        page_cache.invalidate()
+        queue_render(post_id, body)
+        if released:
+            schedule_blob_sweep()
         flash("Post updated.", "success")
         return redirect(url_for('post_detail', post_id=post.id))
     return render_template('post_new.html', post=post, topics=topics)
 
-@app.route('/post/<int:post_id>/delete', methods=['POST'])
+@views.route('/post/<int:post_id>/delete', methods=['POST'])
 @login_required
 def post_delete(post_id):
     post = Post.query.get_or_404(post_id)
     if post.user_id != current_user.id:
         abort(403)
-    if post.attachment_filename:
-        try:
-            os.remove(os.path.join(app.config['UPLOAD_FOLDER'], post.attachment_filename))
-        except Exception:
-            pass
+    released = post.attachment_sha256
+    release_attachments([released])
+    commenter_ids = [uid for (uid,) in db.session.query(Comment.user_id).filter_by(post_id=post.id).distinct()]
+    Comment.query.filter_by(post_id=post.id).delete()
     db.session.delete(post)
+    db.session.flush()
+    recount_activity(topic_ids=[post.topic_id], user_ids=set(commenter_ids) | {post.user_id})
     db.session.commit()
+    page_cache.invalidate()
+    if released:
+        schedule_blob_sweep()
     flash("Post deleted.", "info")
     return redirect(url_for('index'))
 
-@app.route('/post/<int:post_id>/comment', methods=['POST'])
+@views.route('/post/<int:post_id>/comment', methods=['POST'])
 @login_required
 def post_comment(post_id):
     post = Post.query.get_or_404(post_id)
@@ -217,12 +717,14 @@ def post_comment(post_id):
         return redirect(url_for('post_detail', post_id=post_id))
     comment = Comment(body=body, user_id=current_user.id, post_id=post.id)
     db.session.add(comment)
+    bump_activity(post.topic_id, current_user.id, comments=1)
     db.session.commit()
+    page_cache.invalidate()
     flash("Comment added.", "success")
     return redirect(url_for('post_detail', post_id=post_id))
 
 # --- Auth & profile ----------------------------------------------
-@app.route('/register', methods=['GET','POST'])
+@views.route('/register', methods=['GET','POST'])
 def register():
     if current_user.is_authenticated:
         return redirect(url_for('index'))
@@ -252,7 +754,7 @@ def register():
         return redirect(url_for('index'))
     return render_template('auth_register.html')
 
-@app.route('/login', methods=['GET','POST'])
+@views.route('/login', methods=['GET','POST'])
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('index'))
@@ -262,26 +764,28 @@ def login():
         password = request.form.get('password','')
         user = User.query.filter((User.username==credential)|(User.email==credential)).first()
         if user and user.check_password(password):
+            db.session.commit()
             login_user(user)
             flash("Logged in.", "success")
             return redirect(request.args.get('next') or url_for('index'))
         flash("Invalid credentials.", "danger")
     return render_template('auth_login.html', next=next_url)
 
-@app.route('/logout')
+@views.route('/logout')
 @login_required
 def logout():
     logout_user()
     flash("Logged out.", "info")
     return redirect(url_for('index'))
 
-@app.route('/profile/<username>')
+@views.route('/profile/<username>')
+@query_budget(4)
+@conditional(profile_validators)
 def profile(username):
     user = User.query.filter_by(username=username).first_or_404()
-    posts = user.posts.order_by(Post.created_at.desc()).all()
-    return render_template('profile.html', profile_user=user, posts=posts)
+    return render_listing('profile.html', Post.query.filter_by(user_id=user.id), profile_user=user)
 
-@app.route('/profile/<username>/edit', methods=['GET','POST'])
+@views.route('/profile/<username>/edit', methods=['GET','POST'])
 @login_required
 def profile_edit(username):
     if current_user.username != username:
@@ -296,48 +800,296 @@ def profile_edit(username):
         if pwd:
             current_user.set_password(pwd)
         db.session.commit()
+        user_cache.invalidate(current_user.id)
         flash("Profile updated.", "success")
         return redirect(url_for('profile', username=current_user.username))
     return render_template('profile_edit.html', user=current_user)
 
-@app.route('/account/delete', methods=['POST'])
+@views.route('/account/delete', methods=['POST'])
 @login_required
 def account_delete():
-    user = User.query.get_or_404(current_user.id)
-    # delete user's posts and attachments
-    for p in user.posts:
-        if p.attachment_filename:
-            try:
-                os.remove(os.path.join(app.config['UPLOAD_FOLDER'], p.attachment_filename))
-            except Exception:
-                pass
+    user_id = current_user.id
     logout_user()
-    # remove comments first
-    Comment.query.filter_by(user_id=user.id).delete()
-    Post.query.filter_by(user_id=user.id).delete()
-    db.session.delete(user)
-    db.session.commit()
+    delete_account(user_id)
     flash("Account and content removed.", "info")
     return redirect(url_for('index'))
 
-# --- Simple search (title) ---------------------------------------
-@app.route('/search')
+# --- Full-text search (title + body, bm25 ranked) -----------------
+@views.route('/search')
+@query_budget(3)
 def search():
     q = request.args.get('q','').strip()
     if not q:
         return redirect(url_for('index'))
-    posts = Post.query.filter(Post.title.ilike(f"%{q}%")).order_by(Post.created_at.desc()).all()
+    per_page = request.args.get('per_page', current_app.config['POSTS_PER_PAGE'], type=int)
+    # title hits weigh ten times body hits
+    posts = ranked_search(db.session, Post, q, request.args.get('cursor'), per_page,
+                          weights=(10.0, 1.0), options=(joinedload(Post.author), joinedload(Post.topic)),
+                          max_candidates=current_app.config['SEARCH_MAX_CANDIDATES'])
     return render_template('index.html', posts=posts, q=q)
 
+# --- CLI bootstrap -----------------------------------------------
+@views.command('initdb')
+def initdb():
+    """Build the schema, apply migrations and seed topics."""
+    version = bootstrap_db()
+    page_cache.invalidate()
+    print(f"DB at schema version {version}. Topics seeded.")
+
+@views.command('fts-rebuild')
+def fts_rebuild():
+    """Re-index every post in the full-text search table."""
+    if not create_post_fts(rebuild=True):
+        raise click.ClickException("the full-text index is SQLite only; search uses LIKE here")
+    db.session.commit()
+    print(f"Indexed {Post.query.count()} posts for search.")
+
+@views.command('reconcile-stats')
+def reconcile_stats():
+    """Recount every topic's and user's post/comment counters."""
+    recount_activity()
+    db.session.commit()
+    page_cache.invalidate()
+    print(f"Recounted {Topic.query.count()} topics and {User.query.count()} users.")
+
+@views.command('gc-blobs')
+@click.option('--grace', type=int, help='Keep blobs younger than this many seconds.  [default: BLOB_GC_GRACE]')
+def gc_blobs(grace):
+    """Delete unreferenced attachment blobs and their rows."""
+    removed, in_use = collect_blobs(current_app.config['BLOB_GC_GRACE'] if grace is None else grace)
+    print(f"Removed {removed} unreferenced blobs; {in_use} in use.")
+
+@views.command('delete-account')
+@click.argument('username')
+@click.option('--batch-size', type=int, help='Rows per transaction.  [default: ACCOUNT_DELETE_BATCH]')
+def delete_account_command(username, batch_size):
+    """Delete a user and all of their content, in batches."""
+    user_id = db.session.query(User.id).filter_by(username=username).scalar()
+    if user_id is None:
+        raise click.ClickException(f"no user {username!r}")
+    done = delete_account(user_id, batch_size,
+                          lambda done, total: click.echo(f"\r{done}/{total} rows", nl=False))
+    print(f"\nDeleted {username}: {done} posts and comments.")
+
+@views.command('rerender')
+@click.option('--all', 'force', is_flag=True, help='Re-render every post, not only stale ones.')
+@click.option('--batch-size', default=500, show_default=True)
+def rerender(force, batch_size):
+    """Rebuild the markdown render cache, e.g. after MARKDOWN_EXTRAS changes."""
+    done = total = last_id = 0
+    while True:
+        rows = db.session.execute(
+            db.select(Post.id, Post.body, Post.render_key)
+            .where(Post.id > last_id).order_by(Post.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        for post_id, body, key in rows:
+            if force or key != render_key(body):
+                store_render(post_id, body)
+                done += 1
+        db.session.commit()
+        total += len(rows)
+        last_id = rows[-1].id
+    print(f"Re-rendered {done} of {total} posts.")
+
+# --- Export / import (JSONL + attachment files, see core.transfer) -
+USER_FIELDS = ('username', 'email', 'password_hash', 'realname', 'age', 'job', 'bio', 'created_at')
+
+@views.command('export')
+@click.argument('directory')
+@click.option('--batch-size', default=2000, show_default=True, help='Rows fetched per round trip.')
+def export_content(directory, batch_size):
+    """Write topics, users, posts and comments to DIRECTORY as JSONL."""
+    out = ExportWriter(directory, source='blog002')
+
+    def rows(*columns):
+        stmt = db.select(*columns).order_by(columns[0]).execution_options(yield_per=batch_size)
+        return db.session.execute(stmt)
+
+    for row in rows(Topic.id, Topic.name):
+        out.write('topic', **row._asdict())
+    for row in rows(User.id, *(getattr(User, f) for f in USER_FIELDS)):
+        out.write('user', **row._asdict())
+    for row in rows(Post.id, Post.title, Post.body, Post.created_at, Post.updated_at, Post.user_id,
+                    Post.topic_id, Post.attachment_filename, Post.attachment_sha256):
+        post = row._asdict()
+        filename, sha256 = post.pop('attachment_filename'), post.pop('attachment_sha256')
+        if sha256:
+            out.attach(sha256, blobs.path(sha256))
+            post['attachment'] = {'sha256': sha256, 'filename': filename}
+        out.write('post', **post)
+    for row in rows(Comment.id, Comment.body, Comment.created_at, Comment.user_id, Comment.post_id):
+        out.write('comment', **row._asdict())
+    counts = out.close()
+    print("Exported " + ", ".join(f"{n} {kind}s" for kind, n in counts.items()) + f" to {directory}.")
+
+def import_blob(directory, sha256):
+    """Bring an export's attachment into the blob store; None if its file is missing."""
+    if blobs.exists(sha256):
+        return sha256, os.path.getsize(blobs.path(sha256))
+    path = attachment_path(directory, sha256)
+    return blobs.put_file(path) if os.path.isfile(path) else None
+
+@views.command('import')
+@click.argument('directory')
+@click.option('--batch-size', default=2000, show_default=True, help='Rows per INSERT batch.')
+def import_content(directory, batch_size):
+    """Load an export from blog001 or blog002 into this database.
+
+    Users are matched to existing ones by username, then email; topics by
+    name. Everything else is added with new ids.
+    """
+    topics = {name: topic_id for topic_id, name in db.session.query(Topic.id, Topic.name)}
+    by_username = dict(db.session.query(User.username, User.id))
+    by_email = dict(db.session.query(User.email, User.id))
+    user_offset, post_offset, comment_offset = (id_offset(db.session, m) for m in (User, Post, Comment))
+    topic_map, user_map = {}, {}
+    counts, missing = Counter(), 0
+    now = datetime.utcnow()
+    # dependency order: a post batch goes in after the users it references
+    inserter = BatchInserter(db.session, (User, Post, Comment), batch_size)
+    started = time.perf_counter()
+
+    def user_id(source_id):
+        return user_map.get(source_id, source_id + user_offset)
+
+    with deferred_index(db.session, 'post', ('title', 'body')):
+        for r in read_records(directory):
+            kind = r['type']
+            counts[kind] += 1
+            if kind == 'topic':
+                if r['name'] not in topics:
+                    topic = Topic(name=r['name'])
+                    db.session.add(topic)
+                    db.session.flush()
+                    topics[r['name']] = topic.id
+                topic_map[r['id']] = topics[r['name']]
+            elif kind == 'user':
+                existing = by_username.get(r['username']) or by_email.get(r['email'])
+                if existing:
+                    user_map[r['id']] = existing
+                    continue
+                row = {f: r.get(f) for f in USER_FIELDS}
+                row.update(id=r['id'] + user_offset, created_at=r.get('created_at') or now)
+                inserter.add(User, row)
+            elif kind == 'post':
+                row = {'id': r['id'] + post_offset, 'title': r['title'], 'body': r['body'],
+                       'created_at': r.get('created_at') or now, 'updated_at': r.get('updated_at'),
+                       'user_id': user_id(r['user_id']), 'topic_id': topic_map[r['topic_id']],
+                       'attachment_sha256': None, 'attachment_filename': None}
+                attachment = r.get('attachment')
+                blob = attachment and import_blob(directory, attachment['sha256'])
+                if blob:
+                    reference_blob(*blob)
+                    row.update(attachment_sha256=blob[0], attachment_filename=attachment['filename'])
+                elif attachment:
+                    missing += 1
+                inserter.add(Post, row)
+            elif kind == 'comment':
+                inserter.add(Comment, {'id': r['id'] + comment_offset, 'body': r['body'],
+                                       'created_at': r.get('created_at') or now,
+                                       'user_id': user_id(r['user_id']), 'post_id': r['post_id'] + post_offset})
+        inserter.close()
+        for model in (User, Post, Comment):
+            reset_sequence(db.session, model)
+        recount_activity()
+    # one transaction: committed with the index rebuild (SQLite) or here
+    db.session.commit()
+    page_cache.invalidate()
+    elapsed = time.perf_counter() - started
+    print("Imported " + ", ".join(f"{n} {kind}s" for kind, n in counts.items())
+          + f" ({len(user_map)} users matched existing accounts) in {elapsed:.1f}s, "
+          f"{counts['post'] / elapsed * 60:,.0f} posts/min.")
+    if missing:
+        print(f"{missing} attachments were missing from {directory} and were skipped.")
+    print("Markdown is rendered on first view; run `flask rerender` to do it now.")
+
 # --- small error handlers ----------------------------------------
-@app.errorhandler(403)
+@views.errorhandler(403)
 def forbidden(e):
     return render_template('error.html', code=403, message="Forbidden"), 403
 
-@app.errorhandler(404)
+@views.errorhandler(404)
 def not_found(e):
     return render_template('error.html', code=404, message="Not found"), 404
 
+@views.errorhandler(HashingBusy)
+def hashing_busy(e):
+    return render_template('error.html', code=503, message=e.description), 503, {'Retry-After': e.retry_after}
+
+# --- App factory -------------------------------------------------
+def create_app(config=None):
+    """Build the blog. ``config`` overrides the defaults below.
+
+    Paths default to the app's instance folder. ``DATABASE_URL`` (here or
+    in the environment) swaps in another database, which is how core.host
+    gives each mount its own.
+    """
+    app = Flask(__name__, instance_relative_config=True)
+    app.config['SECRET_KEY'] = os.environ.get('FLASK_SECRET', 'replace-this-with-secure-key')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['UPLOAD_FOLDER'] = os.path.join(app.instance_path, 'uploads')   # pre-blob-store, migrated by v7
+    app.config['BLOB_FOLDER'] = os.path.join(app.instance_path, 'blobs')
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB per upload
+    app.config['POSTS_PER_PAGE'] = 20
+    # topic/profile pages longer than POSTS_PER_PAGE (?per_page=, up to 500) stream as rows arrive
+    app.config['STREAM_LISTINGS'] = True
+    # /search bm25-ranks only this many of the newest matches, bounding the cost of very common words
+    app.config['SEARCH_MAX_CANDIDATES'] = 1000
+    # side work (render cache fills, blob sweeps) runs in `flask worker`; eager runs it inline instead
+    app.config['JOBS_EAGER'] = os.environ.get('NOIR_JOBS_EAGER') == '1'
+    app.config['BLOB_GC_GRACE'] = 3600
+    # account deletion works in chunks of this many rows, one transaction each
+    app.config['ACCOUNT_DELETE_BATCH'] = 500
+    app.config['ACCOUNT_DELETE_PROGRESS_ROWS'] = 100_000
+    # None: stream from the worker; 'x-accel' (nginx) or 'x-sendfile' hand the file to the proxy
+    app.config['ATTACHMENT_OFFLOAD'] = os.environ.get('NOIR_ATTACHMENT_OFFLOAD') or None
+    app.config['ATTACHMENT_ACCEL_PREFIX'] = '/_blobs/'   # nginx `internal` location aliased to BLOB_FOLDER
+    # build schema + seed on startup, one worker at a time (schema_lock); set NOIR_BOOTSTRAP=0
+    # when `flask initdb` runs as a deploy step, so workers never migrate
+    app.config['BOOTSTRAP_ON_STARTUP'] = os.environ.get('NOIR_BOOTSTRAP', '1') == '1'
+    # anonymous listing pages: 'lru' per worker, 'file' shared between workers
+    app.config['PAGE_CACHE_BACKEND'] = os.environ.get('NOIR_PAGE_CACHE', 'lru')
+    app.config['PAGE_CACHE_ENABLED'] = os.environ.get('NOIR_PAGE_CACHE') != 'off'
+    app.config['PAGE_CACHE_TTL'] = 60
+    # id -> (id, username) for Flask-Login; other user fields load on first use
+    app.config['USER_CACHE_TTL'] = 300
+    app.config['USER_CACHE_SIZE'] = 10000
+    # KDF for new hashes (older ones are upgraded at login) and the host-wide cap on hashes in flight
+    app.config['PASSWORD_HASH_METHOD'] = os.environ.get('NOIR_HASH_METHOD', 'scrypt:32768:8:1')
+    if os.environ.get('NOIR_HASH_SLOTS'):
+        app.config['PASSWORD_HASH_SLOTS'] = int(os.environ['NOIR_HASH_SLOTS'])
+    if os.environ.get('NOIR_HASH_WORKERS'):
+        app.config['PASSWORD_HASH_WORKERS'] = int(os.environ['NOIR_HASH_WORKERS'])
+
+    app.config.update(config or {})
+    # WAL + busy timeout for SQLite; DATABASE_URL swaps in a server database
+    configure_database(app, 'sqlite:///' + os.path.join(app.instance_path, 'noir_blog.sqlite3'))
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+    db.init_app(app)
+    init_sqlite_pragmas(app, db)
+    app.add_template_global(page_url)
+    init_query_counter(app)
+    page_cache.init_app(app)
+    jobs.init_app(app)
+    passwords.init_app(app)
+    user_cache.init_app(app)
+    app.extensions['blobs'] = BlobStore(app.config['BLOB_FOLDER'])
+    init_assets(app, ['css/noir.css'])
+    init_templates(app)
+    Metrics(app)
+    init_compression(app)
+    login_manager.init_app(app)
+
+    views.init_app(app)
+
+    if app.config['BOOTSTRAP_ON_STARTUP']:
+        with app.app_context():
+            bootstrap_db()
+    return app
+
 # --- Run ---------------------------------------------------------
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,5 @@
+"""Code shared by the Firstapps Flask apps.
+
+The apps are run from their own directories, so each one puts
+Basics/Firstapps on sys.path before importing from here.
+"""
@@ -0,0 +1,314 @@
+"""Fingerprinted, minified, pre-compressed static assets.
+
+    init_assets(app, ['cryo.css', 'cryo.js'])
+
+On startup, and through ``flask build-assets``, each listed file under the
+static folder is minified and written to ``static/build/`` as
+``name.<hash>.ext``, alongside ``.gz`` and (when the optional ``brotli``
+package is installed) ``.br`` copies. ``build/manifest.json`` maps the
+logical name to the fingerprinted one.
+
+``url_for('static', filename='cryo.css')`` then points at the
+fingerprinted file. Because the URL changes whenever the content does,
+those files are served with a one-year ``immutable`` Cache-Control, and
+the smallest variant the client's Accept-Encoding allows. Files outside
+the manifest are served by Flask's static handler as before.
+
+Set ``ASSETS_ENABLED = False`` to serve the sources as they are (handy
+while editing them). With ``ASSETS_AUTO_BUILD = False``, startup only
+loads an existing manifest; the build is then left to the deploy step.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import tempfile
+
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # .br variants are skipped without it
+    brotli = None
+
+BUILD_DIR = 'build'
+MANIFEST = 'manifest.json'
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+# --- Minifiers -----------------------------------------------------
+# Both are conservative tokenizers: string, template and regex literals are
+# copied verbatim, comments are dropped and whitespace is only removed
+# where the grammar cannot notice.
+
+_CSS_TOKEN = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|(/\*.*?\*/)|(\s+)''', re.S)
+
+
+def minify_css(text):
+    out, strings = [], []
+    pos = 0
+    for match in _CSS_TOKEN.finditer(text):
+        out.append(text[pos:match.start()])
+        string, _comment, space = match.groups()
+        if string:
+            # parked while the rules below run, so quoted text is untouched
+            strings.append(string)
+            out.append(f'\x00{len(strings) - 1}\x00')
+        elif space:
+            out.append(' ')
+        pos = match.end()
+    out.append(text[pos:])
+    css = re.sub(' +', ' ', ''.join(out))
+    # never before ':', so "a :hover" keeps its descendant combinator
+    css = re.sub(r' ?([{};,>]) ?', r'\1', css)
+    css = css.replace(': ', ':').replace(';}', '}')
+    return re.sub(r'\x00(\d+)\x00', lambda m: strings[int(m.group(1))], css).strip()
+
+
+_WORD = re.compile(r'[\w$\\]')
+_REGEX_AFTER = set('(,=:[!&|?{};+-*%<>~^')
+_REGEX_KEYWORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete', 'void', 'throw'}
+# a newline after these, or before the closers, can never end a statement
+_CONTINUES = set('{;,([=:?&|+-*/<>!.')
+_CLOSERS = set('}),;.]')
+
+
+def _skip_string(src, i, quote):
+    i += 1
+    while src[i] != quote:
+        i += 2 if src[i] == '\\' else 1
+    return i + 1
+
+
+def _skip_regex(src, i):
+    i += 1
+    in_class = False
+    while True:
+        c = src[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == '[':
+            in_class = True
+        elif c == ']':
+            in_class = False
+        elif c == '/' and not in_class:
+            break
+        i += 1
+    i += 1
+    while i < len(src) and _WORD.match(src[i]):   # flags
+        i += 1
+    return i
+
+
+def minify_js(src):
+    out = []
+    word = ''            # identifier/keyword just emitted, for regex detection
+    pending = ''         # '', ' ' or '\n': whitespace seen since the last token
+    braces = []          # brace depth of each open ${ } inside template literals
+    i, n = 0, len(src)
+
+    def emit(token):
+        nonlocal pending
+        if pending and out:
+            prev, nxt = out[-1][-1], token[0]
+            if pending == '\n' and prev not in _CONTINUES and nxt not in _CLOSERS:
+                out.append('\n')
+            elif (_WORD.match(prev) and _WORD.match(nxt)) or (prev in '+-' and nxt == prev):
+                out.append(' ')
+        pending = ''
+        out.append(token)
+
+    def template(i):
+        # from just after a backtick (or the } closing a ${}) to the end of the chunk
+        start = i
+        while True:
+            c = src[i]
+            if c == '\\':
+                i += 2
+            elif c == '`':
+                return i + 1, src[start:i + 1], False
+            elif src.startswith('${', i):
+                return i + 2, src[start:i + 2], True
+            else:
+                i += 1
+
+    while i < n:
+        c = src[i]
+        if c in ' \t\r\n':
+            j = i
+            while j < n and src[j] in ' \t\r\n':
+                j += 1
+            pending = '\n' if '\n' in src[i:j] or pending == '\n' else ' '
+            i = j
+        elif src.startswith('//', i):
+            end = src.find('\n', i)
+            i = n if end == -1 else end
+        elif src.startswith('/*', i):
+            end = src.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+            pending = pending or ' '
+        elif c in '\'"':
+            j = _skip_string(src, i, c)
+            emit(src[i:j])
+            word, i = '', j
+        elif c == '`':
+            i, chunk, opened = template(i + 1)
+            emit('`' + chunk)
+            if opened:
+                braces.append(0)
+            word = ''
+        elif c == '/' and (not out or out[-1][-1] in _REGEX_AFTER or word in _REGEX_KEYWORDS):
+            j = _skip_regex(src, i)
+            emit(src[i:j])
+            word, i = '', j
+        elif _WORD.match(c):
+            j = i
+            while j < n and (_WORD.match(src[j]) or (src[j] == '.' and src[i].isdigit())):
+                j += 1
+            word = src[i:j]
+            emit(word)
+            i = j
+        else:
+            if braces and c == '{':
+                braces[-1] += 1
+            elif braces and c == '}':
+                if braces[-1] == 0:
+                    braces.pop()
+                    i, chunk, opened = template(i + 1)
+                    emit('}' + chunk)
+                    if opened:
+                        braces.append(0)
+                    word = ''
+                    continue
+                braces[-1] -= 1
+            emit(c)
+            word = ''
+            i += 1
+    return ''.join(out)
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+# --- Build ---------------------------------------------------------
+def _write(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def build_assets(static_folder, files):
+    """Minify, fingerprint and pre-compress ``files``; return the manifest."""
+    out_dir = os.path.join(static_folder, BUILD_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {}
+    for name in files:
+        source = os.path.join(static_folder, name)
+        if not os.path.isfile(source):
+            continue
+        stem, ext = os.path.splitext(name)
+        with open(source, 'rb') as f:
+            data = f.read()
+        minify = MINIFIERS.get(ext)
+        if minify:
+            data = minify(data.decode('utf-8')).encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        built = f"{BUILD_DIR}/{stem}.{digest}{ext}"
+        target = os.path.join(static_folder, built)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # mtime=0: identical input gives byte-identical .gz on every host
+            _write(target + '.gz', gzip.compress(data, 9, mtime=0))
+            if brotli is not None:
+                _write(target + '.br', brotli.compress(data, quality=11))
+            _write(target, data)
+        manifest[name] = built
+    _write(os.path.join(out_dir, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+def _manifest_is_current(static_folder, files):
+    path = os.path.join(static_folder, BUILD_DIR, MANIFEST)
+    try:
+        built = os.path.getmtime(path)
+    except OSError:
+        return False
+    sources = [os.path.join(static_folder, name) for name in files]
+    return all(os.path.getmtime(s) <= built for s in sources if os.path.isfile(s))
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, BUILD_DIR, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def asset_bytes(static_folder, filename, accept_encoding=''):
+    """Bytes a client sending ``accept_encoding`` downloads for ``filename``."""
+    path = os.path.join(static_folder, filename)
+    for encoding, suffix in ENCODINGS:
+        if encoding in accept_encoding and os.path.exists(path + suffix):
+            return os.path.getsize(path + suffix)
+    return os.path.getsize(path)
+
+
+# --- Flask wiring --------------------------------------------------
+def init_assets(app, files):
+    app.config.setdefault('ASSETS_ENABLED', True)
+    app.config.setdefault('ASSETS_AUTO_BUILD', True)
+    static_folder = app.static_folder
+    app.config['ASSETS'] = list(files)
+
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """Minify, fingerprint and pre-compress the static assets."""
+        manifest = build_assets(static_folder, app.config['ASSETS'])
+        app.extensions['assets'] = manifest
+        for name, built in sorted(manifest.items()):
+            print(f"{name} -> {built}  {asset_bytes(static_folder, name)} -> "
+                  f"{asset_bytes(static_folder, built, 'br, gzip')} bytes")
+
+    if not app.config['ASSETS_ENABLED']:
+        app.extensions['assets'] = {}
+        return
+    if app.config['ASSETS_AUTO_BUILD'] and not _manifest_is_current(static_folder, files):
+        app.extensions['assets'] = build_assets(static_folder, files)
+    else:
+        app.extensions['assets'] = load_manifest(static_folder)
+
+    @app.url_defaults
+    def fingerprint(endpoint, values):
+        if endpoint == 'static':
+            built = app.extensions['assets'].get(values.get('filename'))
+            if built:
+                values['filename'] = built
+
+    plain_static = app.view_functions['static']
+    prefix = BUILD_DIR + '/'
+
+    def static(filename):
+        if not filename.startswith(prefix) or filename.endswith(('.gz', '.br')):
+            return plain_static(filename=filename)
+        path = os.path.join(static_folder, filename)
+        chosen, encoding = filename, None
+        for name, suffix in ENCODINGS:
+            if request.accept_encodings[name] and os.path.exists(path + suffix):
+                chosen, encoding = filename + suffix, name
+                break
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_from_directory(static_folder, chosen, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    app.view_functions['static'] = static
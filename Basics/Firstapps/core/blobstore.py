@@ -0,0 +1,116 @@
+"""Content-addressed file store: one file per distinct content.
+
+Blobs are named by their sha256 and sharded two levels deep
+(``ab/cd/abcd...``) so no directory grows huge. Identical uploads share
+one file, and since a blob's content can never change under its name,
+URLs built from the hash can be cached forever.
+
+The store only knows about files. Which blobs are still referenced is the
+app's business (see blog002's Attachment table); ``collect()`` removes
+the ones the app says are unreferenced.
+"""
+import os
+import shutil
+import tempfile
+import time
+
+from .downloads import file_sha256, save_upload
+
+
+class BlobStore:
+    def __init__(self, root):
+        self.root = root
+        self.tmp_dir = os.path.join(root, 'tmp')
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def relpath(self, sha256):
+        return os.path.join(sha256[:2], sha256[2:4], sha256)
+
+    def path(self, sha256):
+        return os.path.join(self.root, self.relpath(sha256))
+
+    def exists(self, sha256):
+        return os.path.isfile(self.path(sha256))
+
+    def put(self, file_storage):
+        """Store an upload, returning (sha256, size).
+
+        The upload is streamed to a temp file and hashed on the way, then
+        renamed into place. If the content is already stored, the temp
+        copy is dropped and the existing blob is reused.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        os.close(fd)
+        try:
+            sha256 = save_upload(file_storage, tmp_path)
+            size = os.path.getsize(tmp_path)
+            self._commit(tmp_path, sha256)
+            return sha256, size
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def put_file(self, path):
+        """Copy a local file into the store, returning (sha256, size)."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        os.close(fd)
+        try:
+            shutil.copyfile(path, tmp_path)
+            sha256 = file_sha256(tmp_path)
+            size = os.path.getsize(tmp_path)
+            self._commit(tmp_path, sha256)
+            return sha256, size
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def adopt(self, path, sha256):
+        """Move an existing file whose hash is already known into the store."""
+        if not self._commit(path, sha256):
+            os.remove(path)
+
+    def _commit(self, tmp_path, sha256):
+        final = self.path(sha256)
+        if os.path.exists(final):
+            # fresh mtime keeps a reused blob inside collect()'s grace window
+            os.utime(final)
+            return False
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        os.replace(tmp_path, final)
+        return True
+
+    def delete(self, sha256):
+        try:
+            os.remove(self.path(sha256))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def iter_blobs(self):
+        """Yield (sha256, mtime) for every stored blob."""
+        for shard in os.scandir(self.root):
+            if not shard.is_dir() or len(shard.name) != 2:
+                continue
+            for sub in os.scandir(shard.path):
+                if not sub.is_dir():
+                    continue
+                for entry in os.scandir(sub.path):
+                    if entry.is_file() and len(entry.name) == 64:
+                        yield entry.name, entry.stat().st_mtime
+
+    def collect(self, referenced, grace_seconds=3600):
+        """Delete blobs not in ``referenced`` (a set of hashes).
+
+        Blobs newer than ``grace_seconds`` are kept: their upload may still
+        be waiting on its database commit. Stale temp files are swept too.
+        Returns the number of blobs removed.
+        """
+        cutoff = time.time() - grace_seconds
+        removed = 0
+        for sha256, mtime in list(self.iter_blobs()):
+            if sha256 not in referenced and mtime < cutoff and self.delete(sha256):
+                removed += 1
+        for entry in os.scandir(self.tmp_dir):
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        return removed
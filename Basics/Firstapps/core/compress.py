@@ -0,0 +1,249 @@
+"""gzip / brotli response compression as WSGI middleware.
+
+    init_compression(app)      # wraps app.wsgi_app
+
+Compresses text-like responses (HTML, CSS, JS, JSON, XML, SVG) for
+clients that accept br or gzip. Brotli is preferred when the optional
+``brotli`` package is installed. Bodies are compressed chunk by chunk as
+the app yields them, with a flush after each chunk, so streamed pages keep
+their early first byte.
+
+A response is left alone when it:
+
+- already has a Content-Encoding (such as pre-compressed assets);
+- is not a compressible type (images, archives, most attachments);
+- is a download (``Content-Disposition: attachment``), whatever its type,
+  or a file passed straight through from send_file(). Those keep their
+  exact bytes, Content-Length and Accept-Ranges, so Range requests work;
+- is a 206 / 304 / 204;
+- is handed to the proxy via X-Accel-Redirect or X-Sendfile;
+- says Cache-Control: no-transform;
+- ends before ``COMPRESS_MIN_SIZE`` bytes. Bodies without a
+  Content-Length are buffered up to that size before deciding.
+
+Config: COMPRESS_ENABLED, COMPRESS_MIN_SIZE (default 500 bytes),
+COMPRESS_LEVEL (gzip 1-9, default 6), COMPRESS_BROTLI_QUALITY (0-11,
+default 4). ``stats()`` reports bytes in/out and the CPU time spent
+compressing, so the saving per CPU-millisecond can be checked per level.
+"""
+import threading
+import time
+import zlib
+
+from werkzeug.wsgi import FileWrapper
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSIBLE = (
+    'text/', 'application/json', 'application/javascript', 'application/xml',
+    'application/rss+xml', 'application/atom+xml', 'image/svg+xml',
+)
+SKIP_STATUS = ('204', '206', '304')
+
+
+def _header(headers, name):
+    name = name.lower()
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _accepts(environ, coding):
+    # a bare "gzip" or "gzip;q=0.8" counts; "gzip;q=0" does not
+    for part in environ.get('HTTP_ACCEPT_ENCODING', '').lower().split(','):
+        token, _, params = part.strip().partition(';')
+        if token == coding:
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+def _passthrough(environ, body):
+    # send_file()'s body: the server's wsgi.file_wrapper when it has one, else werkzeug's
+    wrapper = environ.get('wsgi.file_wrapper')
+    return isinstance(body, FileWrapper) or (isinstance(wrapper, type) and isinstance(body, wrapper))
+
+
+class _Encoder:
+    def __init__(self, coding, level, quality):
+        self.coding = coding
+        if coding == 'br':
+            self._c = brotli.Compressor(quality=quality)
+        else:
+            self._c = zlib.compressobj(level, zlib.DEFLATED, 31)   # 31: gzip container
+
+    def chunk(self, data):
+        if self.coding == 'br':
+            return self._c.process(data) + self._c.flush()
+        return self._c.compress(data) + self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._c.finish() if self.coding == 'br' else self._c.flush()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, min_size=500, level=6, brotli_quality=4):
+        self.app = app
+        self.min_size = min_size
+        self.level = level
+        self.brotli_quality = brotli_quality
+        self._lock = threading.Lock()
+        self.compressed = self.skipped = 0
+        self.bytes_in = self.bytes_out = 0
+        self.cpu_seconds = 0.0
+
+    def stats(self):
+        saved = self.bytes_in - self.bytes_out
+        return {
+            'compressed': self.compressed,
+            'skipped': self.skipped,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'bytes_saved': saved,
+            'ratio': round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else None,
+            'cpu_ms': round(self.cpu_seconds * 1000, 3),
+            'saved_per_cpu_ms': round(saved / (self.cpu_seconds * 1000)) if self.cpu_seconds else None,
+        }
+
+    def _record(self, compressed, bytes_in=0, bytes_out=0, cpu=0.0):
+        with self._lock:
+            if compressed:
+                self.compressed += 1
+                self.bytes_in += bytes_in
+                self.bytes_out += bytes_out
+                self.cpu_seconds += cpu
+            else:
+                self.skipped += 1
+
+    def _coding(self, environ):
+        if environ.get('REQUEST_METHOD') == 'HEAD':
+            return None
+        if brotli is not None and _accepts(environ, 'br'):
+            return 'br'
+        return 'gzip' if _accepts(environ, 'gzip') else None
+
+    def _eligible(self, status, headers):
+        if status[:3] in SKIP_STATUS:
+            return False
+        if (_header(headers, 'Content-Disposition') or '').lower().startswith('attachment'):
+            return False
+        if _header(headers, 'Content-Encoding') or _header(headers, 'X-Accel-Redirect') \
+                or _header(headers, 'X-Sendfile'):
+            return False
+        if 'no-transform' in (_header(headers, 'Cache-Control') or ''):
+            return False
+        ctype = (_header(headers, 'Content-Type') or '').lower()
+        if not ctype.startswith(COMPRESSIBLE):
+            return False
+        length = _header(headers, 'Content-Length')
+        return length is None or int(length) >= self.min_size
+
+    def __call__(self, environ, start_response):
+        coding = self._coding(environ)
+        if coding is None:
+            return self.app(environ, start_response)
+        captured = []
+
+        def capture(status, headers, exc_info=None):
+            if exc_info and captured:
+                raise exc_info[1].with_traceback(exc_info[2])
+            captured[:] = [status, headers, exc_info]
+            return lambda data: pending.append(data)   # legacy write(); rarely used
+
+        pending = []
+        body = self.app(environ, capture)
+        if captured and _passthrough(environ, body):
+            # start_response has been called; hand the file on untouched
+            self._record(False)
+            start_response(*captured)
+            return body
+        return self._respond(body, captured, pending, coding, start_response)
+
+    def _respond(self, body, captured, pending, coding, start_response):
+        chunks = iter(body)
+        try:
+            # run the app until it has called start_response
+            while not captured:
+                pending.append(next(chunks))
+            status, headers, exc_info = captured
+            if not self._eligible(status, headers):
+                self._record(False)
+                start_response(status, headers, exc_info)
+                yield from pending
+                yield from chunks
+                return
+            # too small to be worth it? buffer until we know
+            buffered = sum(len(c) for c in pending)
+            done = False
+            while buffered < self.min_size:
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    done = True
+                    break
+                pending.append(chunk)
+                buffered += len(chunk)
+            if done and buffered < self.min_size:
+                self._record(False)
+                start_response(status, headers, exc_info)
+                yield from pending
+                return
+
+            headers = [(k, v) for k, v in headers if k.lower() not in ('content-length', 'accept-ranges')]
+            vary = [v for k, v in headers if k.lower() == 'vary']
+            headers = [(k, v) for k, v in headers if k.lower() != 'vary']
+            headers.append(('Vary', ', '.join(vary + ['Accept-Encoding'])))
+            headers.append(('Content-Encoding', coding))
+            # a strong ETag names exact bytes; these are no longer them
+            headers = [(k, 'W/' + v if k.lower() == 'etag' and not v.startswith('W/') else v)
+                       for k, v in headers]
+            start_response(status, headers, exc_info)
+
+            encoder = _Encoder(coding, self.level, self.brotli_quality)
+            size_in = size_out = 0
+            cpu = 0.0
+            for chunk in _chain(pending, chunks):
+                if not chunk:
+                    continue
+                started = time.thread_time()
+                out = encoder.chunk(chunk)
+                cpu += time.thread_time() - started
+                size_in += len(chunk)
+                size_out += len(out)
+                yield out
+            started = time.thread_time()
+            tail = encoder.finish()
+            cpu += time.thread_time() - started
+            size_out += len(tail)
+            self._record(True, size_in, size_out, cpu)
+            yield tail
+        finally:
+            close = getattr(body, 'close', None)
+            if close is not None:
+                close()
+
+
+def _chain(first, rest):
+    yield from first
+    yield from rest
+
+
+def init_compression(app):
+    app.config.setdefault('COMPRESS_ENABLED', True)
+    app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+    app.config.setdefault('COMPRESS_BROTLI_QUALITY', 4)
+    if not app.config['COMPRESS_ENABLED']:
+        return None
+    middleware = CompressionMiddleware(
+        app.wsgi_app,
+        min_size=app.config['COMPRESS_MIN_SIZE'],
+        level=app.config['COMPRESS_LEVEL'],
+        brotli_quality=app.config['COMPRESS_BROTLI_QUALITY'],
+    )
+    app.wsgi_app = middleware
+    app.extensions['compression'] = middleware
+    return middleware
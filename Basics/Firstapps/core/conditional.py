@@ -0,0 +1,65 @@
+"""Conditional GET for rendered pages: weak ETag and early 304.
+
+    def post_validators(post_id):
+        row = ...one cheap query...
+        return row.updated_at, row.comment_count, row.last_comment_at
+
+    @app.route('/post/<int:post_id>')
+    @conditional(post_validators)
+    def post_detail(post_id): ...
+
+The validator gets the view's arguments and returns the parts the page is
+built from, or None to skip the check (e.g. the row is missing and the view
+will 404, or the page is about to mint per-session state). The parts are
+hashed into a weak ETag together with the logged-in user id, since
+navigation and owner controls differ per user. When the client's
+If-None-Match still matches, a 304 goes back before the view queries or
+renders anything.
+
+No Last-Modified is sent. These pages change with who is logged in and
+with deletions, neither of which moves a timestamp forward, so an
+If-Modified-Since revalidation could keep a stale page; ETag parts such
+as counts do catch both.
+
+Pages carry ``Cache-Control: private, no-cache`` so browsers revalidate on
+every visit and shared caches keep out. Requests with pending flash
+messages always get the full page, so the messages are shown and consumed.
+"""
+import hashlib
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+from werkzeug.http import is_resource_modified
+
+
+def page_etag(parts):
+    digest = hashlib.sha1(repr((session.get('_user_id'),) + tuple(parts)).encode()).hexdigest()
+    return digest[:20]
+
+
+def _stamp(response, etag):
+    response.set_etag(etag, weak=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
+
+
+def conditional(validator):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or '_flashes' in session:
+                return view(*args, **kwargs)
+            parts = validator(*args, **kwargs)
+            if parts is None:
+                return view(*args, **kwargs)
+            etag = page_etag(parts)
+            if not is_resource_modified(request.environ, etag=etag):
+                return _stamp(current_app.response_class(status=304), etag)
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            return _stamp(response, etag)
+        return wrapper
+    return decorator
@@ -0,0 +1,97 @@
+"""Content pages discovered from an app's templates/ tree and served by one view.
+
+    content = ContentRegistry(app, '/subjects', section_endpoint='subject', page_endpoint='topic')
+
+A section is any folder under templates/ that has an index.html. Every
+other ``<slug>.html`` in that folder is one of its pages:
+
+    templates/biology/index.html            /subjects/biology
+    templates/biology/biotechnology.html    /subjects/biology/biotechnology
+
+The tree is scanned once, when the app is built, into a dict keyed by
+(section, page). A request is one lookup and one render, with no redirect
+to a per-page view. Anything not in the dict is a 404. New templates show
+up after a restart.
+
+Templates describe themselves with ``{# key: value #}`` comment lines
+(title, summary, or anything else the listing cards show). These end up
+in ``meta``. Every template gets the registry as ``content``: iterate over
+``content.sections`` (each with its ``pages``) to build navigation.
+"""
+import os
+import re
+from dataclasses import dataclass, field
+
+from flask import abort, render_template
+
+META_LINE = re.compile(r'^\s*\{#\s*(\w+):\s*(.*?)\s*#\}\s*$')
+SLUG = re.compile(r'^[a-z0-9][a-z0-9_-]*$')
+
+
+@dataclass
+class Page:
+    section: str
+    slug: str
+    template: str
+    meta: dict
+
+    @property
+    def title(self):
+        return self.meta.get('title') or self.slug.replace('_', ' ').replace('-', ' ').title()
+
+
+@dataclass
+class Section(Page):
+    pages: list = field(default_factory=list)
+
+
+def read_meta(path):
+    meta = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            match = META_LINE.match(line)
+            if match:
+                meta[match.group(1)] = match.group(2)
+    return meta
+
+
+class ContentRegistry:
+    def __init__(self, app=None, url_prefix='', section_endpoint='section', page_endpoint='page'):
+        self.url_prefix = url_prefix.rstrip('/')
+        self.section_endpoint = section_endpoint
+        self.page_endpoint = page_endpoint
+        self.sections = []
+        self.index = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.scan(os.path.join(app.root_path, app.template_folder))
+        app.add_url_rule(f'{self.url_prefix}/<section>', self.section_endpoint, self.show)
+        app.add_url_rule(f'{self.url_prefix}/<section>/<page>', self.page_endpoint, self.show)
+        app.context_processor(lambda: {'content': self})
+        app.extensions['content'] = self
+
+    def scan(self, root):
+        self.sections, self.index = [], {}
+        for name in sorted(os.listdir(root)):
+            folder = os.path.join(root, name)
+            if not (SLUG.match(name) and os.path.isfile(os.path.join(folder, 'index.html'))):
+                continue
+            section = Section(name, name, f'{name}/index.html', read_meta(os.path.join(folder, 'index.html')))
+            for filename in sorted(os.listdir(folder)):
+                slug, ext = os.path.splitext(filename)
+                # index0.html and the like are kept-around drafts, not pages
+                if ext != '.html' or not SLUG.match(slug) or slug.startswith('index'):
+                    continue
+                page = Page(name, slug, f'{name}/{filename}', read_meta(os.path.join(folder, filename)))
+                section.pages.append(page)
+                self.index[name, slug] = page
+            self.sections.append(section)
+            self.index[name, None] = section
+
+    def show(self, section, page=None):
+        entry = self.index.get((section, page))
+        if entry is None:
+            abort(404)
+        return render_template(entry.template, page=entry, section=self.index[section, None])
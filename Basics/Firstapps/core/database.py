@@ -0,0 +1,126 @@
+"""Database engine profile shared by the blog apps.
+
+    configure_database(app, default_uri)    # before SQLAlchemy(app)
+    db = SQLAlchemy(app)
+    init_sqlite_pragmas(app, db)            # before the first query
+
+``DATABASE_URL`` in the app's config, or else in the environment, replaces
+the app's bundled SQLite file with a server database. Full-text search is
+SQLite's FTS5; elsewhere core.fts falls back to LIKE. SQLite connections
+get a concurrency-oriented profile: WAL so readers no longer block on a
+writer, a busy timeout instead of immediate "database is locked" errors,
+and a larger page cache and mmap window. Every setting can be overridden through
+``app.config['SQLITE_PRAGMAS']`` or ``SQLITE_<NAME>`` environment
+variables.
+
+Schema changes made at startup go through two helpers:
+
+    with schema_lock(app):                  # one process at a time on this host
+        begin_schema_step(db)               # DDL below commits or rolls back as a unit
+        ...
+        db.session.commit()
+
+Without the lock, every gunicorn worker that builds the app races the
+others through CREATE TABLE and ALTER TABLE. pysqlite commits each DDL
+statement by itself unless a transaction was begun explicitly, so a step
+that fails half way would otherwise leave its first columns behind.
+"""
+import os
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+try:
+    import fcntl
+except ImportError:         # Windows: no lock, bootstrap with `flask initdb` before starting workers
+    fcntl = None
+
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',      # durable across app crashes in WAL mode, fsync only at checkpoints
+    'busy_timeout': 5000,         # ms to wait for a competing writer
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,     # negative means KiB: 64 MiB per connection
+    'temp_store': 'MEMORY',
+}
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def configure_database(app, default_uri):
+    """Pick the database URL and pool settings for ``app``.
+
+    Pool sizes are per process, so with N gunicorn workers the database
+    sees up to N * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections.
+    """
+    uri = app.config.get('DATABASE_URL') or os.environ.get('DATABASE_URL', default_uri)
+    if uri.startswith('postgres://'):
+        # Heroku-style URLs; SQLAlchemy only accepts the postgresql:// scheme
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+
+    options = {}
+    if uri in ('sqlite://', 'sqlite:///:memory:'):
+        # in-memory databases live in one connection; no pool to tune
+        app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+        return
+    options.update(
+        pool_size=_env_int('DB_POOL_SIZE', 5),
+        max_overflow=_env_int('DB_MAX_OVERFLOW', 5),
+        pool_timeout=_env_int('DB_POOL_TIMEOUT', 10),
+    )
+    if uri.startswith('sqlite'):
+        pragmas = dict(DEFAULT_SQLITE_PRAGMAS)
+        for name in pragmas:
+            env = os.environ.get(f'SQLITE_{name.upper()}')
+            if env:
+                pragmas[name] = env
+        pragmas.update(app.config.get('SQLITE_PRAGMAS', {}))
+        app.config['SQLITE_PRAGMAS'] = pragmas
+        # the driver's own lock wait, in seconds, matches busy_timeout
+        options['connect_args'] = {'timeout': int(pragmas['busy_timeout']) / 1000}
+    else:
+        options['pool_pre_ping'] = True
+        options['pool_recycle'] = 1800
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+def init_sqlite_pragmas(app, db):
+    """Apply app.config['SQLITE_PRAGMAS'] to every new SQLite connection."""
+    pragmas = app.config.get('SQLITE_PRAGMAS')
+    if not pragmas:
+        return
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_conn, record):
+        cursor = dbapi_conn.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+@contextmanager
+def schema_lock(app, name='schema'):
+    """Hold an exclusive flock() on ``<instance>/<name>.lock`` for the block."""
+    os.makedirs(app.instance_path, exist_ok=True)
+    with open(os.path.join(app.instance_path, f'{name}.lock'), 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def begin_schema_step(db):
+    """Start a transaction that covers DDL too, on SQLite as on a server database."""
+    db.session.commit()
+    if db.engine.dialect.name == 'sqlite':
+        db.session.connection().exec_driver_sql('BEGIN IMMEDIATE')
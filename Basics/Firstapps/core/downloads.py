@@ -0,0 +1,114 @@
+"""Attachment delivery: content-hash ETags, Range support and proxy offload.
+
+    send_attachment(directory, filename, etag=sha256_hex)
+
+``app.config['ATTACHMENT_OFFLOAD']`` selects how the bytes are sent:
+
+``None`` (default)
+    The worker streams the file with werkzeug's send_file, which honours
+    Range/If-Range (206 responses for resumable downloads) and uses
+    wsgi.file_wrapper, so gunicorn can sendfile(2) it.
+``'x-accel'``
+    nginx: the response carries only ``X-Accel-Redirect`` pointing at
+    ``ATTACHMENT_ACCEL_PREFIX`` + filename, an ``internal`` location that
+    nginx serves (with Range) itself. The worker is free at once.
+``'x-sendfile'``
+    Apache/lighttpd mod_xsendfile: an ``X-Sendfile`` header with the path.
+
+In every mode ``If-None-Match`` against the stored hash is answered with
+304 before the file is touched.
+"""
+import hashlib
+import mimetypes
+import os
+from urllib.parse import quote
+
+from flask import current_app, request
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+from werkzeug.utils import send_from_directory as werkzeug_send_from_directory
+
+CHUNK_SIZE = 64 * 1024
+
+
+def save_upload(file_storage, path):
+    """Write an upload to ``path`` in chunks, returning its sha256 hex digest.
+
+    Hashing happens on the same pass as the write, so the upload is read
+    once and never held in memory whole.
+    """
+    digest = hashlib.sha256()
+    stream = file_storage.stream
+    with open(path, 'wb') as out:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _content_disposition(name):
+    try:
+        name.encode('ascii')
+        return f'attachment; filename="{name}"'
+    except UnicodeEncodeError:
+        return f"attachment; filename*=UTF-8''{quote(name)}"
+
+
+def _cache_headers(response, max_age, immutable):
+    response.cache_control.max_age = max_age
+    if not max_age:
+        response.cache_control.no_cache = True      # revalidate every time, by ETag
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    return response
+
+
+def send_attachment(directory, filename, etag=None, download_name=None, max_age=3600, immutable=False):
+    """Send ``directory/filename`` as a download, honouring ``ATTACHMENT_OFFLOAD``.
+
+    Pass ``immutable=True`` only for URLs whose content can never change,
+    such as ones that embed the content hash. URLs whose content can be
+    replaced should pass ``max_age=0``: clients then revalidate with the
+    ETag on every use and get a 304 while it still matches.
+    """
+    download_name = download_name or filename
+    if etag and request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return _cache_headers(response, max_age, immutable)
+
+    mode = current_app.config.get('ATTACHMENT_OFFLOAD')
+    if mode == 'x-accel':
+        path = safe_join(directory, filename)
+        if path is None or not os.path.isfile(path):
+            raise NotFound()
+        response = current_app.response_class()
+        prefix = current_app.config.get('ATTACHMENT_ACCEL_PREFIX', '/_uploads/')
+        response.headers['X-Accel-Redirect'] = prefix + quote(filename)
+        response.headers['Content-Disposition'] = _content_disposition(download_name)
+        response.content_type = mimetypes.guess_type(download_name)[0] or 'application/octet-stream'
+        if etag:
+            response.set_etag(etag)
+        return _cache_headers(response, max_age, immutable)
+
+    response = werkzeug_send_from_directory(
+        directory, filename, request.environ,
+        as_attachment=True, download_name=download_name,
+        etag=etag if etag else True, conditional=True, max_age=max_age,
+        use_x_sendfile=mode == 'x-sendfile',
+        response_class=current_app.response_class,
+        _root_path=current_app.root_path,
+    )
+    return _cache_headers(response, max_age, immutable)
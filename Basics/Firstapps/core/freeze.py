@@ -0,0 +1,328 @@
+"""Pre-rendered HTML for pages that are the same on every request.
+
+    init_freeze(app, exclude={'home'})     # before init_compression; endpoints that stay dynamic
+
+    $ flask freeze                        # render into FREEZE_DIR; only what changed
+    $ flask freeze --force                # everything
+    $ FREEZE_SERVE=1 gunicorn ...         # serve FREEZE_DIR first, the app for the rest
+
+``flask freeze`` starts from every GET rule without arguments, plus the
+pages of a core.content registry. It then follows the same-site links in
+everything it renders, so pages reachable only through a link are found
+too. A page is written as ``<path>/index.html``. Redirects become small
+meta-refresh pages. The static folder is copied next to the pages, so
+any web server can serve the directory.
+
+Rebuilds are incremental. manifest.json records, per page, the templates
+it was rendered from: the one render_template() named, and everything
+that one extends, includes or imports, found with Jinja's parser. Each
+template is stored with a hash of its source. A page is rendered again
+only when one of those templates has changed. Everything is rendered
+again when anything every page may depend on changes:
+
+- the app module's source;
+- core.content pages coming, going or changing their metadata, since
+  every page's navigation lists them;
+- the core.assets manifest, whose fingerprinted file names are in every
+  page's links;
+- any file in the static folder (name, size or mtime) or the set of
+  template names.
+Pages that no longer render are deleted.
+
+With FREEZE_SERVE, a WSGI middleware answers GET and HEAD requests from
+FREEZE_DIR before Flask runs at all, whenever the manifest has the path.
+Everything else goes to the app: excluded endpoints, query strings, other
+methods, and pages added since the last freeze. The files are served as
+frozen, so freeze again after changing templates. The links in frozen
+HTML include the SCRIPT_NAME it was rendered for (``--script-root``).
+Output made for another mount point is never served.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from html import escape
+from urllib.parse import urlsplit
+
+import click
+from flask import template_rendered, url_for
+from jinja2 import meta
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import RequestRedirect
+from werkzeug.utils import redirect, send_file
+
+MANIFEST = 'manifest.json'
+FORMAT = 1
+LINK = re.compile(r'''(?:href|src)=["']([^"'#]+)''')
+REDIRECT_PAGE = ('<!doctype html><meta charset="utf-8"><meta http-equiv="refresh" content="0; url={0}">'
+                 '<link rel="canonical" href="{0}"><a href="{0}">{0}</a>\n')
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def page_file(path):
+    """'/' -> 'index.html', '/about' -> 'about/index.html'."""
+    path = path.strip('/')
+    return f'{path}/index.html' if path else 'index.html'
+
+
+class Freezer:
+    def __init__(self, app, exclude=()):
+        self.app = app
+        self.exclude = set(exclude) | {'static'}
+
+    # --- what to render ----------------------------------------------
+    def seeds(self, script_root):
+        urls = []
+        with self.app.test_request_context(base_url=f'http://localhost{script_root}/'):
+            for rule in self.app.url_map.iter_rules():
+                if 'GET' in rule.methods and not rule.arguments and rule.endpoint not in self.exclude:
+                    urls.append(url_for(rule.endpoint))
+            content = self.app.extensions.get('content')
+            if content is not None:
+                for section in content.sections:
+                    urls.append(url_for(content.section_endpoint, section=section.slug))
+                    urls.extend(url_for(content.page_endpoint, section=section.slug, page=page.slug)
+                                for page in section.pages)
+        return [url[len(script_root):] or '/' for url in urls]
+
+    def endpoint(self, path):
+        """The endpoint ``path`` would be served by, or None if it should not be frozen."""
+        try:
+            endpoint, _ = self.app.url_map.bind('localhost').match(path, method='GET')
+        except (HTTPException, RequestRedirect):
+            return None
+        return None if endpoint in self.exclude else endpoint
+
+    def links(self, html, script_root):
+        found = []
+        for url in LINK.findall(html):
+            parts = urlsplit(url)
+            if parts.scheme or parts.netloc or not parts.path.startswith(script_root + '/'):
+                continue
+            path = parts.path[len(script_root):] or '/'
+            if not parts.query and self.endpoint(path):
+                found.append(path)
+        return found
+
+    # --- template dependencies ------------------------------------------
+    def _closure(self, names, hashes):
+        """{template: hash} for ``names`` and everything they pull in; None if unknowable."""
+        env = self.app.jinja_env
+        deps, todo = {}, list(names)
+        while todo:
+            name = todo.pop()
+            if name in deps:
+                continue
+            if name not in hashes:
+                source = env.loader.get_source(env, name)[0]
+                refs = list(meta.find_referenced_templates(env.parse(source)))
+                hashes[name] = (_sha256(source.encode()), refs)
+            digest, refs = hashes[name]
+            if None in refs:
+                return None         # a template name computed at render time
+            deps[name] = digest
+            todo.extend(refs)
+        return deps
+
+    def _current(self, name, hashes):
+        try:
+            return self._closure([name], hashes)[name]
+        except Exception:
+            return None             # deleted or renamed
+
+    def _code(self):
+        """Hash of what every page may depend on besides its own templates."""
+        module = sys.modules.get(self.app.import_name)
+        with open(module.__file__, 'rb') as f:
+            parts = [f.read()]
+        content = self.app.extensions.get('content')
+        if content is not None:
+            # navigation lists every page, so adding, removing or retitling one touches them all
+            parts.append(repr([(page.template, page.meta) for section in content.sections
+                               for page in [section] + section.pages]).encode())
+        # url_for('static') gives core.assets' fingerprinted names, baked into every page
+        parts.append(json.dumps(self.app.extensions.get('assets') or {}, sort_keys=True).encode())
+        parts.append(repr(self._static_files()).encode())
+        parts.append(repr(sorted(self.app.jinja_env.list_templates())).encode())
+        return _sha256(b'\0'.join(parts))
+
+    def _static_files(self):
+        source = self.app.static_folder
+        if not source or not os.path.isdir(source):
+            return []
+        files = []
+        for folder, _, names in os.walk(source):
+            for name in names:
+                st = os.stat(os.path.join(folder, name))
+                files.append((os.path.relpath(os.path.join(folder, name), source), st.st_size, st.st_mtime_ns))
+        return sorted(files)
+
+    # --- the build --------------------------------------------------------
+    def freeze(self, directory, force=False, script_root=''):
+        started = time.perf_counter()
+        old = {}
+        manifest_path = os.path.join(directory, MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                old = json.load(f)
+        code = self._code()
+        previous = old.get('pages', {})
+        reusable = not force and old.get('format') == FORMAT and old.get('code') == code \
+            and old.get('script_root') == script_root
+        old_pages = previous if reusable else {}
+
+        client = self.app.test_client()
+        base_url = f'http://localhost{script_root}/'
+        rendered = []
+
+        def record(sender, template, context, **extra):
+            rendered.append(template.name)
+
+        hashes, pages = {}, {}
+        counts = {'rendered': 0, 'unchanged': 0, 'removed': 0}
+        queue = self.seeds(script_root) + list(old_pages)
+        with template_rendered.connected_to(record, self.app):
+            while queue:
+                path = queue.pop(0)
+                if path in pages or not self.endpoint(path):
+                    continue
+                entry = old_pages.get(path)
+                if entry and entry['templates'] is not None and all(
+                        self._current(name, hashes) == digest for name, digest in entry['templates'].items()):
+                    pages[path] = entry
+                    counts['unchanged'] += 1
+                    queue.extend(entry['links'])
+                    continue
+                del rendered[:]
+                response = client.get(path, base_url=base_url, headers={'Accept-Encoding': 'identity'})
+                target = os.path.join(directory, page_file(path))
+                if response.status_code in (301, 302, 303, 307, 308):
+                    location = response.headers['Location']
+                    body = REDIRECT_PAGE.format(escape(location)).encode()
+                    entry = {'redirect': location, 'templates': {}, 'links': []}
+                    location_path = urlsplit(location).path
+                    if location_path.startswith(script_root + '/'):
+                        entry['links'] = [location_path[len(script_root):] or '/']
+                elif response.status_code == 200 and response.mimetype == 'text/html':
+                    body = response.get_data()
+                    entry = {'templates': self._closure(rendered, hashes),
+                             'links': self.links(body.decode('utf-8', 'replace'), script_root)}
+                else:
+                    continue
+                entry['file'] = page_file(path)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, 'wb') as f:
+                    f.write(body)
+                pages[path] = entry
+                counts['rendered'] += 1
+                queue.extend(entry['links'])
+        for path, entry in previous.items():
+            if path not in pages:
+                target = os.path.join(directory, entry['file'])
+                if os.path.exists(target):
+                    os.remove(target)
+                    try:
+                        os.removedirs(os.path.dirname(target))   # and any folders it leaves empty
+                    except OSError:
+                        pass
+                counts['removed'] += 1
+        counts['static'] = self._copy_static(directory)
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump({'format': FORMAT, 'code': code, 'script_root': script_root, 'pages': pages}, f, indent=1)
+        os.replace(manifest_path + '.tmp', manifest_path)
+        counts['seconds'] = round(time.perf_counter() - started, 2)
+        return counts
+
+    def _copy_static(self, directory):
+        source = self.app.static_folder
+        if not source or not os.path.isdir(source):
+            return 0
+        target_root = os.path.join(directory, self.app.static_url_path.strip('/'))
+        copied, wanted = 0, set()
+        for folder, _, files in os.walk(source):
+            for name in files:
+                src = os.path.join(folder, name)
+                rel = os.path.relpath(src, source)
+                dst = os.path.join(target_root, rel)
+                wanted.add(rel)
+                st = os.stat(src)
+                try:
+                    dt = os.stat(dst)
+                    if dt.st_size == st.st_size and dt.st_mtime_ns == st.st_mtime_ns:
+                        continue
+                except OSError:
+                    pass
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                shutil.copy2(src, dst)
+                copied += 1
+        for folder, _, files in os.walk(target_root):
+            for name in files:
+                dst = os.path.join(folder, name)
+                if os.path.relpath(dst, target_root) not in wanted:
+                    os.remove(dst)
+        return copied
+
+
+class FrozenPages:
+    """WSGI middleware: a frozen page if there is one, else the app."""
+
+    def __init__(self, wsgi_app, directory, max_age=60):
+        self.wsgi_app = wsgi_app
+        self.directory = directory
+        self.max_age = max_age
+        self.pages = {}
+        self.script_root = None
+        self._mtime = None
+
+    def _load(self):
+        # re-read whenever `flask freeze` has replaced the manifest
+        try:
+            mtime = os.stat(os.path.join(self.directory, MANIFEST)).st_mtime_ns
+        except OSError:
+            self.pages, self._mtime = {}, None
+            return
+        if mtime != self._mtime:
+            with open(os.path.join(self.directory, MANIFEST)) as f:
+                manifest = json.load(f)
+            self.pages, self.script_root, self._mtime = manifest['pages'], manifest['script_root'], mtime
+
+    def __call__(self, environ, start_response):
+        if environ['REQUEST_METHOD'] in ('GET', 'HEAD') and not environ.get('QUERY_STRING'):
+            self._load()
+            entry = self.pages.get(environ.get('PATH_INFO') or '/')
+            if entry is not None and environ.get('SCRIPT_NAME', '') == self.script_root:
+                if 'redirect' in entry:
+                    return redirect(entry['redirect'])(environ, start_response)
+                response = send_file(os.path.join(self.directory, entry['file']), environ,
+                                     mimetype='text/html', max_age=self.max_age)
+                return response(environ, start_response)
+        return self.wsgi_app(environ, start_response)
+
+
+def init_freeze(app, exclude=()):
+    """Add ``flask freeze`` and, with FREEZE_SERVE, the middleware."""
+    app.config.setdefault('FREEZE_DIR', os.path.join(app.root_path, 'frozen'))
+    app.config.setdefault('FREEZE_SERVE', os.environ.get('FREEZE_SERVE') == '1')
+    app.config.setdefault('FREEZE_MAX_AGE', 60)
+    freezer = Freezer(app, exclude)
+    app.extensions['freeze'] = freezer
+
+    @app.cli.command('freeze')
+    @click.option('--force', is_flag=True, help='Render every page, changed or not.')
+    @click.option('--script-root', default='', help='Mount point the pages will be served under, e.g. /app4.')
+    def freeze_command(force, script_root):
+        """Pre-render the app's static pages into FREEZE_DIR."""
+        counts = freezer.freeze(app.config['FREEZE_DIR'], force=force, script_root=script_root.rstrip('/'))
+        click.echo(f"Froze {counts['rendered']} pages ({counts['unchanged']} unchanged, "
+                   f"{counts['removed']} removed), copied {counts['static']} static files "
+                   f"into {app.config['FREEZE_DIR']} in {counts['seconds']}s.")
+
+    if app.config['FREEZE_SERVE']:
+        app.wsgi_app = FrozenPages(app.wsgi_app, app.config['FREEZE_DIR'], app.config['FREEZE_MAX_AGE'])
+    return freezer
@@ -0,0 +1,196 @@
+"""SQLite FTS5 full-text index over a table's text columns.
+
+The index is an external-content FTS5 table (``<table>_fts``) that stores
+only the inverted index. Triggers keep it in step with the base table, so
+it stays correct whether rows change through the ORM, bulk SQL or a
+migration. Searches are bm25-ranked and paginated by keyset on
+(score, rowid).
+
+bm25 has to score every match before ORDER BY ... LIMIT can pick a page,
+so a word found in most rows costs as much as ranking the whole table.
+ranked_search() therefore ranks only the newest ``max_candidates``
+matches: a subquery walks the doclist newest first to find the Nth
+match's rowid, and bm25 scores only the rows at or above it.
+
+FTS5 is SQLite's. On any other database (DATABASE_URL) there is no index
+to create: fts_available() is false, deferred_index() does nothing, and
+match_filter() and ranked_search() fall back to a case-insensitive LIKE
+on every word, newest first and without snippets.
+"""
+import re
+from contextlib import contextmanager
+
+from markupsafe import Markup, escape
+from sqlalchemy import and_, column, false, or_, text
+
+from .pagination import KeysetPage, clamp_page_size, decode_cursor, encode_cursor, keyset_paginate
+
+# control characters cannot appear in form input, so they are safe markers
+# for snippet() to wrap hits in before the text is HTML-escaped
+_HIT_START, _HIT_END = '\x02', '\x03'
+
+MAX_CANDIDATES = 1000
+
+
+def fts_available(session):
+    return session.get_bind().dialect.name == 'sqlite'
+
+
+def fts_ddl(table, columns):
+    """Statements that create the FTS table and its sync triggers."""
+    fts = f"{table}_fts"
+    cols = ', '.join(columns)
+    new = ', '.join(f"new.{c}" for c in columns)
+    old = ', '.join(f"old.{c}" for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{table}', content_rowid='id')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END",
+        # only the indexed columns: cache and counter updates skip re-indexing
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+    ]
+
+
+def fts_rebuild_sql(table):
+    """Statement that re-indexes every row of ``table`` from scratch."""
+    return f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')"
+
+
+@contextmanager
+def deferred_index(session, table, columns):
+    """Bulk-load ``table`` without per-row indexing, then re-index it once.
+
+    The insert trigger is dropped for the duration and recreated after,
+    followed by a rebuild. That is one pass over the table instead of an
+    index update per inserted row. If the block raises, its uncommitted
+    work is rolled back before the index is restored.
+    """
+    if not fts_available(session):
+        yield
+        return
+    session.execute(text(f"DROP TRIGGER IF EXISTS {table}_fts_ai"))
+    session.commit()
+    try:
+        yield
+    except BaseException:
+        session.rollback()
+        raise
+    finally:
+        for sql in fts_ddl(table, columns) + [fts_rebuild_sql(table)]:
+            session.execute(text(sql))
+        session.commit()
+
+
+def match_expression(q):
+    """Turn free text into a safe FTS5 query: all words, last one as a prefix.
+
+    Each word is quoted so user input can never be read as FTS5 syntax
+    (NEAR, column filters, unbalanced quotes and so on).
+    """
+    words = re.findall(r'\w+', q)
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def like_filter(model, q, columns):
+    """Every word of ``q`` in at least one of ``columns``, ignoring case."""
+    words = re.findall(r'\w+', q)
+    if not words:
+        return false()
+    return and_(*(
+        or_(*(getattr(model, c).ilike(f"%{w.replace('_', '/_')}%", escape='/') for c in columns))
+        for w in words))
+
+
+def match_filter(session, model, q, columns):
+    """WHERE clause for ``model`` rows matching ``q``: the FTS index, or LIKE off SQLite."""
+    if not fts_available(session):
+        return like_filter(model, q, columns)
+    expr = match_expression(q)
+    if expr is None:
+        return false()
+    fts = f"{model.__tablename__}_fts"
+    hits = text(f"SELECT rowid FROM {fts} WHERE {fts} MATCH :match").bindparams(match=expr)
+    return model.id.in_(hits.columns(column('rowid')))
+
+
+def highlight(snippet):
+    """Escape a snippet and turn the hit markers into <mark> tags."""
+    html = str(escape(snippet))
+    return Markup(html.replace(_HIT_START, '<mark>').replace(_HIT_END, '</mark>'))
+
+
+def ranked_search(session, model, q, cursor=None, per_page=None, weights=None,
+                  snippet_column=1, options=(), columns=('title', 'body'),
+                  max_candidates=MAX_CANDIDATES):
+    """One bm25-ranked page of ``model`` rows matching ``q``.
+
+    Returns a KeysetPage whose items are model instances (loaded with
+    ``options``), each with a ``snippet`` attribute holding highlighted
+    HTML. ``weights`` are per-column bm25 weights, in index column order.
+    ``columns`` are the indexed columns, searched with LIKE off SQLite.
+    Only the newest ``max_candidates`` matches are ranked (and paged
+    through); ``None`` ranks them all.
+    """
+    if not fts_available(session):
+        query = session.query(model).options(*options).filter(like_filter(model, q, columns))
+        return keyset_paginate(query, model, cursor, per_page)
+    per_page = clamp_page_size(per_page)
+    expr = match_expression(q)
+    if expr is None:
+        return KeysetPage([])
+    fts = f"{model.__tablename__}_fts"
+    bm25 = f"bm25({fts}{''.join(f', {w}' for w in weights or ())})"
+    decoded = decode_cursor(cursor, parse=float)
+    where, order, params = '', 'score, id', {'q': expr, 'limit': per_page + 1}
+    newest = ''
+    if max_candidates:
+        # rowid of the Nth newest match, or 0 when there are fewer
+        newest = (f" AND rowid >= coalesce((SELECT rowid FROM {fts} WHERE {fts} MATCH :q "
+                  f"ORDER BY rowid DESC LIMIT 1 OFFSET :skip), 0)")
+        params['skip'] = max_candidates - 1
+    if decoded is not None:
+        direction, score, row_id = decoded
+        params.update(score=score, id=row_id)
+        if direction == 'next':
+            where = 'WHERE (score, id) > (:score, :id)'
+        else:
+            where, order = 'WHERE (score, id) < (:score, :id)', 'score DESC, id DESC'
+    sql = text(
+        f"SELECT id, score, snip FROM ("
+        f"SELECT rowid AS id, {bm25} AS score, "
+        f"snippet({fts}, {snippet_column}, '{_HIT_START}', '{_HIT_END}', '…', 24) AS snip "
+        f"FROM {fts} WHERE {fts} MATCH :q{newest}) {where} ORDER BY {order} LIMIT :limit"
+    )
+    hits = session.execute(sql, params).all()
+    more = len(hits) > per_page
+    hits = hits[:per_page]
+    backwards = decoded is not None and decoded[0] == 'prev'
+    if backwards:
+        hits.reverse()
+    if not hits:
+        return KeysetPage([])
+
+    rows = session.query(model).options(*options).filter(model.id.in_([h.id for h in hits])).all()
+    by_id = {row.id: row for row in rows}
+    items = []
+    for hit in hits:
+        row = by_id.get(hit.id)
+        if row is not None:
+            row.snippet = highlight(hit.snip)
+            items.append(row)
+    has_next = True if backwards else more
+    has_prev = more if backwards else decoded is not None
+    first, last = hits[0], hits[-1]
+    return KeysetPage(
+        items,
+        next_cursor=encode_cursor(last.score, last.id, 'next') if has_next else None,
+        prev_cursor=encode_cursor(first.score, first.id, 'prev') if has_prev else None,
+    )
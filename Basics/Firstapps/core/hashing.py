@@ -0,0 +1,200 @@
+"""Password hashing off the request thread, with a cap on concurrent KDFs.
+
+    passwords = PasswordHasher(app)
+
+    user.password_hash = passwords.hash(raw)
+    if passwords.verify(user.password_hash, raw) and passwords.needs_rehash(user.password_hash):
+        user.password_hash = passwords.hash(raw)
+
+The KDF (werkzeug's scrypt or pbkdf2) is deliberately CPU-bound: a login
+storm is enough to put every core on it, and anonymous page views then
+queue behind ``/login``. Two things prevent that here:
+
+- Admission control. At most ``PASSWORD_HASH_SLOTS`` hashes run at once
+  on the host. Each slot is an flock()ed file in ``PASSWORD_HASH_DIR``,
+  so the limit holds across gunicorn workers. At most
+  ``PASSWORD_HASH_QUEUE`` requests per process wait for a slot, for up to
+  ``PASSWORD_HASH_WAIT`` seconds. Past either limit the caller gets
+  HashingBusy, a 503 with Retry-After. The rest of the cores stay free
+  for reads, and so do the server's threads: a waiting login holds one.
+- A process pool. The hash itself runs in one of ``PASSWORD_HASH_WORKERS``
+  child processes (per app process), so threaded servers keep serving
+  other requests from the parent. With 0 workers it runs inline.
+
+``PASSWORD_HASH_METHOD`` is a werkzeug method string with explicit costs,
+e.g. ``scrypt:32768:8:1`` or ``pbkdf2:sha256:600000``. Stored hashes made
+with other parameters still verify. needs_rehash() reports them, so that
+login can upgrade them while it has the plaintext.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+try:
+    import fcntl
+except ImportError:         # Windows: slots only bound this process
+    fcntl = None
+
+POLL = 0.01
+
+
+class HashingBusy(ServiceUnavailable):
+    description = "Too many sign-ins at once. Please try again in a moment."
+
+
+def normalize_method(method):
+    """werkzeug's shorthand ('scrypt', 'pbkdf2') spelled out with its costs."""
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        n, r, p = (args + ['32768', '8', '1'][len(args):])[:3]
+        return f'scrypt:{n}:{r}:{p}'
+    if name == 'pbkdf2':
+        digest, iterations = (args + ['sha256', str(DEFAULT_PBKDF2_ITERATIONS)][len(args):])[:2]
+        return f'pbkdf2:{digest}:{iterations}'
+    return method
+
+
+class _Slots:
+    """Up to ``count`` holders across every process using ``directory``."""
+
+    def __init__(self, directory, count):
+        self.paths = [os.path.join(directory, f'hash-slot-{i}') for i in range(count)]
+        self._local = None
+        self._files = None
+        self._pid = None
+        self._open_lock = threading.Lock()
+
+    def _open(self):
+        # flock() belongs to the open file, which a forked child would share
+        with self._open_lock:
+            if self._pid != os.getpid():
+                self._files = [open(path, 'a') for path in self.paths]
+                self._local = [threading.Lock() for _ in self.paths]
+                self._pid = os.getpid()
+            return self._files
+
+    def try_acquire(self):
+        files = self._open()
+        for i, lock in enumerate(self._local):
+            if not lock.acquire(blocking=False):
+                continue
+            if fcntl is None:
+                return i
+            try:
+                fcntl.flock(files[i], fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return i
+            except OSError:
+                lock.release()
+        return None
+
+    def release(self, i):
+        if fcntl is not None:
+            fcntl.flock(self._files[i], fcntl.LOCK_UN)
+        self._local[i].release()
+
+
+class PasswordHasher:
+    def __init__(self, app=None):
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.hashed = self.verified = self.rejected = self.in_flight = self.waiting = 0
+        self.wait_seconds = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+        app.config.setdefault('PASSWORD_HASH_SALT_LENGTH', 16)
+        app.config.setdefault('PASSWORD_HASH_SLOTS', max(1, (os.cpu_count() or 2) // 2))
+        app.config.setdefault('PASSWORD_HASH_QUEUE', 1)
+        app.config.setdefault('PASSWORD_HASH_WAIT', 1.0)
+        app.config.setdefault('PASSWORD_HASH_WORKERS', 1)
+        app.config.setdefault('PASSWORD_HASH_DIR', app.instance_path)
+        self.method = normalize_method(app.config['PASSWORD_HASH_METHOD'])
+        self.salt_length = app.config['PASSWORD_HASH_SALT_LENGTH']
+        self.queue = app.config['PASSWORD_HASH_QUEUE']
+        self.wait = app.config['PASSWORD_HASH_WAIT']
+        self.workers = app.config['PASSWORD_HASH_WORKERS']
+        os.makedirs(app.config['PASSWORD_HASH_DIR'], exist_ok=True)
+        self.slots = _Slots(app.config['PASSWORD_HASH_DIR'], app.config['PASSWORD_HASH_SLOTS'])
+        app.extensions['passwords'] = self
+
+    def _executor(self):
+        # created on first use in each process, i.e. after gunicorn has forked
+        with self._pool_lock:
+            if self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _busy(self):
+        with self._stats_lock:
+            self.rejected += 1
+        return HashingBusy(retry_after=max(1, round(self.wait)))
+
+    def _acquire(self):
+        slot = self.slots.try_acquire()
+        if slot is not None:
+            return slot
+        with self._stats_lock:
+            full = self.waiting >= self.queue
+            if not full:
+                self.waiting += 1
+        if full:
+            raise self._busy()
+        started = time.monotonic()
+        try:
+            while (slot := self.slots.try_acquire()) is None:
+                if time.monotonic() - started >= self.wait:
+                    raise self._busy()
+                time.sleep(POLL)
+        finally:
+            with self._stats_lock:
+                self.waiting -= 1
+                self.wait_seconds += time.monotonic() - started
+        return slot
+
+    def _run(self, fn, *args, **kwargs):
+        slot = self._acquire()
+        with self._stats_lock:
+            self.in_flight += 1
+        try:
+            if self.workers:
+                return self._executor().submit(fn, *args, **kwargs).result()
+            return fn(*args, **kwargs)
+        finally:
+            self.slots.release(slot)
+            with self._stats_lock:
+                self.in_flight -= 1
+
+    def hash(self, password):
+        result = self._run(generate_password_hash, password, method=self.method, salt_length=self.salt_length)
+        with self._stats_lock:
+            self.hashed += 1
+        return result
+
+    def verify(self, stored, password):
+        result = self._run(check_password_hash, stored, password)
+        with self._stats_lock:
+            self.verified += 1
+        return result
+
+    def needs_rehash(self, stored):
+        """True when ``stored`` was made with another method or other costs."""
+        return normalize_method(stored.split('$', 1)[0]) != self.method
+
+    def stats(self):
+        return {
+            'hashed': self.hashed,
+            'verified': self.verified,
+            'rejected': self.rejected,
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'wait_seconds': round(self.wait_seconds, 3),
+        }
@@ -0,0 +1,123 @@
+"""Several Firstapps in one WSGI process, each under its own path prefix.
+
+    host = Host(ROOT, {'/app1': 'app1/app.py', '/blog002': 'blog002/app.py'})
+    host.preload()          # optional: build every app now, before fork
+
+``host`` is a WSGI application (gunicorn ``host:app``). Each mount names
+an app module by its path under ``ROOT``, whose ``create_app(config)`` is
+called with that mount's config (``configs={prefix: {...}}``, e.g. its own
+``DATABASE_URL``), so settings the extensions read at init take effect.
+Each module is imported under a name derived from its path
+(``app1_app``, ``unrendered_app2``), so the many ``app.py`` files do not
+collide in sys.modules. Flask still finds each app's templates, static
+and instance folders next to its file.
+
+An app is built on the first request under its prefix. A lock makes sure
+concurrent first hits build it only once. preload() builds them all at
+once instead. Under ``gunicorn --preload`` this happens in the master
+before it forks, so the workers share the imported code and data
+copy-on-write rather than each building its own. Apps with
+core.templating also compile all their templates there. Afterwards preload()
+closes the database connections the apps opened, because a connection
+must not cross fork(). It also freezes the garbage collector, so that
+collections in the workers do not write to the shared pages.
+
+DispatcherMiddleware sets SCRIPT_NAME, so url_for() includes the prefix.
+Each app's session cookie is scoped to its prefix, so apps that all call
+their cookie 'session' no longer overwrite each other's.
+"""
+import gc
+import importlib.util
+import os
+import sys
+import threading
+import time
+
+from werkzeug.exceptions import NotFound
+from werkzeug.middleware.dispatcher import DispatcherMiddleware
+
+
+def module_name(path):
+    """'app1/app.py' -> 'app1_app', 'unrendered/app2.py' -> 'unrendered_app2'."""
+    return os.path.splitext(path)[0].replace(os.sep, '_').replace('/', '_')
+
+
+def load_app(root, path, config=None):
+    """Import the app module at ``root/path`` and return its Flask app."""
+    name = module_name(path)
+    module = sys.modules.get(name)
+    if module is None:
+        spec = importlib.util.spec_from_file_location(name, os.path.join(root, path))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[name]
+            raise
+    return module.create_app(config)
+
+
+class LazyApp:
+    """WSGI app that builds the real one on its first request."""
+
+    def __init__(self, root, path, config=None):
+        self.root = root
+        self.path = path
+        self.config = config
+        self.app = None
+        self.load_seconds = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self.app is None:
+            with self._lock:
+                if self.app is None:
+                    started = time.perf_counter()
+                    self.app = load_app(self.root, self.path, self.config)
+                    self.load_seconds = time.perf_counter() - started
+        return self.app
+
+    def __call__(self, environ, start_response):
+        return self.load()(environ, start_response)
+
+
+def _close_connections(app):
+    ext = app.extensions.get('sqlalchemy')
+    if ext is not None:
+        with app.app_context():
+            for engine in ext.engines.values():
+                engine.dispose()
+    jobs = app.extensions.get('jobs')
+    if jobs is not None:
+        jobs.close()
+
+
+class Host:
+    def __init__(self, root, mounts, configs=None):
+        self.root = root
+        configs = configs or {}
+        self.apps = {
+            prefix: LazyApp(root, path, {'SESSION_COOKIE_PATH': prefix or '/', **configs.get(prefix, {})})
+            for prefix, path in mounts.items()
+        }
+        front = self.apps.get('')
+        mounted = {prefix: app for prefix, app in self.apps.items() if prefix}
+        self.wsgi_app = DispatcherMiddleware(front or NotFound(), mounted)
+
+    def preload(self):
+        """Build every app now; returns {prefix: seconds}."""
+        for lazy in self.apps.values():
+            app = lazy.load()
+            templates = app.extensions.get('templates')
+            if templates is not None:
+                templates.warm()    # compiled once here, shared by every forked worker
+            _close_connections(app)
+        gc.freeze()
+        return self.load_times()
+
+    def load_times(self):
+        return {prefix: lazy.load_seconds for prefix, lazy in self.apps.items()}
+
+    def __call__(self, environ, start_response):
+        return self.wsgi_app(environ, start_response)
@@ -0,0 +1,255 @@
+"""Background jobs on a local SQLite queue.
+
+    jobs = JobQueue(app)              # instance/jobs.sqlite3
+
+    @jobs.task('render_post')
+    def render_post(post_id): ...
+
+    # in a view, after the commit the job depends on
+    jobs.enqueue('render_post', {'post_id': post.id}, key=f'render:{post.id}:{digest}')
+
+    $ flask worker --concurrency 4
+
+The queue lives in its own SQLite file, next to (not inside) the app
+database, so it works the same whether the app runs on SQLite or a server
+database.
+
+Jobs are claimed under BEGIN IMMEDIATE, so any number of worker threads
+and processes can share the file. A failing job is retried with
+exponential backoff up to ``max_attempts``, then left as 'failed' with its
+last error. A job that is 'running' for longer than ``JOBS_STALE_AFTER``
+(its worker died) is put back on the queue.
+
+``key`` is an idempotency key. While a job with the same key is queued or
+running, enqueueing it again is a no-op. The key is released once the job
+finishes, so the same work can be queued again later. Handlers should
+still be safe to re-run, since a worker can die after the work but before
+recording it.
+
+With ``JOBS_EAGER`` set, jobs run inline at enqueue time. This is for
+tests and for single-process setups without a worker.
+"""
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+
+import click
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS job (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    idempotency_key TEXT UNIQUE,
+    status TEXT NOT NULL DEFAULT 'queued',      -- queued | running | done | failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    locked_by TEXT,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_job_ready ON job (status, run_at, id);
+"""
+MAX_BACKOFF = 600
+
+
+class JobQueue:
+    def __init__(self, app=None):
+        self.tasks = {}
+        self._local = threading.local()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('JOBS_DATABASE', os.path.join(app.instance_path, 'jobs.sqlite3'))
+        app.config.setdefault('JOBS_EAGER', False)
+        app.config.setdefault('JOBS_MAX_ATTEMPTS', 5)
+        app.config.setdefault('JOBS_STALE_AFTER', 600)
+        app.config.setdefault('JOBS_KEEP_DONE', 7 * 24 * 3600)
+        self.app = app
+        self.path = app.config['JOBS_DATABASE']
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.close()
+        app.extensions['jobs'] = self
+        self._register_cli(app)
+
+    # --- storage ---------------------------------------------------
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @property
+    def conn(self):
+        # one connection per thread; sqlite3 connections are not shareable
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def close(self):
+        """Close this thread's connection, e.g. before the process forks."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def task(self, name):
+        def register(func):
+            self.tasks[name] = func
+            return func
+        return register
+
+    def enqueue(self, name, payload=None, key=None, delay=0, max_attempts=None):
+        """Queue ``name(**payload)``; returns the job id, or None for a duplicate key."""
+        if name not in self.tasks:
+            raise KeyError(f"unknown job {name!r}")
+        payload = payload or {}
+        if self.app.config['JOBS_EAGER']:
+            self.tasks[name](**payload)
+            return None
+        now = time.time()
+        cur = self.conn.execute(
+            "INSERT INTO job (name, payload, idempotency_key, max_attempts, run_at, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (idempotency_key) DO NOTHING",
+            (name, json.dumps(payload), key, max_attempts or self.app.config['JOBS_MAX_ATTEMPTS'],
+             now + delay, now),
+        )
+        return cur.lastrowid if cur.rowcount else None
+
+    def claim(self, worker_id):
+        """Mark the next ready job as running and return it, or None."""
+        conn = self.conn
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM job WHERE status = 'queued' AND run_at <= ? ORDER BY run_at, id LIMIT 1",
+                (now,)).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE job SET status = 'running', attempts = attempts + 1, started_at = ?, "
+                    "locked_by = ? WHERE id = ?", (now, worker_id, row['id']))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def complete(self, job_id):
+        self.conn.execute(
+            "UPDATE job SET status = 'done', finished_at = ?, last_error = NULL, "
+            "idempotency_key = NULL WHERE id = ?", (time.time(), job_id))
+
+    def fail(self, job, error):
+        attempts = job['attempts'] + 1
+        if attempts >= job['max_attempts']:
+            self.conn.execute(
+                "UPDATE job SET status = 'failed', finished_at = ?, last_error = ?, "
+                "idempotency_key = NULL WHERE id = ?", (time.time(), error, job['id']))
+        else:
+            backoff = min(2 ** attempts, MAX_BACKOFF)
+            self.conn.execute(
+                "UPDATE job SET status = 'queued', run_at = ?, last_error = ?, locked_by = NULL WHERE id = ?",
+                (time.time() + backoff, error, job['id']))
+
+    def requeue_stale(self):
+        cutoff = time.time() - self.app.config['JOBS_STALE_AFTER']
+        return self.conn.execute(
+            "UPDATE job SET status = 'queued', locked_by = NULL WHERE status = 'running' AND started_at < ?",
+            (cutoff,)).rowcount
+
+    def purge_done(self):
+        cutoff = time.time() - self.app.config['JOBS_KEEP_DONE']
+        return self.conn.execute("DELETE FROM job WHERE status = 'done' AND finished_at < ?", (cutoff,)).rowcount
+
+    def stats(self):
+        """Queue depth and lag: how long the oldest ready job has been waiting."""
+        now = time.time()
+        counts = dict(self.conn.execute("SELECT status, count(*) FROM job GROUP BY status").fetchall())
+        oldest = self.conn.execute(
+            "SELECT min(run_at) FROM job WHERE status = 'queued' AND run_at <= ?", (now,)).fetchone()[0]
+        return {
+            'queued': counts.get('queued', 0),
+            'running': counts.get('running', 0),
+            'failed': counts.get('failed', 0),
+            'done': counts.get('done', 0),
+            'ready': self.conn.execute(
+                "SELECT count(*) FROM job WHERE status = 'queued' AND run_at <= ?", (now,)).fetchone()[0],
+            'lag_seconds': round(now - oldest, 3) if oldest is not None else 0.0,
+        }
+
+    # --- running ---------------------------------------------------
+    def run_one(self, worker_id):
+        """Claim and run a single job; False when nothing was ready."""
+        job = self.claim(worker_id)
+        if job is None:
+            return False
+        func = self.tasks.get(job['name'])
+        try:
+            if func is None:
+                raise KeyError(f"no handler for job {job['name']!r}")
+            with self.app.app_context():
+                func(**json.loads(job['payload']))
+        except Exception:
+            log.exception("job %s (%s) failed", job['id'], job['name'])
+            self.fail(job, traceback.format_exc(limit=5))
+        else:
+            self.complete(job['id'])
+        return True
+
+    def work(self, concurrency=2, poll_interval=1.0, burst=False):
+        """Run ``concurrency`` worker threads until interrupted (or, with burst, until idle)."""
+        self.requeue_stale()
+        self.purge_done()
+        stop = threading.Event()
+        host = f"{socket.gethostname()}:{os.getpid()}"
+
+        def loop(n):
+            worker_id = f"{host}:{n}"
+            while not stop.is_set():
+                if not self.run_one(worker_id):
+                    if burst:
+                        return
+                    stop.wait(poll_interval)
+
+        threads = [threading.Thread(target=loop, args=(n,), daemon=True) for n in range(concurrency)]
+        for t in threads:
+            t.start()
+        try:
+            for t in threads:
+                while t.is_alive():
+                    t.join(0.5)
+        except KeyboardInterrupt:
+            stop.set()
+            for t in threads:
+                t.join()
+
+    def _register_cli(self, app):
+        @app.cli.command('worker')
+        @click.option('--concurrency', default=2, show_default=True, help='Worker threads.')
+        @click.option('--poll-interval', default=1.0, show_default=True, help='Seconds between polls when idle.')
+        @click.option('--burst', is_flag=True, help='Exit once the queue is empty.')
+        def worker(concurrency, poll_interval, burst):
+            """Run background jobs from the queue."""
+            click.echo(f"Worker: {concurrency} threads on {self.path}; tasks: {', '.join(sorted(self.tasks))}")
+            self.work(concurrency, poll_interval, burst)
+
+        @app.cli.command('queue-stats')
+        def queue_stats():
+            """Print job queue depth and lag."""
+            click.echo(json.dumps(self.stats(), indent=2))
@@ -0,0 +1,353 @@
+"""Request timings, SQL counts and a Prometheus ``/_metrics`` endpoint.
+
+    metrics = Metrics(app)
+
+    with timing('markdown'):          # any phase worth its own line
+        html = markdown2.markdown(body)
+
+Every request records, per endpoint:
+
+- a latency histogram (``http_request_duration_seconds``) and a request
+  counter by status;
+- SQL statement count and time, from SQLAlchemy engine events (apps
+  without SQLAlchemy installed, such as app4, just have none);
+- Jinja render time per template, from Flask's template signals;
+- time spent in named ``timing()`` blocks, such as markdown rendering.
+
+The same per-request numbers are sent back in a ``Server-Timing`` header,
+so the browser's network panel shows where a slow page spent its time.
+``/_metrics`` serves everything in the Prometheus text format, together
+with the ``stats()`` of any extension that has one (page cache,
+compression, job queue).
+
+``/_metrics`` answers 404 unless the scraper sends ``Authorization:
+Bearer <METRICS_TOKEN>`` or connects from an address in ``METRICS_ALLOW``
+(both also read from the environment, the latter comma-separated).
+Neither is set by default, so the endpoint is off. The address is
+``request.remote_addr``, the socket peer. Behind a proxy on the same host
+that is the proxy, 127.0.0.1, for every client, so use the token there.
+X-Forwarded-For is never read here. Only wrap the app in werkzeug's
+ProxyFix, which makes remote_addr follow it, when a trusted proxy sets it.
+
+Opt-in slow-request log: with ``METRICS_SLOW_MS`` set, requests over that
+many milliseconds are logged with their timings. A sampled fraction
+(``METRICS_PROFILE_RATE``) of requests is also stack-sampled every
+``METRICS_PROFILE_INTERVAL`` seconds while it runs, and when such a
+request turns out slow its hottest stacks are logged too. The sampling is
+done by one daemon thread per process, shared by every app in it, which
+only runs while a profiled request is in flight.
+
+Timings stop when the response is handed to the server, so a streamed
+body's generation time is not included.
+"""
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from flask import (Response, abort, before_render_template, current_app, g, has_request_context,
+                   request, request_finished, template_rendered)
+try:
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+except ImportError:         # no database, no SQL timings
+    event = Engine = None
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROFILE_TOP = 5
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += 1
+        self.sum += value
+
+    def lines(self, name, **labels):
+        running = 0
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            yield f"{name}_bucket{_labels(**labels, le=bound)} {running}"
+        yield f"{name}_bucket{_labels(**labels, le='+Inf')} {self.total}"
+        yield f"{name}_sum{_labels(**labels)} {self.sum:.6f}"
+        yield f"{name}_count{_labels(**labels)} {self.total}"
+
+
+# --- per-request accounting ----------------------------------------
+def _phases():
+    # phase -> [seconds, count] for the current request, or None outside one
+    if not has_request_context():
+        return None
+    phases = g.get('_metrics_phases')
+    if phases is None:
+        phases = g._metrics_phases = defaultdict(lambda: [0.0, 0])
+    return phases
+
+
+def _add(phase, seconds):
+    phases = _phases()
+    if phases is not None:
+        phases[phase][0] += seconds
+        phases[phase][1] += 1
+
+
+@contextmanager
+def timing(phase):
+    """Charge the enclosed block to ``phase`` in the current request's timings."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _add(phase, time.perf_counter() - started)
+
+
+def _before_cursor(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_metrics_started', []).append(time.perf_counter())
+
+
+def _after_cursor(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('_metrics_started')
+    if started:
+        _add('sql', time.perf_counter() - started.pop())
+
+
+def _cursor_failed(context):
+    # after_cursor_execute never runs for a failed statement
+    started = context.connection.info.get('_metrics_started') if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def _template_started(sender, template, context, **extra):
+    if has_request_context():
+        g.setdefault('_metrics_templates', []).append(time.perf_counter())
+
+
+def _template_done(sender, template, context, **extra):
+    stack = g.get('_metrics_templates') if has_request_context() else None
+    if stack:
+        seconds = time.perf_counter() - stack.pop()
+        _add('template', seconds)
+        metrics = sender.extensions.get('metrics')
+        if metrics is not None:
+            metrics._record_template(template.name or '<string>', seconds)
+
+
+# --- stack sampling --------------------------------------------------
+class _Sampler:
+    """One daemon thread per process sampling the stacks of the threads being profiled.
+
+    Shared by every app in the process. The thread runs only while some
+    request is being profiled: it is started by the first one and exits
+    once none is left, or when close() sets its stop event.
+    """
+
+    def __init__(self):
+        self.interval = 0.005
+        self.stacks = {}              # thread id -> Counter of collapsed stacks
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = None
+
+    def start(self, thread_id, interval):
+        with self._lock:
+            self.stacks[thread_id] = Counter()
+            self.interval = interval
+            # a forked child inherits the Thread object but not the thread
+            if self._thread is None or not self._thread.is_alive():
+                self._stop = threading.Event()
+                self._thread = threading.Thread(target=self._run, args=(self._stop,),
+                                                name='metrics-sampler', daemon=True)
+                self._thread.start()
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self.stacks.pop(thread_id, Counter())
+
+    def close(self):
+        with self._lock:
+            if self._stop is not None:
+                self._stop.set()
+            thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _run(self, stop):
+        while not stop.wait(self.interval):
+            with self._lock:
+                if not self.stacks:
+                    if self._stop is stop:
+                        self._thread = None
+                    return
+                frames = sys._current_frames()
+                for thread_id, counter in self.stacks.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        counter[_collapse(frame)] += 1
+
+
+_sampler = _Sampler()
+
+
+def _collapse(frame):
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ';'.join(reversed(parts))
+
+
+# --- the extension ---------------------------------------------------
+class Metrics:
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self.latency = defaultdict(Histogram)         # (endpoint, method) -> Histogram
+        self.requests = Counter()                     # (endpoint, method, status) -> n
+        self.phase_seconds = Counter()                # (endpoint, phase) -> seconds
+        self.phase_count = Counter()                  # (endpoint, phase) -> n
+        self.templates = defaultdict(Histogram)       # template name -> Histogram
+        self.sampler = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.config.setdefault('METRICS_ENDPOINT', '/_metrics')
+        # a scraper needs the bearer token or one of these remote addresses; with neither set, nobody
+        app.config.setdefault('METRICS_TOKEN', os.environ.get('METRICS_TOKEN') or None)
+        app.config.setdefault('METRICS_ALLOW', tuple(a for a in os.environ.get('METRICS_ALLOW', '').split(',') if a))
+        app.config.setdefault('METRICS_SERVER_TIMING', True)
+        app.config.setdefault('METRICS_SLOW_MS', None)
+        app.config.setdefault('METRICS_PROFILE_RATE', 0.05)
+        app.config.setdefault('METRICS_PROFILE_INTERVAL', 0.005)
+        if not app.config['METRICS_ENABLED']:
+            return
+        self.app = app
+        app.extensions['metrics'] = self
+        if app.config['METRICS_SLOW_MS'] and app.config['METRICS_PROFILE_RATE']:
+            self.sampler = _sampler
+
+        if event is not None and not event.contains(Engine, 'before_cursor_execute', _before_cursor):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor)
+            event.listen(Engine, 'handle_error', _cursor_failed)
+        before_render_template.connect(_template_started, app)
+        template_rendered.connect(_template_done, app)
+        # request_finished fires after every after_request hook, error pages included
+        request_finished.connect(self._finish, app)
+        app.before_request_funcs.setdefault(None, []).insert(0, self._start)
+        app.teardown_request(self._stop_sampling)    # a request that died before _finish
+        app.add_url_rule(app.config['METRICS_ENDPOINT'], 'metrics', self.export)
+
+    def _start(self):
+        g._metrics_started = time.perf_counter()
+        if self.sampler and random.random() < self.app.config['METRICS_PROFILE_RATE']:
+            g._metrics_profiled = threading.get_ident()
+            self.sampler.start(g._metrics_profiled, self.app.config['METRICS_PROFILE_INTERVAL'])
+
+    def _finish(self, sender, response, **extra):
+        started = g.get('_metrics_started')
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or 'unmatched'
+        phases = dict(g.get('_metrics_phases') or {})
+        with self._lock:
+            self.latency[endpoint, request.method].observe(elapsed)
+            self.requests[endpoint, request.method, response.status_code] += 1
+            for phase, (seconds, count) in phases.items():
+                self.phase_seconds[endpoint, phase] += seconds
+                self.phase_count[endpoint, phase] += count
+        if self.app.config['METRICS_SERVER_TIMING']:
+            timings = [f'{phase};dur={seconds * 1000:.2f};desc="{count}x"'
+                       for phase, (seconds, count) in sorted(phases.items())]
+            timings.append(f'total;dur={elapsed * 1000:.2f}')
+            response.headers['Server-Timing'] = ', '.join(timings)
+        stacks = self._stop_sampling()
+        slow_ms = self.app.config['METRICS_SLOW_MS']
+        if slow_ms and elapsed * 1000 >= slow_ms:
+            self._log_slow(endpoint, elapsed, phases, stacks)
+
+    def _stop_sampling(self, exc=None):
+        thread_id = g.pop('_metrics_profiled', None)
+        return self.sampler.stop(thread_id) if thread_id is not None else None
+
+    def _log_slow(self, endpoint, elapsed, phases, stacks):
+        summary = ' '.join(f'{phase}={seconds * 1000:.1f}ms/{count}'
+                           for phase, (seconds, count) in sorted(phases.items()))
+        lines = [f"slow request {request.method} {request.full_path} ({endpoint}) "
+                 f"{elapsed * 1000:.1f}ms {summary}"]
+        if stacks:
+            samples = sum(stacks.values())
+            for stack, n in stacks.most_common(PROFILE_TOP):
+                lines.append(f"  {n}/{samples} samples: {stack}")
+        self.app.logger.warning('\n'.join(lines))
+
+    def _record_template(self, name, seconds):
+        with self._lock:
+            self.templates[name].observe(seconds)
+
+    # --- export --------------------------------------------------------
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        out = []
+        with self._lock:
+            out.append('# TYPE http_request_duration_seconds histogram')
+            for (endpoint, method), hist in sorted(self.latency.items()):
+                out.extend(hist.lines('http_request_duration_seconds', endpoint=endpoint, method=method))
+            out.append('# TYPE http_requests_total counter')
+            for (endpoint, method, status), n in sorted(self.requests.items()):
+                out.append(f"http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {n}")
+            out.append('# TYPE app_phase_seconds_total counter')
+            for (endpoint, phase), seconds in sorted(self.phase_seconds.items()):
+                out.append(f"app_phase_seconds_total{_labels(endpoint=endpoint, phase=phase)} {seconds:.6f}")
+            out.append('# TYPE app_phase_calls_total counter')
+            for (endpoint, phase), n in sorted(self.phase_count.items()):
+                out.append(f"app_phase_calls_total{_labels(endpoint=endpoint, phase=phase)} {n}")
+            out.append('# TYPE template_render_seconds histogram')
+            for name, hist in sorted(self.templates.items()):
+                out.extend(hist.lines('template_render_seconds', template=name))
+        for name, ext in sorted(self.app.extensions.items()):
+            stats = getattr(ext, 'stats', None)
+            if name == 'metrics' or not callable(stats):
+                continue
+            for key, value in sorted(stats().items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    out.append(f"# TYPE {name}_{key} gauge")
+                    out.append(f"{name}_{key} {value}")
+        return '\n'.join(out) + '\n'
+
+    def _authorized(self):
+        token = current_app.config['METRICS_TOKEN']
+        if token and hmac.compare_digest(request.headers.get('Authorization', '').encode(),
+                                         f'Bearer {token}'.encode()):
+            return True
+        # the socket peer, unless ProxyFix has been set up to take it from X-Forwarded-For
+        return request.remote_addr in (current_app.config['METRICS_ALLOW'] or ())
+
+    def export(self):
+        if not self._authorized():
+            abort(404)
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
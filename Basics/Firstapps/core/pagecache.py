@@ -0,0 +1,193 @@
+"""Whole-page cache for anonymous GET traffic.
+
+    page_cache = PageCache(app)
+
+    @app.route('/')
+    @page_cache.cached
+    def index(): ...
+
+    # after any write that changes what those pages show
+    page_cache.invalidate()
+
+Only requests from visitors with no login and no pending flash messages are
+served from or stored in the cache. A Flask-Login remember cookie counts
+as a login: its first request has no user in the session yet, and must
+reach the view that restores it. Responses that set cookies or touch the
+session are never stored, so per-user state cannot leak between visitors.
+
+Keys are the path plus sorted query args, prefixed with a generation
+number kept in a small file under ``PAGE_CACHE_DIR``. ``invalidate()``
+bumps the generation. Every worker on the host reads the same file, so one
+write invalidates all their caches, whatever the backend.
+
+Backends (``PAGE_CACHE_BACKEND``):
+``'lru'``   per-process OrderedDict LRU, ``PAGE_CACHE_SIZE`` entries
+``'file'``  pickled responses in ``PAGE_CACHE_DIR``, shared by all workers
+Anything with ``get(key)``/``set(key, value, ttl)``/``prune(generation)``
+can be passed as ``backend=`` (a memcached client wrapper, say).
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import make_response, request, session
+
+
+class LRUBackend:
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.time() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def prune(self, generation):
+        prefix = f"{generation}:"
+        with self._lock:
+            for key in [k for k in self._data if not k.startswith(prefix)]:
+                del self._data[key]
+
+
+class FileBackend:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        generation, _, rest = key.partition(':')
+        return os.path.join(self.directory, f"{generation}-{hashlib.sha1(rest.encode()).hexdigest()}.page")
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return value if expires >= time.time() else None
+
+    def set(self, key, value, ttl):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((time.time() + ttl, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path(key))
+
+    def prune(self, generation):
+        keep = f"{generation}-"
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.page') and not entry.name.startswith(keep):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
+class PageCache:
+    def __init__(self, app=None, backend=None):
+        self.backend = backend
+        self.hits = self.misses = self.stores = self.invalidations = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PAGE_CACHE_ENABLED', True)
+        app.config.setdefault('PAGE_CACHE_BACKEND', 'lru')
+        app.config.setdefault('PAGE_CACHE_DIR', os.path.join(app.instance_path, 'page_cache'))
+        app.config.setdefault('PAGE_CACHE_TTL', 60)
+        app.config.setdefault('PAGE_CACHE_SIZE', 512)
+        self.app = app
+        self.directory = app.config['PAGE_CACHE_DIR']
+        os.makedirs(self.directory, exist_ok=True)
+        self.generation_file = os.path.join(self.directory, 'generation')
+        if self.backend is None:
+            if app.config['PAGE_CACHE_BACKEND'] == 'file':
+                self.backend = FileBackend(self.directory)
+            else:
+                self.backend = LRUBackend(app.config['PAGE_CACHE_SIZE'])
+        app.extensions['page_cache'] = self
+
+    def generation(self):
+        try:
+            with open(self.generation_file) as f:
+                return int(f.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def invalidate(self):
+        """Drop every cached page, in all workers sharing PAGE_CACHE_DIR."""
+        generation = self.generation() + 1
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(generation))
+        os.replace(tmp, self.generation_file)
+        self.invalidations += 1
+        self.backend.prune(generation)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'invalidations': self.invalidations,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _cacheable_request(self):
+        if not self.app.config['PAGE_CACHE_ENABLED'] or request.method not in ('GET', 'HEAD'):
+            return False
+        if self.app.config.get('REMEMBER_COOKIE_NAME', 'remember_token') in request.cookies:
+            return False
+        # anonymous visitors with nothing flashed for them: both live in the session
+        return '_user_id' not in session and '_flashes' not in session
+
+    def _key(self):
+        args = urlencode(sorted(request.args.items(multi=True)))
+        return f"{self.generation()}:{request.path}?{args}"
+
+    def cached(self, view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not self._cacheable_request():
+                return view(*args, **kwargs)
+            key = self._key()
+            hit = self.backend.get(key)
+            if hit is not None:
+                self.hits += 1
+                status, headers, body = hit
+                response = self.app.response_class(body, status=status, headers=headers)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+            self.misses += 1
+            response = make_response(view(*args, **kwargs))
+            if (response.status_code == 200 and not response.is_streamed
+                    and not session.modified and 'Set-Cookie' not in response.headers):
+                headers = [(k, v) for k, v in response.headers if k.lower() != 'set-cookie']
+                self.backend.set(key, (response.status_code, headers, response.get_data()),
+                                 self.app.config['PAGE_CACHE_TTL'])
+                self.stores += 1
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
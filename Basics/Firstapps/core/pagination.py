@@ -0,0 +1,162 @@
+"""Keyset (cursor) pagination on (created_at, id), newest first.
+
+OFFSET pagination makes the database walk every skipped row, so deep pages
+get slower and slower. A keyset page instead seeks straight to the last row
+seen through a composite index ending in (created_at, id), so every page
+costs the same.
+"""
+import base64
+from datetime import datetime
+
+from flask import request, url_for
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+STREAM_MAX_PAGE_SIZE = 500     # keyset_stream() never holds more than a batch
+STREAM_BATCH_SIZE = 50
+
+
+def encode_cursor(key, row_id, direction):
+    """Opaque token for a (key, id) position; key is a datetime or a number."""
+    key = key.isoformat() if isinstance(key, datetime) else repr(key)
+    raw = f"{direction}|{key}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, parse=datetime.fromisoformat):
+    """Return (direction, key, id), or None for a missing/garbled cursor."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        direction, key, row_id = raw.split('|')
+        if direction not in ('next', 'prev'):
+            return None
+        return direction, parse(key), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class KeysetStream(KeysetPage):
+    """A forward keyset page whose rows are fetched in batches as it is iterated.
+
+    It can be iterated once. next_cursor is known only after the last row,
+    so a template must read has_next / next_cursor below its loop.
+    """
+
+    def __init__(self, query, per_page, after, batch):
+        super().__init__(None)
+        self._query = query
+        self._per_page = per_page
+        self._after = after
+        self._batch = batch
+
+    def __iter__(self):
+        count, last = 0, None
+        for row in self._query.limit(self._per_page + 1).yield_per(self._batch):
+            if count == self._per_page:
+                # the extra row only says that another page exists
+                self.next_cursor = encode_cursor(last.created_at, last.id, 'next')
+                continue
+            if count == 0 and self._after:
+                self.prev_cursor = encode_cursor(row.created_at, row.id, 'prev')
+            count += 1
+            last = row
+            yield row
+
+    def __len__(self):
+        raise TypeError("a streamed page has no length until it has been iterated")
+
+
+def clamp_page_size(per_page, maximum=MAX_PAGE_SIZE):
+    if not per_page:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(per_page, maximum))
+
+
+def _seek(query, model, decoded):
+    """Order ``query`` for the cursor's direction and seek past it."""
+    created_col, id_col = model.created_at, model.id
+    key = tuple_(created_col, id_col)
+    if decoded is None:
+        return query.order_by(created_col.desc(), id_col.desc())
+    direction, created_at, row_id = decoded
+    if direction == 'next':
+        query = query.filter(key < tuple_(created_at, row_id))
+        return query.order_by(created_col.desc(), id_col.desc())
+    query = query.filter(key > tuple_(created_at, row_id))
+    return query.order_by(created_col.asc(), id_col.asc())
+
+
+def keyset_paginate(query, model, cursor=None, per_page=None, max_page_size=MAX_PAGE_SIZE):
+    """Fetch one newest-first page of ``query`` over ``model`` rows.
+
+    ``model`` needs ``created_at`` and ``id`` columns. ``cursor`` is an opaque token from a previous page's next_cursor or
+    prev_cursor. One extra row is fetched to learn whether another page
+    exists in the direction of travel.
+    """
+    per_page = clamp_page_size(per_page, max_page_size)
+    decoded = decode_cursor(cursor)
+    backwards = decoded is not None and decoded[0] == 'prev'
+    query = _seek(query, model, decoded)
+
+    rows = query.limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+    if not rows:
+        return KeysetPage([])
+
+    first, last = rows[0], rows[-1]
+    has_next = True if backwards else more
+    has_prev = more if backwards else decoded is not None
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(last.created_at, last.id, 'next') if has_next else None,
+        prev_cursor=encode_cursor(first.created_at, first.id, 'prev') if has_prev else None,
+    )
+
+
+def keyset_stream(query, model, cursor=None, per_page=None, batch=STREAM_BATCH_SIZE):
+    """Like keyset_paginate(), but rows come ``batch`` at a time during iteration.
+
+    Pages may be up to STREAM_MAX_PAGE_SIZE rows, since memory holds one
+    batch rather than the page. A 'prev' cursor falls back to
+    keyset_paginate(): those rows are fetched oldest first and have to be
+    reversed, so that one page is materialized.
+    """
+    decoded = decode_cursor(cursor)
+    if decoded is not None and decoded[0] == 'prev':
+        return keyset_paginate(query, model, cursor, per_page, STREAM_MAX_PAGE_SIZE)
+    per_page = clamp_page_size(per_page, STREAM_MAX_PAGE_SIZE)
+    return KeysetStream(_seek(query, model, decoded), per_page, decoded is not None, batch)
+
+
+def page_url(cursor):
+    """URL of the current view with ``cursor`` swapped in; a Jinja global."""
+    args = request.args.to_dict()
+    args['cursor'] = cursor
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
@@ -0,0 +1,61 @@
+"""Per-request SQL statement counting with optional query budgets.
+
+    init_query_counter(app)
+
+    @app.route('/')
+    @query_budget(3)
+    def index(): ...
+
+Every statement run through any SQLAlchemy engine while a request is being
+handled is counted on ``g``. When a view declares a budget and goes over
+it, the request fails with QueryBudgetExceeded if
+``app.config['QUERY_BUDGET_STRICT']`` is set (it defaults to
+``app.testing``). Otherwise a warning is logged. That makes N+1 regressions
+fail tests instead of slipping into production.
+"""
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(limit):
+    """Declare the maximum number of SQL statements a view may run."""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def query_count():
+    """Statements run so far in the current request."""
+    return g.get('query_count', 0)
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+
+def init_query_counter(app):
+    if not event.contains(Engine, 'before_cursor_execute', _count_statement):
+        event.listen(Engine, 'before_cursor_execute', _count_statement)
+
+    @app.before_request
+    def _reset_query_count():
+        g.query_count = 0
+
+    @app.after_request
+    def _check_query_budget(response):
+        view = current_app.view_functions.get(request.endpoint)
+        limit = getattr(view, 'query_budget', None)
+        count = query_count()
+        if limit is not None and count > limit:
+            message = f"{request.endpoint} ran {count} queries, budget is {limit}"
+            if current_app.config.get('QUERY_BUDGET_STRICT', current_app.testing):
+                raise QueryBudgetExceeded(message)
+            current_app.logger.warning(message)
+        return response
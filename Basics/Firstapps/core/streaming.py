@@ -0,0 +1,21 @@
+"""Streamed template responses.
+
+``stream_page()`` is flask.stream_template with output buffering: Jinja
+yields a chunk per template event, which would mean one tiny write (and,
+behind the compression middleware, one flush) for every tag.
+``buffer_size`` events are grouped per chunk instead.
+
+Pair it with core.pagination.keyset_stream() so rows are fetched in
+batches while the page is being sent.
+"""
+from flask import current_app, stream_with_context
+
+STREAM_BUFFER = 16
+
+
+def stream_page(template_name, buffer_size=STREAM_BUFFER, **context):
+    app = current_app._get_current_object()
+    app.update_template_context(context)
+    stream = app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(buffer_size)
+    return app.response_class(stream_with_context(stream), mimetype='text/html')
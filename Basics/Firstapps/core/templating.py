@@ -0,0 +1,152 @@
+"""Production settings for an app's Jinja environment, plus a fragment cache.
+
+    init_templates(app)                   # right after app = Flask(...)
+
+    {# in a template #}
+    {% cache 'post_card', post.id, post.updated_at or post.created_at %}
+      ...expensive markup...
+    {% endcache %}
+
+    $ flask compile-templates             # at deploy, before the workers start
+
+Compiled templates are kept in a FileSystemBytecodeCache under
+``TEMPLATE_BYTECODE_DIR``. A worker that starts with a warm directory
+loads each template's code object from disk instead of parsing and
+compiling its source. The cache is keyed by a hash of the source, so an
+edited template is compiled again and never served stale.
+``flask compile-templates`` loads every template once so the directory is
+full before the first request. core.host's preload does the same in the
+gunicorn master, so forked workers share the compiled templates.
+
+Flask turns Jinja's ``auto_reload`` on only in debug mode, unless
+TEMPLATES_AUTO_RELOAD says otherwise. With it off, a template is
+compiled once per process and then served from ``jinja_env.cache`` with
+no stat() of its file on every render. So template edits in production
+need a restart.
+
+``{% cache key, ... %}`` renders its body once per distinct key and then
+returns the stored markup from a per-process LRU of
+``TEMPLATE_FRAGMENT_CACHE_SIZE`` entries. The key must name everything
+the body shows: put a row's id and its last-modified time in it, plus
+anything that depends on the viewer. Nothing is ever invalidated. An
+edit changes the key, and the old entry is evicted once it is the least
+recently used. The template name is part of every key.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import click
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+
+class FragmentCache:
+    """A thread-safe LRU of rendered markup."""
+
+    def __init__(self, size=5000):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+
+    def get_or_render(self, key, render):
+        with self._lock:
+            html = self.entries.get(key)
+            if html is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return html
+            self.misses += 1
+        # rendered outside the lock; two threads may both render a new key
+        html = render()
+        with self._lock:
+            self.entries[key] = html
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return html
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+
+class FragmentCacheExtension(Extension):
+    """``{% cache key, ... %}body{% endcache %}``, stored in ``environment.fragment_cache``."""
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [nodes.Const(parser.name), parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        key = nodes.Tuple(parts, 'load')
+        return nodes.CallBlock(self.call_method('_cached', [key]), [], [], body).set_lineno(lineno)
+
+    def _cached(self, key, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        return cache.get_or_render(key, caller)
+
+
+class Templates:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('TEMPLATE_BYTECODE_CACHE', True)
+        app.config.setdefault('TEMPLATE_BYTECODE_DIR', os.path.join(app.instance_path, 'jinja_bytecode'))
+        app.config.setdefault('TEMPLATE_FRAGMENT_CACHE', True)
+        app.config.setdefault('TEMPLATE_FRAGMENT_CACHE_SIZE', 5000)
+        self.app = app
+        env = app.jinja_env
+        if app.config['TEMPLATE_BYTECODE_CACHE']:
+            os.makedirs(app.config['TEMPLATE_BYTECODE_DIR'], exist_ok=True)
+            env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_BYTECODE_DIR'])
+        env.add_extension(FragmentCacheExtension)
+        if app.config['TEMPLATE_FRAGMENT_CACHE']:
+            env.fragment_cache = FragmentCache(app.config['TEMPLATE_FRAGMENT_CACHE_SIZE'])
+        app.extensions['templates'] = self
+        self._register_cli(app)
+
+    def warm(self):
+        """Load every .html template into the environment (and the bytecode cache)."""
+        env = self.app.jinja_env
+        names = env.list_templates(extensions=('html',))
+        for name in names:
+            env.get_template(name)
+        return len(names)
+
+    def stats(self):
+        env = self.app.jinja_env
+        cache = env.fragment_cache
+        return {
+            'loaded': len(env.cache) if env.cache is not None else 0,
+            'auto_reload': int(env.auto_reload),
+            'fragment_entries': len(cache.entries) if cache else 0,
+            'fragment_hits': cache.hits if cache else 0,
+            'fragment_misses': cache.misses if cache else 0,
+        }
+
+    def _register_cli(self, app):
+        @app.cli.command('compile-templates')
+        def compile_templates():
+            """Compile every template into the bytecode cache."""
+            started = time.perf_counter()
+            count = self.warm()
+            click.echo(f"Compiled {count} templates into {app.config['TEMPLATE_BYTECODE_DIR']} "
+                       f"in {time.perf_counter() - started:.2f}s.")
+
+
+def init_templates(app):
+    return Templates(app)
@@ -0,0 +1,139 @@
+"""Streaming JSONL export/import shared by the blog apps.
+
+An export is a directory:
+
+    content.jsonl           one JSON record per line, in dependency order
+    attachments/<sha256>    one side file per distinct attachment
+
+The first line of ``content.jsonl`` is ``{"type": "meta", ...}``. Then come
+the ``topic``, ``user``, ``post`` and ``comment`` records, in that order,
+each with its source ``id``. Fields that one app has and the other lacks
+(topic slugs, profile fields, attachments) are written whenever present.
+An importer ignores the fields it has no column for.
+
+Records are read and written one at a time, and rows are inserted with
+executemany() in batches. Memory therefore stays flat whatever the size
+of the export. A batch of posts or comments is only sent after the
+pending rows they reference, so foreign keys hold at every statement.
+The whole import is one transaction: if it fails, the database is left
+as it was and the import can simply be run again. Imported rows get new ids, which is what lets an export be
+loaded into a database that already has content:
+
+- posts and comments get ``source id + offset``, where the offset is the
+  table's max(id) before the import. Mapping their references costs one
+  addition, with no lookup table.
+- users and topics that already exist are matched (by username/email,
+  by name/slug) and reuse the existing row. Only these matches are kept
+  in a dict. The remaining rows also get offset ids.
+"""
+import json
+import os
+import shutil
+from datetime import datetime
+
+from sqlalchemy import func, select, text
+
+FORMAT = 1
+CONTENT = 'content.jsonl'
+ATTACHMENTS = 'attachments'
+DATETIME_FIELDS = ('created_at', 'updated_at')
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"cannot serialize {type(value).__name__}")
+
+
+class ExportWriter:
+    """Write records to ``directory/content.jsonl`` and count them per type."""
+
+    def __init__(self, directory, source):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, ATTACHMENTS), exist_ok=True)
+        self._file = open(os.path.join(directory, CONTENT), 'w', encoding='utf-8')
+        self.counts = {}
+        self.write('meta', format=FORMAT, source=source, exported_at=datetime.utcnow())
+
+    def write(self, type_, **fields):
+        self._file.write(json.dumps({'type': type_, **fields}, default=_encode, ensure_ascii=False))
+        self._file.write('\n')
+        self.counts[type_] = self.counts.get(type_, 0) + 1
+
+    def attach(self, sha256, path):
+        """Copy an attachment's file next to the records, once per hash."""
+        target = os.path.join(self.directory, ATTACHMENTS, sha256)
+        if not os.path.exists(target) and os.path.isfile(path):
+            shutil.copyfile(path, target)
+
+    def close(self):
+        self._file.close()
+        self.counts.pop('meta', None)
+        return self.counts
+
+
+def read_records(directory):
+    """Yield the records of an export, datetimes parsed, meta line checked."""
+    with open(os.path.join(directory, CONTENT), encoding='utf-8') as f:
+        for lineno, line in enumerate(f, 1):
+            record = json.loads(line)
+            if lineno == 1:
+                if record.get('type') != 'meta' or record.get('format') != FORMAT:
+                    raise ValueError(f"{directory} is not a format {FORMAT} export")
+                continue
+            for field in DATETIME_FIELDS:
+                if record.get(field):
+                    record[field] = datetime.fromisoformat(record[field])
+            yield record
+
+
+def attachment_path(directory, sha256):
+    return os.path.join(directory, ATTACHMENTS, sha256)
+
+
+def id_offset(session, model):
+    """Offset that moves imported ids clear of the rows already in ``model``."""
+    return session.execute(select(func.max(model.id))).scalar() or 0
+
+
+def reset_sequence(session, model):
+    """Bring PostgreSQL's id sequence past rows inserted with explicit ids."""
+    if session.get_bind().dialect.name == 'postgresql':
+        table = model.__tablename__
+        session.execute(text(f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+                             f"(SELECT coalesce(max(id), 1) FROM \"{table}\"))"))
+
+
+class BatchInserter:
+    """executemany() inserts, ``batch`` rows per statement.
+
+    ``models`` lists the tables in dependency order (users before posts
+    before comments). Flushing one model's batch first flushes whatever is
+    pending for the models before it. Every row of a model must have the
+    same keys, as executemany() binds them all to one statement. Nothing is
+    committed here; the caller commits once, after the last row.
+    """
+
+    def __init__(self, session, models, batch=2000):
+        self.session = session
+        self.models = list(models)
+        self.batch = batch
+        self._rows = {m: [] for m in self.models}
+
+    def add(self, model, row):
+        rows = self._rows[model]
+        rows.append(row)
+        if len(rows) >= self.batch:
+            self.flush(model)
+
+    def flush(self, model=None):
+        """Insert the pending rows of ``model`` and of every model it depends on (all by default)."""
+        upto = self.models.index(model) + 1 if model is not None else len(self.models)
+        for m in self.models[:upto]:
+            rows = self._rows[m]
+            if rows:
+                self.session.execute(m.__table__.insert(), rows)
+                self._rows[m] = []
+
+    def close(self):
+        self.flush()
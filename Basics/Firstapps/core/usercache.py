@@ -0,0 +1,172 @@
+"""Flask-Login user loading without a query per request.
+
+    user_cache = UserCache(app, db, User, columns=('id', 'username'))
+
+    @login_manager.user_loader
+    def load_user(user_id):
+        return user_cache.load(user_id)
+
+    # after changing or deleting a user row
+    user_cache.invalidate(user.id)
+
+``load()`` returns a CachedUser that carries only ``columns``, read with a
+narrow SELECT on a miss and then kept in a per-process TTL/LRU cache.
+Authenticated page views that only need the id and the name in the nav
+bar therefore run no query for the user at all.
+
+Any other attribute or method (``bio``, ``set_password()``, ...) loads the
+full ORM row on first use, through the session's identity map. It stays
+attached for the rest of the request, so assignments to it are committed
+as usual.
+
+``invalidate()`` drops the entry here and bumps a generation number in a
+small file under ``USER_CACHE_DIR``. Other workers on the host notice the
+new number on their next load and empty their caches, so an edited or
+deleted account is not served stale for up to a TTL elsewhere.
+
+A row deleted without invalidate(), or during a request that had already
+loaded its user, is found missing when the full row is first needed. That
+access raises AttributeError and invalidates the id, so from the next
+request on load() returns None and the session is anonymous.
+"""
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from flask_login import UserMixin
+
+
+class CachedUser(UserMixin):
+    """The cached columns of a user row; everything else from the ORM on demand."""
+
+    def __init__(self, values, load_row):
+        self.__dict__['_values'] = values
+        self.__dict__['_load_row'] = load_row
+        self.__dict__['_row'] = None
+
+    @property
+    def row(self):
+        """The full ORM instance, loaded on first use; None once the user is deleted."""
+        if self.__dict__['_row'] is None:
+            self.__dict__['_row'] = self.__dict__['_load_row'](self.__dict__['_values']['id'])
+        return self.__dict__['_row']
+
+    def _existing_row(self, name):
+        row = self.row
+        if row is None:
+            raise AttributeError(f"user {self.__dict__['_values']['id']} no longer exists (reading {name!r})")
+        return row
+
+    def get_id(self):
+        return str(self.__dict__['_values']['id'])
+
+    def __getattr__(self, name):
+        # only reached for names not found on the class or instance
+        values = self.__dict__['_values']
+        if name in values:
+            return values[name]
+        return getattr(self._existing_row(name), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._existing_row(name), name, value)
+
+    def __repr__(self):
+        return f"<CachedUser {self.__dict__['_values']}>"
+
+
+class UserCache:
+    def __init__(self, app=None, db=None, model=None, columns=('id',)):
+        self.db = db
+        self.model = model
+        self.columns = tuple(columns)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+        self.hits = self.misses = self.invalidations = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('USER_CACHE_ENABLED', True)
+        app.config.setdefault('USER_CACHE_TTL', 300)
+        app.config.setdefault('USER_CACHE_SIZE', 10000)
+        app.config.setdefault('USER_CACHE_DIR', app.instance_path)
+        self.app = app
+        os.makedirs(app.config['USER_CACHE_DIR'], exist_ok=True)
+        self.generation_file = os.path.join(app.config['USER_CACHE_DIR'], 'user_cache_generation')
+        app.extensions['user_cache'] = self
+
+    def _read_generation(self):
+        try:
+            with open(self.generation_file) as f:
+                return int(f.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _fetch(self, user_id):
+        cols = [getattr(self.model, c) for c in self.columns]
+        row = self.db.session.execute(self.db.select(*cols).where(self.model.id == user_id)).first()
+        return row._asdict() if row is not None else None
+
+    def _load_row(self, user_id):
+        row = self.db.session.get(self.model, user_id)
+        if row is None:
+            # deleted behind the cache: forget it in every worker
+            self.invalidate(user_id)
+        return row
+
+    def load(self, user_id):
+        """A CachedUser for ``user_id`` (a string from the session), or None."""
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+        if not self.app.config['USER_CACHE_ENABLED']:
+            values = self._fetch(user_id)
+            return CachedUser(values, self._load_row) if values else None
+        generation = self._read_generation()
+        now = time.monotonic()
+        with self._lock:
+            if generation != self._generation:
+                self._data.clear()
+                self._generation = generation
+            item = self._data.get(user_id)
+            if item is not None and item[0] > now:
+                self._data.move_to_end(user_id)
+                self.hits += 1
+                return CachedUser(item[1], self._load_row)
+        self.misses += 1
+        values = self._fetch(user_id)
+        if values is None:
+            return None
+        with self._lock:
+            self._data[user_id] = (now + self.app.config['USER_CACHE_TTL'], values)
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.app.config['USER_CACHE_SIZE']:
+                self._data.popitem(last=False)
+        return CachedUser(values, self._load_row)
+
+    def invalidate(self, user_id=None):
+        """Forget ``user_id`` (or everyone) here and in every worker sharing USER_CACHE_DIR."""
+        with self._lock:
+            if user_id is None:
+                self._data.clear()
+            else:
+                self._data.pop(int(user_id), None)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.generation_file), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(self._read_generation() + 1))
+        os.replace(tmp, self.generation_file)
+        self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'size': len(self._data),
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
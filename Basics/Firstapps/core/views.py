@@ -0,0 +1,55 @@
+"""Routes, CLI commands and error handlers declared before the app exists.
+
+    views = Views()
+
+    @views.route('/')
+    def index(): ...
+
+    @views.command('initdb')
+    def initdb(): ...
+
+    def create_app(config=None):
+        app = Flask(__name__)
+        ...
+        views.init_app(app)
+        return app
+
+For apps whose views live at module level next to their models, with a
+create_app() that builds the app later. Unlike a Blueprint's, endpoints
+keep their plain names ('index', not 'blog.index'), so url_for() calls and
+``login_view`` stay as they are. Commands run in an app context, as with
+``@app.cli.command``.
+"""
+from flask.cli import AppGroup
+
+
+class Views:
+    def __init__(self, app=None):
+        self.rules = []
+        self.error_handlers = []
+        self.cli = AppGroup()
+        if app is not None:
+            self.init_app(app)
+
+    def route(self, rule, **options):
+        def register(view):
+            self.rules.append((rule, view, options))
+            return view
+        return register
+
+    def command(self, *args, **kwargs):
+        return self.cli.command(*args, **kwargs)
+
+    def errorhandler(self, code_or_exception):
+        def register(handler):
+            self.error_handlers.append((code_or_exception, handler))
+            return handler
+        return register
+
+    def init_app(self, app):
+        for rule, view, options in self.rules:
+            app.add_url_rule(rule, view_func=view, **options)
+        for code_or_exception, handler in self.error_handlers:
+            app.register_error_handler(code_or_exception, handler)
+        for command in self.cli.commands.values():
+            app.cli.add_command(command)
@@ -0,0 +1,65 @@
+#!/bin/python3
+"""Every Firstapp in one WSGI process, each under its own path prefix.
+
+    gunicorn -w 4 host:app                                  # each app loads on its first request
+    FIRSTAPPS_PRELOAD=1 gunicorn -w 4 --preload host:app    # load in the master, share pages after fork
+    FIRSTAPPS_MOUNTS=/blog002,/app4 gunicorn host:app       # only some of them
+
+Each blog keeps its database in its own instance/ folder. Leave
+DATABASE_URL unset here: it would point both blogs at the same database,
+and their schemas differ. Give each blog its own instead; host passes it
+to that blog's create_app():
+
+    BLOG002_DATABASE_URL=postgresql://db/blog002 gunicorn host:app
+
+The blogs create or migrate their tables when they are built, under a
+lock file in their instance/ folder (core.database's schema_lock), so any
+number of workers may load them at once on a fresh install.
+
+    python host.py                                          # development server on :5000
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)  # the shared core package
+from core.host import Host
+
+MOUNTS = {
+    '/app1': 'app1/app.py',
+    '/app2': 'app2/app.py',
+    '/app3': 'app3/app.py',
+    '/app4': 'app4/app.py',
+    '/app5': 'app5/app.py',
+    '/blog001': 'blog001/app.py',
+    '/blog002': 'blog002/app.py',
+    '/unrendered/app1': 'unrendered/app1.py',
+    '/unrendered/app2': 'unrendered/app2.py',
+}
+
+
+def mount_configs(mounts):
+    """Per-mount config from the environment: BLOG002_DATABASE_URL for /blog002."""
+    configs = {}
+    for prefix in mounts:
+        url = os.environ.get(prefix.strip('/').replace('/', '_').upper() + '_DATABASE_URL')
+        if url:
+            configs[prefix] = {'DATABASE_URL': url}
+    return configs
+
+
+def create_host(mounts=None, configs=None, preload=False):
+    if mounts is None:
+        wanted = os.environ.get('FIRSTAPPS_MOUNTS')
+        mounts = {p: MOUNTS[p] for p in wanted.split(',')} if wanted else MOUNTS
+    host = Host(ROOT, mounts, mount_configs(mounts) if configs is None else configs)
+    if preload:
+        host.preload()
+    return host
+
+
+app = create_host(preload=os.environ.get('FIRSTAPPS_PRELOAD') == '1')
+
+if __name__ == '__main__':
+    from werkzeug.serving import run_simple
+    run_simple('127.0.0.1', 5000, app, use_reloader=True)
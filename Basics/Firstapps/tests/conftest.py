@@ -0,0 +1,43 @@
+import importlib.util
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)  # the shared core package
+
+from bench.datagen import generate  # noqa: E402  (needs ROOT on sys.path)
+
+
+def load_copy(app_dir, tmp_path, name):
+    """Copy ``app_dir`` under ``tmp_path`` and import its app.py as module ``name``.
+
+    The copy brings no instance folder, so databases, caches and lock files
+    the app creates there are the test's own.
+    """
+    dest = tmp_path / os.path.basename(app_dir)
+    shutil.copytree(app_dir, dest,
+                    ignore=shutil.ignore_patterns('instance', 'frozen', 'build', '*-2025-*', '__pycache__'))
+    spec = importlib.util.spec_from_file_location(name, dest / 'app.py')
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope='module')
+def blog(tmp_path_factory, request):
+    """blog002 on a throwaway copy, seeded by bench.datagen.generate; the app is ``blog.app``.
+
+    A test module sets ``BLOG_DATA`` to pass other sizes to generate().
+    """
+    tmp = tmp_path_factory.mktemp('blog002')
+    name = f'blog002_test_{tmp.name}'
+    m = load_copy(os.path.join(ROOT, 'blog002'), tmp, name)
+    # its own SQLite file, whatever DATABASE_URL the environment has
+    m.app = m.create_app({'TESTING': True, 'DATABASE_URL': f"sqlite:///{tmp / 'blog.sqlite3'}"})
+    generate(m, **dict(dict(users=20, posts=200, comments=400), **getattr(request.module, 'BLOG_DATA', {})))
+    yield m
+    del sys.modules[name]
@@ -0,0 +1,37 @@
+def counters(blog):
+    return {
+        'topics': [tuple(r) for r in blog.db.session.query(
+            blog.Topic.id, blog.Topic.post_count, blog.Topic.comment_count).order_by(blog.Topic.id)],
+        'users': [tuple(r) for r in blog.db.session.query(
+            blog.User.id, blog.User.post_count, blog.User.comment_count).order_by(blog.User.id)],
+    }
+
+
+def busiest_author(blog):
+    return (blog.db.session.query(blog.Post.user_id)
+            .group_by(blog.Post.user_id)
+            .order_by(blog.db.func.count().desc())
+            .limit(1).scalar())
+
+
+def test_batched_delete_leaves_counters_reconciled(blog):
+    with blog.app.app_context():
+        user_id = busiest_author(blog)
+        own_posts = blog.Post.query.filter_by(user_id=user_id).count()
+        chunks = []
+        done = blog.delete_account(user_id, batch_size=7, progress=lambda done, total: chunks.append(done))
+        assert done > own_posts
+        assert len(chunks) > 1 and chunks[-1] == done
+
+        assert blog.db.session.get(blog.User, user_id) is None
+        assert blog.Post.query.filter_by(user_id=user_id).count() == 0
+        assert blog.Comment.query.filter_by(user_id=user_id).count() == 0
+        assert blog.Comment.query.filter(~blog.Comment.post_id.in_(blog.db.select(blog.Post.id))).count() == 0
+        after_delete = counters(blog)
+
+    result = blog.app.test_cli_runner().invoke(args=['reconcile-stats'])
+    assert result.exit_code == 0, result.output
+    with blog.app.app_context():
+        assert counters(blog) == after_delete
+        assert sum(n for _, n, _ in after_delete['topics']) == blog.Post.query.count()
+        assert sum(n for _, _, n in after_delete['users']) == blog.Comment.query.count()
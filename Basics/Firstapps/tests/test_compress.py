@@ -0,0 +1,58 @@
+import gzip
+
+import pytest
+from flask import Flask, send_file
+
+from core.compress import init_compression
+
+TEXT = 'field report, line after line\n' * 200
+GZIP = {'Accept-Encoding': 'gzip'}
+
+
+@pytest.fixture
+def client(tmp_path):
+    report = tmp_path / 'report.txt'
+    report.write_text(TEXT)
+    app = Flask(__name__)
+    init_compression(app)
+
+    @app.route('/page')
+    def page():
+        return '<p>' + TEXT + '</p>'
+
+    @app.route('/download')
+    def download():
+        return send_file(report, as_attachment=True)
+
+    @app.route('/inline')
+    def inline():
+        return send_file(report)
+
+    @app.route('/generated')
+    def generated():
+        return TEXT, {'Content-Type': 'text/csv', 'Content-Disposition': 'attachment; filename="r.csv"'}
+
+    return app.test_client()
+
+
+def test_pages_are_compressed(client):
+    response = client.get('/page', headers=GZIP)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data).decode() == '<p>' + TEXT + '</p>'
+
+
+@pytest.mark.parametrize('path', ['/download', '/inline', '/generated'])
+def test_downloads_keep_their_bytes(client, path):
+    response = client.get(path, headers=GZIP)
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['Content-Length'] == str(len(TEXT))
+    assert response.get_data(as_text=True) == TEXT
+
+
+@pytest.mark.parametrize('path', ['/download', '/inline'])
+def test_text_downloads_serve_ranges(client, path):
+    assert client.get(path, headers=GZIP).headers['Accept-Ranges'] == 'bytes'
+    response = client.get(path, headers=dict(GZIP, Range='bytes=0-4'))
+    assert response.status_code == 206
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == TEXT[:5].encode()
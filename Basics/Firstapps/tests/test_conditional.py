@@ -0,0 +1,73 @@
+import os
+import sys
+
+import pytest
+
+from conftest import ROOT, load_copy
+
+
+def revisit(client, path, response):
+    return client.get(path, headers={'If-None-Match': response.headers['ETag']})
+
+
+@pytest.fixture(scope='module')
+def post_id(blog):
+    """A post whose render cache is empty, as it is before anyone has viewed it."""
+    blog.app.config['PAGE_CACHE_ENABLED'] = False
+    with blog.app.app_context():
+        post = blog.Post.query.order_by(blog.Post.id.desc()).first()
+        blog.Post.query.filter_by(id=post.id).update({'rendered_html': None, 'render_key': None})
+        blog.db.session.commit()
+        return post.id
+
+
+def test_first_view_validates(blog, post_id):
+    client = blog.app.test_client()
+    first = client.get(f'/post/{post_id}')
+    assert first.status_code == 200
+    # the view filled the render cache; that is not a change to the page
+    assert revisit(client, f'/post/{post_id}', first).status_code == 304
+
+
+def test_no_last_modified(blog, post_id):
+    client = blog.app.test_client()
+    for path in ('/', f'/post/{post_id}'):
+        response = client.get(path)
+        assert 'ETag' in response.headers
+        assert 'Last-Modified' not in response.headers
+
+
+def test_deleting_posts_changes_the_listing(blog):
+    client = blog.app.test_client()
+    before = client.get('/')
+    with blog.app.app_context():
+        user_id = blog.db.session.query(blog.Post.user_id).order_by(blog.Post.id.desc()).limit(1).scalar()
+        blog.delete_account(user_id)
+    assert revisit(client, '/', before).status_code == 200
+
+
+@pytest.fixture(scope='module')
+def blog001(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp('blog001')
+    name = f'blog001_test_{tmp.name}'
+    m = load_copy(os.path.join(ROOT, 'blog001'), tmp, name)
+    app = m.create_app({'TESTING': True, 'DATABASE_URL': f"sqlite:///{tmp / 'blog.sqlite3'}"})
+    with app.app_context():
+        user = m.User(username='writer', email='writer@example.com', password_hash='-')
+        post = m.Post(title='Dispatch', body='From the field.', author=user, topic=m.Topic.query.first())
+        m.db.session.add(post)
+        m.db.session.commit()
+        m.post_path = f'/post/{post.id}'
+    yield app, m
+    del sys.modules[name]
+
+
+def test_comment_form_token_belongs_to_the_session(blog001):
+    app, m = blog001
+    client = app.test_client()
+    # the first page mints this session's CSRF token, so it has nothing to revalidate against
+    assert 'ETag' not in client.get(m.post_path).headers
+    page = client.get(m.post_path)
+    assert revisit(client, m.post_path, page).status_code == 304
+    # another session holds no token yet: it gets a form it can post
+    assert revisit(app.test_client(), m.post_path, page).status_code == 200
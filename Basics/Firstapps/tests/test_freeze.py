@@ -0,0 +1,68 @@
+import os
+import sys
+
+import pytest
+
+from conftest import ROOT, load_copy
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """A fresh app4 factory on a private copy of app4/, as `flask freeze` would load it."""
+    name = f'freeze_test_{tmp_path.name}'
+    module = load_copy(os.path.join(ROOT, 'app4'), tmp_path, name)
+    yield lambda **config: module.create_app(dict({'FREEZE_DIR': str(tmp_path / 'frozen')}, **config))
+    del sys.modules[name]
+
+
+def freeze(app, **kwargs):
+    return app.extensions['freeze'].freeze(app.config['FREEZE_DIR'], **kwargs)
+
+
+def bump(path, text):
+    with open(path, 'a') as f:
+        f.write(text)
+    st = os.stat(path)
+    # past the build manifest's mtime, however coarse the filesystem clock
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 10))
+
+
+def test_rebuild_renders_only_changed_templates(make_app, tmp_path):
+    assert freeze(make_app())['rendered'] == 3
+    assert freeze(make_app())['rendered'] == 0
+    bump(tmp_path / 'app4/templates/biology/biotechnology.html', '<p>more</p>\n')
+    counts = freeze(make_app())
+    assert (counts['rendered'], counts['unchanged']) == (1, 2)
+    assert freeze(make_app(), force=True)['rendered'] == 3
+
+
+def test_asset_change_rebuilds_pages(make_app, tmp_path):
+    app = make_app()
+    old = app.extensions['assets']['cryo.css']
+    freeze(app)
+    bump(tmp_path / 'app4/static/cryo.css', 'body { margin: 1px; }\n')
+    app = make_app()
+    new = app.extensions['assets']['cryo.css']
+    assert new != old
+    assert freeze(app)['rendered'] == 3
+    html = (tmp_path / 'frozen/subjects/biology/index.html').read_text()
+    assert new in html and old not in html
+
+
+def test_removed_page_is_deleted(make_app, tmp_path):
+    freeze(make_app())
+    os.remove(tmp_path / 'app4/templates/biology/biotechnology.html')
+    counts = freeze(make_app())
+    assert counts['removed'] == 1
+    assert not (tmp_path / 'frozen/subjects/biology/biotechnology').exists()
+
+
+def test_serves_frozen_pages_and_falls_back(make_app):
+    freeze(make_app())
+    client = make_app(FREEZE_SERVE=True).test_client()
+    frozen = client.get('/subjects/biology', headers={'Accept-Encoding': 'identity'})
+    assert frozen.status_code == 200 and 'max-age=60' in frozen.headers['Cache-Control']
+    dynamic = client.get('/home', headers={'Accept-Encoding': 'identity'})   # excluded: shows the clock
+    assert dynamic.status_code == 200 and 'Cache-Control' not in dynamic.headers
+    mounted = client.get('/subjects/biology', base_url='http://localhost/app4/')
+    assert 'Cache-Control' not in mounted.headers     # frozen for /, not for /app4
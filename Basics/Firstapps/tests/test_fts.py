@@ -0,0 +1,93 @@
+import pytest
+
+from bench.fts_search import VOCAB
+from core.fts import match_expression, match_filter, ranked_search
+
+COMMON = VOCAB[0]     # datagen draws words Zipf-weighted, so this one is in most posts
+
+
+@pytest.fixture
+def session(blog):
+    with blog.app.test_request_context():
+        yield blog.db.session
+
+
+def add_post(m, title, body):
+    post = m.Post(title=title, body=body, user_id=1, topic_id=1)
+    m.db.session.add(post)
+    m.db.session.commit()
+    return post.id
+
+
+def search(m, q, cursor=None, per_page=7, **kwargs):
+    return ranked_search(m.db.session, m.Post, q, cursor, per_page, weights=(10.0, 1.0), **kwargs)
+
+
+def walk(m, q, **kwargs):
+    """Every id ranked_search pages through for ``q``, following next cursors."""
+    ids, cursor = [], None
+    while True:
+        page = search(m, q, cursor, **kwargs)
+        ids += [post.id for post in page.items]
+        if not page.next_cursor:
+            return ids
+        cursor = page.next_cursor
+
+
+def test_title_hits_rank_above_body_hits(blog, session):
+    in_body = add_post(blog, 'unrelated', 'a note on zebrafish and more')
+    in_title = add_post(blog, 'zebrafish', 'nothing here')
+    assert [post.id for post in search(blog, 'zebrafish').items] == [in_title, in_body]
+
+
+def test_paging_returns_every_match_once(blog, session):
+    ids = walk(blog, COMMON, max_candidates=None)
+    matches = blog.Post.query.filter(match_filter(session, blog.Post, COMMON, ('title', 'body'))).count()
+    assert len(ids) == len(set(ids)) == matches
+
+
+def test_prev_cursor_returns_same_page(blog, session):
+    first = search(blog, COMMON)
+    second = search(blog, COMMON, first.next_cursor)
+    back = search(blog, COMMON, second.prev_cursor)
+    assert [post.id for post in back.items] == [post.id for post in first.items]
+
+
+def test_edits_are_reindexed(blog, session):
+    post_id = add_post(blog, 'okapi', 'body')
+    blog.db.session.get(blog.Post, post_id).title = 'narwhal'
+    blog.db.session.commit()
+    assert search(blog, 'okapi').items == []
+    assert [post.id for post in search(blog, 'narwhal').items] == [post_id]
+
+
+def test_input_is_never_fts_syntax(blog, session):
+    assert match_expression('NEAR(a "b') == '"NEAR" "a" "b"*'
+    assert match_expression('--') is None
+    assert search(blog, 'title:" OR *').items == []
+
+
+def test_snippets_are_escaped_and_marked(blog, session):
+    add_post(blog, 'plain', '<script>x</script> about capybaras')
+    snippet = search(blog, 'capybaras').items[0].snippet
+    assert '<script>' not in snippet
+    assert '&lt;script&gt;' in snippet and '<mark>capybaras</mark>' in snippet
+
+
+def test_ranks_only_the_newest_candidates(blog, session):
+    everything = walk(blog, COMMON, max_candidates=None)
+    assert len(everything) > 50
+    capped = walk(blog, COMMON, max_candidates=50)
+    assert len(capped) == len(set(capped)) == 50
+    assert sorted(capped) == sorted(everything)[-50:]
+
+
+def test_cap_above_match_count_ranks_everything(blog, session):
+    assert walk(blog, COMMON, max_candidates=10_000) == walk(blog, COMMON, max_candidates=None)
+
+
+def test_capped_prev_cursor_returns_same_page(blog, session):
+    first = search(blog, COMMON, max_candidates=50)
+    second = search(blog, COMMON, first.next_cursor, max_candidates=50)
+    back = search(blog, COMMON, second.prev_cursor, max_candidates=50)
+    assert [post.id for post in back.items] == [post.id for post in first.items]
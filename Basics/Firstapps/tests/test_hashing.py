@@ -0,0 +1,88 @@
+import threading
+
+import pytest
+from flask import Flask
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from core.hashing import HashingBusy, PasswordHasher
+
+CHEAP = 'pbkdf2:sha256:1000'
+
+
+def make_hasher(directory, **config):
+    app = Flask(__name__)
+    app.config.update(PASSWORD_HASH_METHOD=CHEAP, PASSWORD_HASH_SLOTS=1, PASSWORD_HASH_QUEUE=0,
+                      PASSWORD_HASH_WORKERS=0, PASSWORD_HASH_DIR=str(directory))
+    app.config.update(config)
+    return PasswordHasher(app)
+
+
+def test_busy_when_every_slot_is_taken(tmp_path):
+    hasher = make_hasher(tmp_path)
+    slot = hasher.slots.try_acquire()
+    with pytest.raises(HashingBusy) as busy:
+        hasher.hash('secret')
+    assert busy.value.code == 503 and busy.value.retry_after >= 1
+    hasher.slots.release(slot)
+    assert hasher.verify(hasher.hash('secret'), 'secret')
+    assert hasher.stats()['rejected'] == 1
+
+
+def test_slots_are_shared_between_workers(tmp_path):
+    # another worker process: its own hasher and slot files on the same directory
+    hasher, other_worker = make_hasher(tmp_path), make_hasher(tmp_path)
+    slot = other_worker.slots.try_acquire()
+    with pytest.raises(HashingBusy):
+        hasher.hash('secret')
+    other_worker.slots.release(slot)
+    hasher.hash('secret')
+
+
+def test_queued_hash_waits_for_a_slot(tmp_path):
+    hasher = make_hasher(tmp_path, PASSWORD_HASH_QUEUE=1, PASSWORD_HASH_WAIT=5.0)
+    slot = hasher.slots.try_acquire()
+    threading.Timer(0.05, hasher.slots.release, (slot,)).start()
+    assert hasher.verify(hasher.hash('secret'), 'secret')
+    assert hasher.stats()['wait_seconds'] > 0
+
+    hasher.wait = 0.05
+    slot = hasher.slots.try_acquire()
+    with pytest.raises(HashingBusy):
+        hasher.hash('secret')
+    hasher.slots.release(slot)
+
+
+def test_needs_rehash(tmp_path):
+    hasher = make_hasher(tmp_path)
+    assert not hasher.needs_rehash(hasher.hash('secret'))
+    assert not hasher.needs_rehash(generate_password_hash('secret', method=CHEAP))
+    assert hasher.needs_rehash(generate_password_hash('secret', method='pbkdf2:sha256:2000'))
+    assert hasher.needs_rehash(generate_password_hash('secret', method='scrypt'))
+
+
+def test_login_upgrades_an_old_hash(blog):
+    old = generate_password_hash('old-secret', method=CHEAP)
+    with blog.app.app_context():
+        user = blog.User(username='old-timer', email='old-timer@example.com', password_hash=old)
+        blog.db.session.add(user)
+        blog.db.session.commit()
+        user_id = user.id
+        assert blog.passwords.needs_rehash(old)
+
+    def stored():
+        with blog.app.app_context():
+            return blog.db.session.get(blog.User, user_id).password_hash
+
+    client = blog.app.test_client()
+    client.post('/login', data={'credential': 'old-timer', 'password': 'wrong'})
+    assert stored() == old
+
+    response = client.post('/login', data={'credential': 'old-timer', 'password': 'old-secret'})
+    assert response.status_code == 302
+    upgraded = stored()
+    assert upgraded.startswith(blog.passwords.method + '$')
+    assert check_password_hash(upgraded, 'old-secret')
+
+    client.get('/logout')
+    client.post('/login', data={'credential': 'old-timer', 'password': 'old-secret'})
+    assert stored() == upgraded
@@ -0,0 +1,77 @@
+import time
+
+import pytest
+from flask import Flask
+
+from core.jobs import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    app = Flask(__name__)
+    app.config.update(JOBS_DATABASE=str(tmp_path / 'jobs.sqlite3'), JOBS_MAX_ATTEMPTS=3)
+    jobs = JobQueue(app)
+    jobs.ran = []
+
+    @jobs.task('record')
+    def record(value):
+        jobs.ran.append(value)
+
+    @jobs.task('explode')
+    def explode():
+        raise RuntimeError('boom')
+
+    yield jobs
+    jobs.close()
+
+
+def job(queue, job_id):
+    return queue.conn.execute("SELECT * FROM job WHERE id = ?", (job_id,)).fetchone()
+
+
+def test_enqueue_and_run(queue):
+    job_id = queue.enqueue('record', {'value': 1}, key='record:1')
+    assert job_id is not None
+    assert queue.enqueue('record', {'value': 1}, key='record:1') is None    # still queued
+    assert queue.stats()['ready'] == 1
+
+    assert queue.run_one('test') is True
+    assert queue.run_one('test') is False
+    assert queue.ran == [1]
+    assert job(queue, job_id)['status'] == 'done'
+    # the key is released once the job is done
+    assert queue.enqueue('record', {'value': 1}, key='record:1') is not None
+
+
+def test_worker_drains_the_queue(queue):
+    for value in range(5):
+        queue.enqueue('record', {'value': value})
+    result = queue.app.test_cli_runner().invoke(args=['worker', '--concurrency', '2', '--burst'])
+    assert result.exit_code == 0, result.output
+    assert sorted(queue.ran) == list(range(5))
+    assert queue.stats()['done'] == 5
+
+
+def test_failure_is_retried_with_backoff_then_failed(queue):
+    job_id = queue.enqueue('explode', key='explode')
+    queue.run_one('test')
+    row = job(queue, job_id)
+    assert (row['status'], row['attempts']) == ('queued', 1)
+    assert 'boom' in row['last_error']
+    assert row['run_at'] > time.time()                 # backing off, not ready yet
+    assert queue.run_one('test') is False
+
+    for attempt in (2, 3):
+        queue.conn.execute("UPDATE job SET run_at = 0 WHERE id = ?", (job_id,))
+        assert queue.run_one('test') is True
+    row = job(queue, job_id)
+    assert (row['status'], row['attempts']) == ('failed', 3)
+    assert row['idempotency_key'] is None
+    assert queue.stats()['failed'] == 1
+
+
+def test_eager_mode_runs_inline(queue):
+    queue.app.config['JOBS_EAGER'] = True
+    assert queue.enqueue('record', {'value': 'now'}) is None
+    assert queue.ran == ['now']
+    assert queue.stats()['queued'] == 0
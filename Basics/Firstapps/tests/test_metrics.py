@@ -0,0 +1,61 @@
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from core.metrics import Metrics, _sampler
+
+
+def make_app():
+    app = Flask(__name__)
+    app.config.update(METRICS_SLOW_MS=1, METRICS_PROFILE_RATE=1.0, METRICS_PROFILE_INTERVAL=0.001)
+    Metrics(app)
+
+    @app.route('/slow')
+    def slow():
+        time.sleep(0.05)
+        return 'done'
+
+    return app
+
+
+def sampler_threads():
+    return [t for t in threading.enumerate() if t.name == 'metrics-sampler']
+
+
+@pytest.fixture
+def apps():
+    yield make_app(), make_app()
+    _sampler.close()
+
+
+def test_apps_share_one_sampler(apps):
+    first, second = apps
+    assert first.extensions['metrics'].sampler is second.extensions['metrics'].sampler
+    assert sampler_threads() == []
+    for app in apps:
+        assert app.test_client().get('/slow').status_code == 200
+    assert len(sampler_threads()) <= 1
+
+
+def test_slow_request_logs_its_stacks(apps, caplog):
+    apps[0].test_client().get('/slow')
+    assert 'slow request GET' in caplog.text
+    assert ':slow:' in caplog.text
+    assert _sampler.stacks == {}
+
+
+def test_sampler_exits_when_idle_or_closed(apps):
+    _sampler.start(threading.get_ident(), 0.001)
+    thread = _sampler._thread
+    assert thread.daemon and thread.is_alive()
+    _sampler.close()
+    assert not thread.is_alive()
+
+    _sampler.start(threading.get_ident(), 0.001)
+    thread = _sampler._thread
+    _sampler.stop(threading.get_ident())
+    thread.join(1)
+    assert not thread.is_alive()
+    assert _sampler._thread is None
@@ -0,0 +1,107 @@
+import pytest
+from flask import Flask, flash, request, session
+
+from core.pagecache import PageCache
+
+
+def make_app(directory):
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY='test', PAGE_CACHE_DIR=str(directory))
+    cache = PageCache(app)
+    app.renders = 0
+
+    @app.route('/')
+    @cache.cached
+    def index():
+        app.renders += 1
+        return f"page {app.renders} {request.args.get('page', '')}"
+
+    @app.route('/flash')
+    def flash_something():
+        flash('hello')
+        return ''
+
+    @app.route('/visit')
+    @cache.cached
+    def visit():
+        session['seen'] = True
+        return 'welcome'
+
+    return app, cache
+
+
+@pytest.fixture
+def site(tmp_path):
+    return make_app(tmp_path)
+
+
+def test_miss_then_hit(site):
+    app, cache = site
+    client = app.test_client()
+    first, second = client.get('/'), client.get('/')
+    assert (first.headers['X-Cache'], second.headers['X-Cache']) == ('MISS', 'HIT')
+    assert first.data == second.data == b'page 1 '
+    assert (cache.hits, cache.misses, cache.stores) == (1, 1, 1)
+
+
+def test_query_args_are_part_of_the_key(site):
+    app, _ = site
+    client = app.test_client()
+    assert client.get('/?page=2').data == b'page 1 2'
+    assert client.get('/?page=3').headers['X-Cache'] == 'MISS'
+    assert client.get('/?page=2').headers['X-Cache'] == 'HIT'
+
+
+def test_invalidate_reaches_every_worker(tmp_path):
+    # two workers: separate LRU caches sharing one generation file
+    one, one_cache = make_app(tmp_path)
+    two, _ = make_app(tmp_path)
+    for app in (one, two):
+        app.test_client().get('/')
+        assert app.test_client().get('/').headers['X-Cache'] == 'HIT'
+    one_cache.invalidate()
+    assert (tmp_path / 'generation').read_text() == '1'
+    for app in (one, two):
+        response = app.test_client().get('/')
+        assert response.headers['X-Cache'] == 'MISS'
+        assert response.data == b'page 2 '
+
+
+def test_logged_in_visitors_bypass(site):
+    app, cache = site
+    client = app.test_client()
+    client.get('/')
+    with client.session_transaction() as s:
+        s['_user_id'] = '1'
+    response = client.get('/')
+    assert 'X-Cache' not in response.headers
+    assert response.data == b'page 2 '
+    assert cache.hits == 0
+
+
+def test_remember_cookie_bypasses(site):
+    # Flask-Login restores the user from this cookie inside the view's request
+    app, cache = site
+    client = app.test_client()
+    client.get('/')
+    client.set_cookie('remember_token', '1|signature')
+    response = client.get('/')
+    assert 'X-Cache' not in response.headers
+    assert cache.hits == 0
+
+
+def test_pending_flashes_bypass(site):
+    app, cache = site
+    client = app.test_client()
+    client.get('/')
+    client.get('/flash')
+    assert 'X-Cache' not in client.get('/').headers
+    assert cache.hits == 0
+
+
+def test_responses_that_touch_the_session_are_not_stored(site):
+    app, cache = site
+    client = app.test_client()
+    client.get('/visit')
+    assert app.test_client().get('/visit').headers['X-Cache'] == 'MISS'
+    assert cache.stores == 0
@@ -0,0 +1,56 @@
+import pytest
+from sqlalchemy.orm import lazyload
+
+from core.querycount import QueryBudgetExceeded
+
+BLOG_DATA = dict(users=50, posts=300, comments=600)
+
+
+@pytest.fixture(scope='module', autouse=True)
+def targets(blog):
+    """Count what the views query, not what a cached page or post card saves them."""
+    blog.app.config['PAGE_CACHE_ENABLED'] = False
+    blog.app.jinja_env.fragment_cache = None
+    with blog.app.app_context():
+        post_id, _ = (blog.db.session.query(blog.Comment.post_id, blog.db.func.count())
+                      .group_by(blog.Comment.post_id).order_by(blog.db.func.count().desc()).first())
+        post = blog.db.session.get(blog.Post, post_id)
+        blog.blog_post, blog.blog_topic, blog.blog_word = post.id, post.topic_id, post.title.split()[0]
+
+
+def get(m, path):
+    # a fresh client each time: anonymous post reads are capped per session
+    response = m.app.test_client().get(path)
+    assert response.status_code == 200, path
+    return response
+
+
+@pytest.mark.parametrize('path', [
+    '/',
+    '/?per_page=100',
+    '/topic/{topic}',
+    '/post/{post}',
+    '/search?q={word}',
+])
+def test_views_stay_within_budget(blog, path):
+    get(blog, path.format(topic=blog.blog_topic, post=blog.blog_post, word=blog.blog_word))
+
+
+def test_post_detail_within_budget_when_render_cache_is_cold(blog):
+    with blog.app.app_context():
+        blog.Post.query.filter_by(id=blog.blog_post).update({'render_key': None})
+        blog.db.session.commit()
+    get(blog, f'/post/{blog.blog_post}')
+
+
+@pytest.mark.parametrize('path, endpoint', [
+    ('/', 'index'),
+    ('/topic/{topic}', 'topic_view'),
+    ('/post/{post}', 'post_detail'),
+    ('/search?q={word}', 'search'),
+])
+def test_n_plus_one_fails(blog, monkeypatch, path, endpoint):
+    # a view that lost its eager loads fetches each card's (or comment's) author on its own
+    monkeypatch.setattr(blog, 'joinedload', lazyload)
+    with pytest.raises(QueryBudgetExceeded, match=f'{endpoint} ran'):
+        blog.app.test_client().get(path.format(topic=blog.blog_topic, post=blog.blog_post, word=blog.blog_word))
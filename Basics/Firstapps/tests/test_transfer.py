@@ -0,0 +1,61 @@
+import os
+import sys
+
+import pytest
+
+from conftest import ROOT, load_copy
+
+ATTACHMENT = b'%PDF-1.4 not really a pdf\n'
+
+
+@pytest.fixture
+def empty_blog(tmp_path):
+    """A second blog002 with only its default topics, to import into."""
+    name = f'blog002_import_{tmp_path.name}'
+    m = load_copy(os.path.join(ROOT, 'blog002'), tmp_path, name)
+    m.app = m.create_app({'TESTING': True, 'DATABASE_URL': f"sqlite:///{tmp_path / 'blog.sqlite3'}"})
+    yield m
+    del sys.modules[name]
+
+
+def content(blog):
+    """Everything an export carries, keyed by what survives new ids."""
+    with blog.app.app_context():
+        User, Topic, Post, Comment = blog.User, blog.Topic, blog.Post, blog.Comment
+        session = blog.db.session
+        return {
+            'users': sorted(session.query(User.username, User.email, User.password_hash, User.bio,
+                                          User.post_count, User.comment_count).all()),
+            'topics': sorted(session.query(Topic.name, Topic.post_count, Topic.comment_count).all()),
+            'posts': sorted(session.query(Post.title, Post.body, Post.created_at, User.username, Topic.name,
+                                          Post.attachment_filename, Post.attachment_sha256)
+                            .join(User, Post.user_id == User.id).join(Topic, Post.topic_id == Topic.id).all()),
+            'comments': sorted(session.query(Comment.body, Comment.created_at, User.username, Post.title)
+                               .join(User, Comment.user_id == User.id)
+                               .join(Post, Comment.post_id == Post.id).all()),
+        }
+
+
+def test_export_import_round_trip(blog, empty_blog, tmp_path):
+    with blog.app.app_context():
+        upload = tmp_path / 'report.pdf'
+        upload.write_bytes(ATTACHMENT)
+        sha256, size = blog.blobs.put_file(str(upload))
+        blog.reference_blob(sha256, size)
+        post = blog.db.session.get(blog.Post, 1)
+        post.attachment_sha256, post.attachment_filename = sha256, 'report.pdf'
+        blog.db.session.commit()
+
+    export = tmp_path / 'export'
+    result = blog.app.test_cli_runner().invoke(args=['export', str(export)])
+    assert result.exit_code == 0, result.output
+    assert (export / 'attachments' / sha256).read_bytes() == ATTACHMENT
+
+    result = empty_blog.app.test_cli_runner().invoke(args=['import', str(export), '--batch-size', '50'])
+    assert result.exit_code == 0, result.output
+    assert 'were missing' not in result.output
+
+    assert content(empty_blog) == content(blog)
+    with empty_blog.app.app_context():
+        assert empty_blog.blobs.exists(sha256)
+        assert empty_blog.db.session.get(empty_blog.Attachment, sha256).ref_count == 1
@@ -0,0 +1,50 @@
+import pytest
+
+from core.usercache import UserCache
+
+
+@pytest.fixture
+def new_user(blog):
+    """A user with no content, loaded once so the cache holds them."""
+    with blog.app.app_context():
+        user = blog.User(username='short-lived', email='short-lived@example.com', password_hash='-')
+        blog.db.session.add(user)
+        blog.db.session.commit()
+        user_id = user.id
+    with blog.app.test_request_context():
+        assert blog.user_cache.load(str(user_id)).username == 'short-lived'
+    return user_id
+
+
+@pytest.fixture
+def other_worker(blog):
+    """A second cache on the same USER_CACHE_DIR, as in another gunicorn worker."""
+    own = blog.app.extensions['user_cache']
+    cache = UserCache(blog.app, blog.db, blog.User, columns=('id', 'username'))
+    blog.app.extensions['user_cache'] = own
+    return cache
+
+
+def test_deleted_account_loads_as_nobody(blog, new_user, other_worker):
+    with blog.app.test_request_context():
+        assert other_worker.load(str(new_user)) is not None
+        generation = blog.user_cache._read_generation()
+        blog.delete_account(new_user)
+        assert blog.user_cache._read_generation() > generation
+        assert blog.user_cache.load(str(new_user)) is None
+        assert other_worker.load(str(new_user)) is None
+
+
+def test_row_deleted_behind_the_cache(blog, new_user, other_worker):
+    with blog.app.test_request_context():
+        other_worker.load(str(new_user))
+        blog.db.session.execute(blog.db.delete(blog.User).where(blog.User.id == new_user))
+        blog.db.session.commit()
+        # still cached: the id and username need no row
+        user = blog.user_cache.load(str(new_user))
+        assert (user.get_id(), user.username) == (str(new_user), 'short-lived')
+        with pytest.raises(AttributeError, match='no longer exists'):
+            user.bio
+    with blog.app.test_request_context():
+        assert blog.user_cache.load(str(new_user)) is None
+        assert other_worker.load(str(new_user)) is None
@@ -2,13 +2,17 @@
 
 from flask import Flask
 
-app = Flask(__name__)
+def create_app(config=None):
+	app = Flask(__name__)
+	app.config.update(config or {})
 
-@app.route('/')
-def home():
-	return "Hello, Flask"
+	@app.route('/')
+	def home():
+		return "Hello, Flask"
+
+	return app
 
 if __name__ == "__main__":
-	app.run(debug=True)
+	create_app().run(debug=True)
 
 